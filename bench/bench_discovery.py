@@ -0,0 +1,105 @@
+""" Benchmark of pyx discovery (cy_list) on a synthetic project tree
+
+    python bench/bench_discovery.py [--files 100000]
+
+Builds a tree with the given number of files, spread over project packages, a virtual environment, node_modules,
+.git and build folders, and compares the legacy double rglob walk with the single-pass pruned walker and with the
+directory index on an unchanged tree.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from cythonbuilder.discovery import DiscoveryIndex, walk_project  # noqa: E402
+
+
+def legacy_cy_list(project_dir:str) -> [str]:
+    """ cy_list as it was: two full rglob walks and an O(files x venvs) filter """
+    venv_paths_folders = [os.path.dirname(path) for path in Path(project_dir).rglob('pyvenv.cfg')]
+    pyx_fullpaths = [str(pyxpath) for pyxpath in Path(project_dir).rglob('*.pyx')]
+    for venvpath in venv_paths_folders:
+        pyx_fullpaths = [pf for pf in pyx_fullpaths if (venvpath not in pf)]
+    return pyx_fullpaths
+
+
+def make_tree(root:str, num_files:int) -> int:
+    """ Creates [num_files] files. Returns the number of pyx files that discovery should find """
+    # (folder, share of all files, pyx share)
+    layout = [
+        ('src/pkg{i}/sub{j}', 0.25, 0.02),
+        ('.venv/lib/python3/site-packages/dep{i}/mod{j}', 0.30, 0.01),
+        ('node_modules/lib{i}/dist{j}', 0.20, 0.0),
+        ('.git/objects/{i}{j}', 0.15, 0.0),
+        ('build/temp{i}/obj{j}', 0.10, 0.01),
+    ]
+    Path(root, '.venv').mkdir()
+    Path(root, '.venv', 'pyvenv.cfg').write_text('home = /usr/bin\n')
+    expected_pyx = 0
+    files_per_folder = 50
+    for folder_template, share, pyx_share in layout:
+        count = int(num_files * share)
+        num_pyx = int(count * pyx_share)
+        for idx in range(count):
+            folder_idx = idx // files_per_folder
+            folder = os.path.join(root, folder_template.format(i=folder_idx // 10, j=folder_idx % 10))
+            if (idx % files_per_folder == 0):
+                os.makedirs(folder, exist_ok=True)
+            is_pyx = idx < num_pyx
+            open(os.path.join(folder, f"f{idx}.pyx" if is_pyx else f"f{idx}.py"), 'w').close()
+            if (is_pyx and folder_template.startswith('src')):
+                expected_pyx += 1
+    return expected_pyx
+
+
+def timed(func, repeats:int) -> (float, list):
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=100_000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"Creating {args.files} files in {root}..")
+        expected = make_tree(root=root, num_files=args.files)
+
+        legacy_time, legacy_found = timed(lambda: legacy_cy_list(project_dir=root), repeats=args.repeats)
+        walk_time, walk_found = timed(lambda: walk_project(project_dir=root), repeats=args.repeats)
+        assert len(walk_found) == expected, f"walker found {len(walk_found)}, expected {expected}"
+
+        # Age the tree; folders changed in the last seconds are never trusted by the index
+        for folder, _, _ in os.walk(root):
+            os.utime(folder, ns=(10**18, 10**18))
+        index_path = os.path.join(tempfile.gettempdir(), 'bench_discovery_index.json')
+        cold_index = DiscoveryIndex(index_path=index_path, project_dir=root, extensions=('.pyx',))
+        cold_index.walk()
+        cold_index.save()
+
+        def warm_walk():
+            index = DiscoveryIndex(index_path=index_path, project_dir=root, extensions=('.pyx',))
+            index.load()
+            return index.walk()
+        index_time, index_found = timed(warm_walk, repeats=args.repeats)
+        os.remove(index_path)
+        assert len(index_found) == expected, f"index found {len(index_found)}, expected {expected}"
+
+        print(f"legacy rglob     {legacy_time * 1000:9.1f} ms   {len(legacy_found)} pyx files (includes build/)")
+        print(f"pruned scandir   {walk_time * 1000:9.1f} ms   {len(walk_found)} pyx files")
+        print(f"index, unchanged {index_time * 1000:9.1f} ms   {len(index_found)} pyx files (load + stat per folder)")
+        print(f"speedup          {legacy_time / walk_time:9.1f}x walk, {legacy_time / index_time:.1f}x index")
+
+
+if __name__ == '__main__':
+    main()
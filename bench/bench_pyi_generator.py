@@ -0,0 +1,147 @@
+""" Benchmark of pyi generation (pyx_to_pyi) on a large template-generated pyx file
+
+    python bench/bench_pyi_generator.py [--lines 50000]
+
+Writes a pyx file of classes, cdef/cpdef/def functions, enums, imports and bodies and compares the legacy generator
+(a LineConverter per line, all lines in memory) with the single-pass generator on time and peak memory. Both must
+produce the same pyi.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from cythonbuilder.pyigenerator import LineConverter, get_line_indentation_spacecount, pyx_to_pyi  # noqa: E402
+
+TEMPLATE = '''cimport numpy as np
+from libc.math cimport sqrt
+
+cpdef enum Kind{i}:
+    RED{i}='RED'
+    BLUE{i}='BLUE'
+
+cdef class Vector{i}(object):
+    cdef public double x
+    cdef public double y
+
+    def __init__(self, double x, double y):
+        self.x = x  # keep x
+        self.y = y
+
+    @property
+    def length(self) -> float:
+        return sqrt(self.x * self.x + self.y * self.y)
+
+    cpdef double dot(self, Vector{i} other, double scale=1.0):
+        cdef double result = self.x * other.x + self.y * other.y
+        return result * scale
+
+cdef inline int clamp{i}(int value, int low, int high):
+    if value < low:
+        return low
+    return high if value > high else value
+
+def total{i}(values, int start=0) -> int:
+    cdef int acc = start
+    for v in values:
+        acc += v
+    return acc
+
+'''
+
+
+def legacy_pyx_to_pyi(open_pyx) -> [str]:
+    """ pyx_to_pyi as it was: every line in memory several times, properties recomputed for every use """
+    pyx_lines = open_pyx.readlines()
+    pyx_lines = list(map(lambda l: l.split("#")[0].rstrip() if "#" in l else l, pyx_lines))
+    pyx_lines = [l.strip("\n") for l in pyx_lines]
+    pyx_lines = [l for l in pyx_lines if (len(l) > 0)]
+    all_indentations = [get_line_indentation_spacecount(line=l) for l in pyx_lines]
+    all_indentations = [i for i in all_indentations if (i > 0)]
+    spaces_for_one_tab = min(all_indentations)
+    for indent in all_indentations:
+        if (indent % spaces_for_one_tab != 0):
+            raise ValueError(f"Found invalid indentation: {indent} not divisible by {spaces_for_one_tab}")
+
+    py_lines = []
+    prev_line = None
+    contains_enum = False
+    for pyxline in pyx_lines:
+        ld = LineConverter(line=pyxline, file_spaces_for_one_tab=spaces_for_one_tab)
+        if (prev_line != None):
+            if (prev_line.is_class_def):
+                ld.in_class_body = True
+            elif (prev_line.in_class_body and not ld.is_class_def):
+                ld.in_class_body = True
+            if (prev_line.is_name_main_def or prev_line.in_name_main_body):
+                ld.in_name_main_body = True
+            if (prev_line.is_func_def):
+                ld.in_func_body = True
+            elif (prev_line.in_func_body and (not any([ld.is_class_def, ld.is_func_def, ld.is_enum_def]))):
+                ld.in_func_body = True
+            if (prev_line.is_enum_def):
+                ld.in_enum_body = True
+                contains_enum = True
+            elif (prev_line.in_enum_body and (not any([ld.is_class_def, ld.is_func_def, ld.is_enum_def]))):
+                ld.in_enum_body = True
+            if (ld.is_define_line):
+                ld.in_func_body = False
+                ld.in_class_body = False
+                ld.in_enum_body = False
+            if (not any([ld.in_class_body, ld.in_enum_body, ld.is_define_line])):
+                continue
+        prev_line = ld
+        if (ld.py_line not in ['   ', None]):
+            py_lines.append(ld.py_line)
+    if contains_enum:
+        py_lines.insert(0, "from enum import Enum\n")
+    return [f"{line}\n" for line in py_lines]
+
+
+def measure(func, pyx_path:str, repeats:int) -> (float, int, list):
+    """ Best time over [repeats] runs, peak traced memory of one run and the result """
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        with open(pyx_path, 'r', encoding='UTF-8') as f:
+            start = time.perf_counter()
+            result = func(f)
+            best = min(best, time.perf_counter() - start)
+    with open(pyx_path, 'r', encoding='UTF-8') as f:
+        tracemalloc.start()
+        func(f)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=50_000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    template_lines = TEMPLATE.count('\n')
+    with tempfile.TemporaryDirectory() as folder:
+        pyx_path = os.path.join(folder, 'generated.pyx')
+        with open(pyx_path, 'w', encoding='UTF-8') as f:
+            for i in range(max(1, args.lines // template_lines)):
+                f.write(TEMPLATE.format(i=i))
+        with open(pyx_path, 'r', encoding='UTF-8') as f:
+            num_lines = sum(1 for _ in f)
+
+        legacy_time, legacy_peak, legacy_result = measure(legacy_pyx_to_pyi, pyx_path=pyx_path, repeats=args.repeats)
+        stream_time, stream_peak, stream_result = measure(pyx_to_pyi, pyx_path=pyx_path, repeats=args.repeats)
+        assert legacy_result == stream_result, "single-pass generator output differs from the legacy generator"
+
+        print(f"{num_lines} pyx lines -> {len(stream_result)} pyi lines")
+        print(f"legacy       {legacy_time * 1000:9.1f} ms   peak {legacy_peak / 1024 / 1024:7.1f} MiB")
+        print(f"single-pass  {stream_time * 1000:9.1f} ms   peak {stream_peak / 1024 / 1024:7.1f} MiB")
+        print(f"speedup      {legacy_time / stream_time:9.1f}x, {legacy_peak / stream_peak:.1f}x less memory")
+
+
+if __name__ == '__main__':
+    main()
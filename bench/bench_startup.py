@@ -0,0 +1,92 @@
+""" Startup benchmark of `cybuilder list`, based on python -X importtime
+
+    python bench/bench_startup.py [--runs 10] [--budget-ms 25]
+
+Runs `python -m cythonbuilder list` in a small generated project with a warm bytecode cache and reports the wall time
+next to that of a bare interpreter, and the import time of cythonbuilder itself (the package and cythonbuilder.cli,
+minus typer, which every command needs). Fails when that import time is over the budget or when `list` imports a
+module that only building, benchmarking or watching needs.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+# Imported by build, bench or watch only; `list` must not pay for them
+HEAVY_MODULES = ['setuptools', 'distutils', 'Cython', 'numpy', 'concurrent.futures', 'multiprocessing', 'tomli', 'tomllib',
+                 'ctypes', 'statistics', 'html', 'hashlib', 'cythonbuilder.builder', 'cythonbuilder.artifact_cache', 'cythonbuilder.benchmark', 'cythonbuilder.profiler', 'cythonbuilder.scheduler', 'cythonbuilder.footprint',
+                 'cythonbuilder.hotspots', 'cythonbuilder.watcher', 'cythonbuilder.profiles', 'cythonbuilder.config']
+# import time: self [us] | cumulative | imported package
+_IMPORTTIME_REGEX = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def parse_importtime(stderr:str) -> {str: int}:
+    """ Cumulative import time in microseconds of every module in python -X importtime output """
+    modules = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_REGEX.match(line)
+        if (match is not None):
+            modules[match.group(4)] = int(match.group(2))
+    return modules
+
+
+def run(cmd:[str], cwd:str, env:dict) -> (float, str):
+    started = time.perf_counter()
+    completed = subprocess.run(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    duration = time.perf_counter() - started
+    if (completed.returncode != 0):
+        raise RuntimeError(f"{' '.join(cmd)} failed:\n{completed.stderr}")
+    return duration, completed.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=25.0, help="Maximum import time of cythonbuilder for `list`, typer excluded")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        project_dir = os.path.join(folder, 'project')
+        os.makedirs(os.path.join(project_dir, 'pkg'))
+        for i in range(20):
+            with open(os.path.join(project_dir, 'pkg', f"mod{i}.pyx"), 'w') as f:
+                f.write("cpdef int add(int a, int b):\n    return a + b\n")
+
+        # Measure an installed package: bytecode is cached, as it is after pip install
+        env = dict(os.environ, PYTHONPATH=os.path.abspath(SRC_DIR), PYTHONPYCACHEPREFIX=os.path.join(folder, 'pycache'))
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        list_cmd = [sys.executable, '-X', 'importtime', '-m', 'cythonbuilder', 'list']
+        run(cmd=list_cmd, cwd=project_dir, env=env)
+
+        bare_times, list_times, own_times = [], [], []
+        imported = {}
+        for _ in range(args.runs):
+            bare_times.append(run(cmd=[sys.executable, '-c', 'pass'], cwd=project_dir, env=env)[0])
+            duration, stderr = run(cmd=list_cmd, cwd=project_dir, env=env)
+            imported = parse_importtime(stderr=stderr)
+            list_times.append(duration)
+            own_times.append((imported['cythonbuilder'] + imported['cythonbuilder.cli'] - imported.get('typer', 0)) / 1e6)
+
+    heavy = [m for m in HEAVY_MODULES if (m in imported)]
+    own_median = statistics.median(own_times)
+    print(f"bare interpreter      {statistics.median(bare_times) * 1000:7.1f} ms")
+    print(f"cybuilder list        {statistics.median(list_times) * 1000:7.1f} ms")
+    print(f"  typer import        {imported.get('typer', 0) / 1000:7.1f} ms")
+    print(f"  cythonbuilder       {own_median * 1000:7.1f} ms   (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if (own_median * 1000 > args.budget_ms):
+        print("FAIL: cythonbuilder import time is over the budget")
+        failed = True
+    if (len(heavy) > 0):
+        print(f"FAIL: `list` imports {', '.join(heavy)}")
+        failed = True
+    sys.exit(1 if (failed) else 0)
+
+
+if __name__ == '__main__':
+    main()
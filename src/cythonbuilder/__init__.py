@@ -1,2 +1,17 @@
 from . import pyigenerator
 from .logs import logger
+
+# cythonbuilder.cy_build() etc. without importing the build machinery on `import cythonbuilder`
+_LAZY_ATTRIBUTES = {
+    'cy_init': 'cython_builder', 'cy_list': 'cython_builder', 'cy_build': 'cython_builder', 'cy_pgo': 'cython_builder',
+    'cy_deps': 'cython_builder', 'cy_clean': 'cython_builder', 'cy_interface': 'cython_builder', 'cy_hotspots': 'cython_builder',
+    'cy_profile': 'cython_builder', 'cy_bench': 'cython_builder', 'cy_watch': 'cython_builder', 'CythonBuildError': 'cython_builder',
+    'Builder': 'builder', 'BuildOptions': 'builder', 'BuildResult': 'builder', 'TargetResult': 'builder',
+}
+
+
+def __getattr__(name:str):
+    if (name not in _LAZY_ATTRIBUTES):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    return getattr(importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__), name)
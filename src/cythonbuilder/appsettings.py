@@ -5,4 +5,85 @@ console_name = 'cybuilder'
 cython_build_dirname = 'build'
 cython_extensions_dirname = 'ext'
 cython_anno_dirname = os.path.join(cython_extensions_dirname, 'annotations')
-
+cython_manifest_path = os.path.join(cython_extensions_dirname, 'build_manifest.json')
+cython_interface_manifest_path = os.path.join(cython_extensions_dirname, 'interface_manifest.json')
+# Every file the builds produced per pyx file (C, html, pyi, extensions); `cybuilder clean` removes exactly these
+cython_artifact_manifest_path = os.path.join(cython_extensions_dirname, 'artifact_manifest.json')
+cython_discovery_index_path = os.path.join(cython_extensions_dirname, 'discovery_index.json')
+cython_pgo_dirname = os.path.join(cython_extensions_dirname, 'pgo')
+cython_bench_dirname = os.path.join(cython_extensions_dirname, 'bench')
+# Instrumented builds (`cybuilder build --instrument`) are installed in <dir>/<abi> with their own manifest, so they
+# never replace the extensions next to the pyx files
+cython_instrumented_dirname = os.path.join(cython_extensions_dirname, 'instrumented')
+cython_profile_dirname = os.path.join(cython_extensions_dirname, 'profile')
+# Persistent build folder; every ABI and profile gets its own <abi>/<profile> folder in it. Set 'build_dir' in
+# [tool.cythonbuilder] to move it
+cython_build_root = os.path.join(cython_extensions_dirname, 'build')
+# File name (plus the extension suffix) of the shared library `cybuilder build --bundle` links a package's modules into
+cython_bundle_name = '__cybundle__'
+# Folders that are never searched for pyx files. Virtual environments (containing pyvenv.cfg) are skipped as well
+default_excluded_dirnames = ['.git', '.hg', '.svn', 'node_modules', 'build', 'dist', '.tox', '.nox', '.eggs', '*.egg-info', '__pycache__', '.mypy_cache', '.pytest_cache', '.ruff_cache']
+# Named compiler settings for `cybuilder build --profile`. More can be added in pyproject.toml under
+# [tool.cythonbuilder.profiles.<name>]. 'msvc' holds the replacements used on Windows. The optimized profiles use the
+# 'fast' directives (see directive_presets); 'default' and 'debug' keep Cython's safety checks
+build_profiles = {
+    'default': {},
+    'release': {
+        'extra_compile_args': ['-O3'],
+        'msvc': {'extra_compile_args': ['/O2']},
+        'directives': 'fast',
+    },
+    'native': {
+        'extra_compile_args': ['-O3', '-march=native'],
+        'msvc': {'extra_compile_args': ['/O2', '/arch:AVX2']},
+        'directives': 'fast',
+    },
+    'lto': {
+        'extra_compile_args': ['-O3', '-flto'],
+        'extra_link_args': ['-O3', '-flto'],
+        'msvc': {'extra_compile_args': ['/O2', '/GL'], 'extra_link_args': ['/LTCG']},
+        'directives': 'fast',
+    },
+    'debug': {
+        'extra_compile_args': ['-O0', '-g'],
+        'extra_link_args': ['-g'],
+        'msvc': {'extra_compile_args': ['/Od', '/Zi'], 'extra_link_args': ['/DEBUG']},
+    },
+}
+# Size limit of the built-in object cache (see compiler_cache.py); least recently used objects are removed beyond it
+compiler_cache_max_size = 1024 * 1024 * 1024
+# Seconds to wait for an http(s) artifact cache (see artifact_cache.py) before building the extension locally
+artifact_cache_timeout = 10
+# Number of artifacts fetched from or published to the artifact cache at the same time
+artifact_cache_connections = 8
+# Cost model of the build scheduler (see scheduler.py) for modules that were never built: generated C is about
+# (bytes per module + bytes per byte of pyx/pxd/pxi source), compiled at seconds per byte of C, using the memory below.
+# Once built, a module's measured duration and peak memory are used instead
+scheduler_c_size_estimate = (200 * 1024, 40)
+scheduler_seconds_per_c_byte = 4.0 / (1024 * 1024)
+scheduler_default_memory = 300 * 1024 * 1024
+# Share of the available memory parallel compilers may use together; set 'max_memory_mb' in [tool.cythonbuilder] to
+# give a fixed limit
+scheduler_memory_share = 0.8
+# What an instrumented build adds: Cython reports calls and lines to cProfile and sys.settrace tracers, also from
+# nogil code
+instrument_directives = {'profile': True, 'linetrace': True, 'binding': True}
+instrument_macros = [('CYTHON_TRACE', '1'), ('CYTHON_TRACE_NOGIL', '1')]
+# What a small build (`cybuilder build --small`) adds to the profile: symbols hidden except the PyInit function, every
+# function and variable in its own section so the linker drops the unused ones, and no symbol table. Cython leaves out
+# the pyx lines it copies into the C file as comments
+small_build = {
+    'extra_compile_args': ['-fvisibility=hidden', '-ffunction-sections', '-fdata-sections'],
+    'extra_link_args': ['-Wl,--gc-sections', '-s'],
+    'darwin': {'extra_link_args': ['-Wl,-dead_strip', '-Wl,-x']},
+    'msvc': {'extra_compile_args': ['/Gy', '/Gw'], 'extra_link_args': ['/OPT:REF', '/OPT:ICF']},
+}
+small_directives = {'emit_code_comments': False}
+# Number of fresh interpreters that import an extension to measure its import time (see footprint.py)
+footprint_repeats = 5
+# Named sets of Cython compiler directives for `cybuilder build --directives` and [tool.cythonbuilder] directives.
+# 'fast' drops the safety checks for release builds, 'safe' keeps them on for development
+directive_presets = {
+    'safe': {'boundscheck': True, 'wraparound': True, 'initializedcheck': True, 'nonecheck': True, 'cdivision': False},
+    'fast': {'boundscheck': False, 'wraparound': False, 'initializedcheck': False, 'nonecheck': False, 'cdivision': True},
+}
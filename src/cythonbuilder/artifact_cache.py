@@ -0,0 +1,213 @@
+import functools
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sysconfig
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from . import appsettings
+from .build_manifest import artifact_path, bundle_path
+from .dependencies import dotted_module_name
+from .helpers import FilesAndFolders
+from .logs import logger
+
+ARTIFACT_KEY_VERSION = 1
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_identity() -> str:
+    """ First line of `<compiler> --version`: two machines with the same compiler command can have different compilers """
+    compiler = os.environ.get('CC', sysconfig.get_config_var('CC') or 'cc').split()
+    try:
+        completed = subprocess.run(compiler[:1] + ['--version'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return compiler[0] if (len(compiler) > 0) else ''
+    lines = completed.stdout.strip().splitlines()
+    return lines[0] if (len(lines) > 0) else compiler[0]
+
+
+def is_portable(fingerprint:dict) -> bool:
+    """ False when the compiler flags target the building machine (-march=native and the like); such an artifact may
+        crash on the next machine, so it is neither restored nor published
+    """
+    profile = fingerprint.get('profile', {})
+    flags = profile.get('extra_compile_args', []) + profile.get('extra_link_args', []) + list(fingerprint.get('env_flags', {}).values())
+    return not any('native' in flag for flag in flags)
+
+
+def artifact_key(fingerprints:[dict]) -> str:
+    """ Content address of the extension built from the modules with these build fingerprints (one, or all modules of a
+        bundle). Leaves out what only differs between machines, like the absolute numpy include folder (its version
+        is in the fingerprint), and adds the compiler version
+    """
+    portable = []
+    for fingerprint in fingerprints:
+        fingerprint = dict(fingerprint)
+        fingerprint.pop('include_dirs', None)
+        portable.append(fingerprint)
+    content = {
+        'version': ARTIFACT_KEY_VERSION,
+        'compiler_identity': compiler_identity(),
+        'fingerprints': sorted(portable, key=lambda f: f.get('module_name') or ''),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+class ArtifactStore:
+    """ Where finished extensions are shared between machines. An entry is a [key] (see artifact_key) holding named
+        files: 'extension' and an annotation html per module. Implementations never raise on network or disk errors: a
+        failed fetch is a miss and a failed publish is logged, the build goes on either way
+    """
+    name = None
+
+    def fetch(self, key:str, name:str, dst_path:str) -> bool:
+        """ Writes the file [name] of entry [key] to [dst_path]; False when it is not in the store """
+        raise NotImplementedError
+
+    def publish(self, key:str, name:str, src_path:str) -> None:
+        raise NotImplementedError
+
+
+class DirectoryStore(ArtifactStore):
+    """ A folder, local or on a shared (NFS/SMB) mount: <root>/<key[:2]>/<key>/<name>. Files are written through a
+        temp file and a rename, so machines can publish the same entry at the same time
+    """
+    name = 'directory'
+
+    def __init__(self, root:str):
+        self.root = root
+
+    def _path(self, key:str, name:str) -> str:
+        return os.path.join(self.root, key[:2], key, name)
+
+    def fetch(self, key:str, name:str, dst_path:str) -> bool:
+        try:
+            shutil.copyfile(self._path(key=key, name=name), dst_path)
+        except OSError:
+            return False
+        return True
+
+    def publish(self, key:str, name:str, src_path:str) -> None:
+        stored_path = self._path(key=key, name=name)
+        tmp_path = f"{stored_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, stored_path)
+        except OSError as e:
+            logger.debug(msg=f"[{DirectoryStore.publish.__name__}] - cannot publish {src_path} to {self.root}: {e}")
+            if (os.path.isfile(tmp_path)):
+                os.remove(tmp_path)
+
+
+class HttpStore(ArtifactStore):
+    """ An HTTP server: GET and PUT <url>/<key>/<name>, like nginx with WebDAV, a bucket behind a proxy or any server that
+        stores what is PUT. $CYTHONBUILDER_ARTIFACT_CACHE_TOKEN is sent as a bearer token
+    """
+    name = 'http'
+
+    def __init__(self, url:str, timeout:float=appsettings.artifact_cache_timeout):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.headers = {}
+        if (os.environ.get('CYTHONBUILDER_ARTIFACT_CACHE_TOKEN')):
+            self.headers['Authorization'] = f"Bearer {os.environ['CYTHONBUILDER_ARTIFACT_CACHE_TOKEN']}"
+
+    def _url(self, key:str, name:str) -> str:
+        return f"{self.url}/{key}/{urllib.parse.quote(name)}"
+
+    def fetch(self, key:str, name:str, dst_path:str) -> bool:
+        request = urllib.request.Request(self._url(key=key, name=name), headers=self.headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response, open(dst_path, 'wb') as f:
+                shutil.copyfileobj(response, f)
+                # Reading in chunks does not notice a connection that closed early
+                expected_size = response.headers.get('Content-Length')
+                if (expected_size is not None and f.tell() != int(expected_size)):
+                    raise http.client.IncompleteRead(partial=b'', expected=int(expected_size) - f.tell())
+        except (OSError, urllib.error.URLError, http.client.HTTPException, ValueError) as e:
+            logger.debug(msg=f"[{HttpStore.fetch.__name__}] - {key}/{name} not fetched: {e}")
+            return False
+        return True
+
+    def publish(self, key:str, name:str, src_path:str) -> None:
+        with open(src_path, 'rb') as f:
+            data = f.read()
+        request = urllib.request.Request(self._url(key=key, name=name), data=data, method='PUT', headers=dict(self.headers, **{'Content-Type': 'application/octet-stream'}))
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except (OSError, urllib.error.URLError, http.client.HTTPException) as e:
+            logger.debug(msg=f"[{HttpStore.publish.__name__}] - cannot publish {key}/{name} to {self.url}: {e}")
+
+
+# URL scheme -> store class; register another class here for another kind of storage
+ARTIFACT_STORES = {
+    'file': DirectoryStore,
+    'http': HttpStore,
+    'https': HttpStore,
+}
+
+
+def open_artifact_store(location:str) -> ArtifactStore:
+    """ The store at [location]: a folder path, a file:// url or an http(s):// url. None for None, '' or 'none' """
+    if (location is None or location in ('', 'none')):
+        return None
+    scheme = urllib.parse.urlparse(location).scheme
+    if (scheme in ('', 'file') or len(scheme) == 1):
+        # a bare path; a single letter scheme is a Windows drive
+        path = urllib.parse.urlparse(location).path if (scheme == 'file') else location
+        return DirectoryStore(root=os.path.expanduser(path))
+    if (scheme not in ARTIFACT_STORES):
+        raise ValueError(f"[{open_artifact_store.__name__}] - no artifact store for '{scheme}://' urls; choose from {', '.join(sorted(ARTIFACT_STORES))} or a folder")
+    return ARTIFACT_STORES[scheme](location)
+
+
+def _annotation_name(pyx_fullpath:str) -> str:
+    return f"{dotted_module_name(filepath=pyx_fullpath)}.html"
+
+
+def restore_artifact(store:ArtifactStore, key:str, target_files:[str], create_annotations:bool, tmp_dir:str, bundle_dir:str=None) -> bool:
+    """ Installs the extension of [target_files] (one file, or all modules of the bundle of the package in
+        [bundle_dir]) from the store, with their annotation html when [create_annotations]. Nothing is installed unless
+        every file of the entry could be fetched into [tmp_dir]. Returns whether it was restored
+    """
+    fetched = {'extension': os.path.join(tmp_dir, 'extension')}
+    if (create_annotations):
+        fetched.update({_annotation_name(pyx_fullpath=n): os.path.join(tmp_dir, _annotation_name(pyx_fullpath=n)) for n in target_files})
+    for name, tmp_path in fetched.items():
+        if (not store.fetch(key=key, name=name, dst_path=tmp_path)):
+            return False
+    # stores keep the content only; shared libraries are installed executable, like the linker leaves them
+    os.chmod(fetched['extension'], 0o755)
+    if (bundle_dir is None):
+        FilesAndFolders.install_file(srcfilename=fetched['extension'], dstfilename=artifact_path(pyx_fullpath=target_files[0]))
+    else:
+        FilesAndFolders.install_file(srcfilename=fetched['extension'], dstfilename=bundle_path(package_dir=bundle_dir))
+        for n in target_files:
+            FilesAndFolders.install_link(srcfilename=bundle_path(package_dir=bundle_dir), dstfilename=artifact_path(pyx_fullpath=n))
+    # the annotations are where Cython writes them; cy_clean moves them to ext/annotations
+    if (create_annotations):
+        for n in target_files:
+            FilesAndFolders.install_file(srcfilename=fetched[_annotation_name(pyx_fullpath=n)], dstfilename=f"{os.path.splitext(n)[0]}.html")
+    for tmp_path in fetched.values():
+        os.remove(tmp_path)
+    return True
+
+
+def publish_artifact(store:ArtifactStore, key:str, target_files:[str], create_annotations:bool, bundle_dir:str=None) -> None:
+    """ Stores the freshly built extension of [target_files] and their annotations. The extension goes last, so a
+        machine that finds it (almost always) finds the annotations as well
+    """
+    if (create_annotations):
+        for n in target_files:
+            html_path = f"{os.path.splitext(n)[0]}.html"
+            if (not os.path.isfile(html_path)):
+                return
+            store.publish(key=key, name=_annotation_name(pyx_fullpath=n), src_path=html_path)
+    store.publish(key=key, name='extension', src_path=artifact_path(pyx_fullpath=target_files[0]) if (bundle_dir is None) else bundle_path(package_dir=bundle_dir))
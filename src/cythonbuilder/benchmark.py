@@ -0,0 +1,176 @@
+import fnmatch
+import importlib.util
+import os
+import statistics
+import sys
+import time
+import types
+from dataclasses import dataclass, field
+
+from .build_manifest import artifact_path
+from .logs import logger
+
+
+@dataclass
+class Timing:
+    """ Seconds per call of a benchmark function over [repeats] rounds of [number] calls each """
+    number: int
+    times: [float]
+    median: float = 0.0
+    p95: float = 0.0
+    min: float = 0.0
+
+    def __post_init__(self):
+        if (len(self.times) > 0):
+            self.median = statistics.median(self.times)
+            self.p95 = percentile(values=self.times, pct=95)
+            self.min = min(self.times)
+
+
+@dataclass
+class BenchmarkResult:
+    file: str               # the pyx file, relative to the project
+    bench_file: str
+    name: str
+    compiled: Timing = None
+    python: Timing = None   # the pyx file imported as plain Python (or its pure-Python .py twin)
+    speedup: float = None   # python median / compiled median
+    baseline: Timing = None  # compiled timing of the same benchmark in an earlier report
+    baseline_speedup: float = None  # baseline median / compiled median
+    errors: {str: str} = field(default_factory=dict)
+
+
+def percentile(values:[float], pct:float) -> float:
+    """ Linear interpolation between the closest ranks """
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def discover_benchmarks(pyx_fullpath:str, project_dir:str, config:dict=None) -> [str]:
+    """ Benchmark files of a pyx file: bench_<module>.py next to it, and the files listed for it (by glob, relative to
+        the project) in [tool.cythonbuilder.bench] files
+    """
+    module_name = os.path.splitext(os.path.basename(pyx_fullpath))[0]
+    bench_files = []
+    next_to = os.path.join(os.path.dirname(pyx_fullpath), f"bench_{module_name}.py")
+    if (os.path.isfile(next_to)):
+        bench_files.append(next_to)
+
+    relpath = os.path.relpath(pyx_fullpath, project_dir).replace(os.sep, '/')
+    configured = ({} if (config is None) else config).get('bench', {}).get('files', {})
+    for pattern, paths in configured.items():
+        if (not fnmatch.fnmatch(relpath, pattern)):
+            continue
+        for path in [paths] if (isinstance(paths, str)) else paths:
+            fullpath = os.path.join(project_dir, path)
+            if (not os.path.isfile(fullpath)):
+                raise ValueError(f"[{discover_benchmarks.__name__}] - benchmark file {path} for {relpath} does not exist")
+            if (fullpath not in bench_files):
+                bench_files.append(fullpath)
+    return bench_files
+
+
+def load_compiled_module(pyx_fullpath:str) -> types.ModuleType:
+    """ The built extension next to the pyx file; not added to sys.modules so it can be compared to the Python version """
+    so_path = artifact_path(pyx_fullpath=pyx_fullpath)
+    if (not os.path.isfile(so_path)):
+        raise ImportError(f"{os.path.basename(so_path)} not found; build first")
+    module_name = os.path.splitext(os.path.basename(pyx_fullpath))[0]
+    spec = importlib.util.spec_from_file_location(module_name, so_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_python_module(pyx_fullpath:str) -> types.ModuleType:
+    """ The pure-Python .py twin of the pyx file if there is one, else the pyx source executed as Python. Fails with a
+        SyntaxError for pyx files that use cdef and other Cython syntax
+    """
+    module_name = os.path.splitext(os.path.basename(pyx_fullpath))[0]
+    py_path = f"{os.path.splitext(pyx_fullpath)[0]}.py"
+    source_path = py_path if (os.path.isfile(py_path)) else pyx_fullpath
+    with open(source_path, 'r', encoding='UTF-8') as f:
+        code = compile(f.read(), source_path, 'exec')
+    module = types.ModuleType(module_name)
+    module.__file__ = source_path
+    exec(code, module.__dict__)
+    return module
+
+
+def load_bench_functions(bench_file:str) -> {str: object}:
+    """ The bench_* functions of a benchmark file. Each takes the module under test as its only argument """
+    module_name = f"_cybuilder_{os.path.splitext(os.path.basename(bench_file))[0]}"
+    spec = importlib.util.spec_from_file_location(module_name, bench_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return {name: func for name, func in vars(module).items() if (name.startswith('bench_') and callable(func))}
+
+
+def time_function(func, module:types.ModuleType, warmup:int=1, repeats:int=7, min_time:float=0.05) -> Timing:
+    """ Calls func(module) in rounds. The number of calls per round is doubled until a round takes [min_time] seconds,
+        then [warmup] rounds are discarded and [repeats] rounds are timed
+    """
+    number = 1
+    while (True):
+        started = time.perf_counter()
+        for _ in range(number):
+            func(module)
+        if (time.perf_counter() - started >= min_time or number >= 2**24):
+            break
+        number *= 2
+
+    times = []
+    for i in range(warmup + repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            func(module)
+        if (i >= warmup):
+            times.append((time.perf_counter() - started) / number)
+    return Timing(number=number, times=times)
+
+
+def run_benchmarks(pyx_fullpath:str, bench_files:[str], project_dir:str, warmup:int=1, repeats:int=7, min_time:float=0.05) -> [BenchmarkResult]:
+    """ Times every benchmark function against the compiled extension and the Python version of the pyx file """
+    relpath = lambda p: os.path.relpath(p, project_dir).replace(os.sep, '/')
+    modules:{str: types.ModuleType} = {}
+    load_errors:{str: str} = {}
+    for variant, load in [('compiled', load_compiled_module), ('python', load_python_module)]:
+        try:
+            modules[variant] = load(pyx_fullpath=pyx_fullpath)
+        except (Exception, SystemExit) as e:
+            load_errors[variant] = f"{type(e).__name__}: {e}"
+            logger.debug(msg=f"[{run_benchmarks.__name__}] - cannot load {variant} version of {pyx_fullpath}: {e}")
+
+    results = []
+    # bench files import the project like the tests would
+    sys.path.insert(0, project_dir)
+    try:
+        for bench_file in bench_files:
+            for name, func in load_bench_functions(bench_file=bench_file).items():
+                result = BenchmarkResult(file=relpath(pyx_fullpath), bench_file=relpath(bench_file), name=name, errors=dict(load_errors))
+                for variant, module in modules.items():
+                    try:
+                        setattr(result, variant, time_function(func=func, module=module, warmup=warmup, repeats=repeats, min_time=min_time))
+                    except Exception as e:
+                        result.errors[variant] = f"{type(e).__name__}: {e}"
+                if (result.compiled is not None and result.python is not None and result.compiled.median > 0):
+                    result.speedup = result.python.median / result.compiled.median
+                results.append(result)
+    finally:
+        sys.path.remove(project_dir)
+    return results
+
+
+def compare_to_baseline(results:[BenchmarkResult], baseline:dict) -> None:
+    """ Adds the compiled timings of an earlier report (as saved by cy_bench) to [results] """
+    earlier = {(b['file'], b['name']): b.get('compiled') for b in baseline.get('benchmarks', [])}
+    for result in results:
+        timing = earlier.get((result.file, result.name))
+        if (timing is None):
+            continue
+        result.baseline = Timing(number=timing['number'], times=timing['times'])
+        if (result.compiled is not None and result.compiled.median > 0):
+            result.baseline_speedup = result.baseline.median / result.compiled.median
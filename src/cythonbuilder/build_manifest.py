@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import sys
+import sysconfig
+
+from . import appsettings
+from .logs import logger
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(filepath:str) -> str:
+    """ sha256 hex digest of the content of a file """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def extension_suffix() -> str:
+    """ Suffix of compiled extensions for this interpreter, like .cpython-39-x86_64-linux-gnu.so. Identifies the ABI """
+    return sysconfig.get_config_var('EXT_SUFFIX')
+
+
+def abi_tag() -> str:
+    """ extension_suffix() as a folder name, like cpython-39-x86_64-linux-gnu. Builds for different interpreters must
+        not share object files
+    """
+    tag = os.path.splitext(extension_suffix())[0].strip('.')
+    return tag if (len(tag) > 0) else f"py{sys.version_info.major}{sys.version_info.minor}"
+
+
+def artifact_path(pyx_fullpath:str, install_dir:str=None) -> str:
+    """ Where the compiled extension of a pyx file ends up after building: right next to the pyx file, or named after
+        its dotted module name in [install_dir] for a build variant that must not replace it (see instrumented builds)
+    """
+    if (install_dir is not None):
+        from .dependencies import dotted_module_name
+        return os.path.join(install_dir, f"{dotted_module_name(filepath=pyx_fullpath)}{extension_suffix()}")
+    module_name = os.path.splitext(os.path.basename(pyx_fullpath))[0]
+    return os.path.join(os.path.dirname(pyx_fullpath), f"{module_name}{extension_suffix()}")
+
+
+def bundle_path(package_dir:str) -> str:
+    """ The shared library all modules of the package in [package_dir] are linked into by a bundled build. Each module's
+        artifact_path is a symlink to it
+    """
+    return os.path.join(package_dir, f"{appsettings.cython_bundle_name}{extension_suffix()}")
+
+
+def build_fingerprint(pyx_fullpath:str, include_dirs:[str], profile:dict, create_annotations:bool, dependency_hashes:{str: str}=None, directives:dict=None,
+                      module_name:str=None, bundle:str=None, openmp:bool=False) -> dict:
+    """ Everything that determines the outcome of building a pyx file. A changed value means the file must be rebuilt.
+        [profile] is BuildProfile.fingerprint() of the compiler settings used, [directives] the Cython compiler directives.
+        [dependency_hashes] holds the hashes of the pxd/pxi/header files the pyx file depends on (see dependencies.py).
+        [module_name] is the dotted module name, [bundle] the package whose bundle the module is linked into, if any.
+        [openmp] is whether it is compiled and linked with OpenMP
+    """
+    import Cython
+
+    numpy_version = None
+    if (len(include_dirs) > 0 and 'numpy' in sys.modules):
+        numpy_version = sys.modules['numpy'].__version__
+    return {
+        'source_hash': file_hash(filepath=pyx_fullpath),
+        'dependency_hashes': {} if (dependency_hashes is None) else dependency_hashes,
+        'cython_version': Cython.__version__,
+        'compiler': os.environ.get('CC', sysconfig.get_config_var('CC')),
+        'profile': profile,
+        'directives': {} if (directives is None) else directives,
+        'module_name': module_name,
+        'bundle': bundle,
+        'openmp': openmp,
+        'env_flags': {k: os.environ[k] for k in ['CFLAGS', 'CPPFLAGS', 'LDFLAGS'] if (k in os.environ)},
+        'include_dirs': list(include_dirs),
+        'numpy_version': numpy_version,
+        'python_abi': extension_suffix(),
+        'annotate': create_annotations,
+    }
+
+
+class BuildManifest:
+    """ Persistent record of the inputs each pyx file was last built from. Lives in projdir/ext. [install_dir] is where
+        the extensions are installed, if not next to their pyx files (see artifact_path)
+    """
+
+    def __init__(self, manifest_path:str, project_dir:str, install_dir:str=None):
+        self.manifest_path = manifest_path
+        self.project_dir = project_dir
+        self.install_dir = install_dir
+        self.targets:{str: dict} = {}
+        self.load()
+
+    def _key(self, pyx_fullpath:str) -> str:
+        """ Targets are stored relative to the project so the manifest survives moving the project """
+        return os.path.relpath(pyx_fullpath, self.project_dir).replace(os.sep, '/')
+
+    def load(self) -> None:
+        if (not os.path.isfile(self.manifest_path)):
+            return
+        try:
+            with open(self.manifest_path, 'r') as f:
+                content = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug(msg=f"[{BuildManifest.load.__name__}] - ignoring unreadable manifest {self.manifest_path}: {e}")
+            return
+        if (content.get('version') != MANIFEST_VERSION):
+            logger.debug(msg=f"[{BuildManifest.load.__name__}] - ignoring manifest with version {content.get('version')}")
+            return
+        self.targets = content.get('targets', {})
+
+    def save(self) -> None:
+        """ Writes to a temp file first so an interrupted build never leaves a half written manifest """
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'targets': self.targets}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_up_to_date(self, pyx_fullpath:str, fingerprint:dict) -> bool:
+        """ True if the pyx file was built from exactly these inputs and its artifact still exists """
+        entry = self.targets.get(self._key(pyx_fullpath=pyx_fullpath))
+        if (entry is None or entry.get('fingerprint') != fingerprint):
+            return False
+        return os.path.isfile(artifact_path(pyx_fullpath=pyx_fullpath, install_dir=self.install_dir))
+
+    def record(self, pyx_fullpath:str, fingerprint:dict, stats:dict=None) -> None:
+        """ [stats] is what building the file cost (see _build_target); the scheduler plans the next build with it """
+        entry = {'fingerprint': fingerprint}
+        if (stats is not None):
+            entry['stats'] = stats
+        self.targets[self._key(pyx_fullpath=pyx_fullpath)] = entry
+
+    def stats_of(self, pyx_fullpath:str) -> dict:
+        """ Duration, generated C size and peak memory of the last build of a pyx file, None if unknown """
+        return self.targets.get(self._key(pyx_fullpath=pyx_fullpath), {}).get('stats')
+
+    def profile_of(self, pyx_fullpath:str) -> str:
+        """ Name of the build profile that produced the current artifact of a pyx file, None if unknown """
+        entry = self.targets.get(self._key(pyx_fullpath=pyx_fullpath), {})
+        return entry.get('fingerprint', {}).get('profile', {}).get('name')
+
+    def forget(self, pyx_fullpath:str) -> None:
+        self.targets.pop(self._key(pyx_fullpath=pyx_fullpath), None)
+
+
+class InterfaceManifest(BuildManifest):
+    """ Record of the pyx source each pyi file was generated from, and of the pyi it produced. Lives in projdir/ext """
+
+    def is_up_to_date(self, pyx_fullpath:str, fingerprint:dict) -> bool:
+        """ True if the pyi was generated from exactly these inputs and nobody changed or removed it since """
+        entry = self.targets.get(self._key(pyx_fullpath=pyx_fullpath))
+        if (entry is None or entry.get('fingerprint') != fingerprint):
+            return False
+        pyi_fullpath = f"{os.path.splitext(pyx_fullpath)[0]}.pyi"
+        return os.path.isfile(pyi_fullpath) and file_hash(filepath=pyi_fullpath) == entry.get('pyi_hash')
+
+    def record(self, pyx_fullpath:str, fingerprint:dict, pyi_hash:str=None) -> None:
+        self.targets[self._key(pyx_fullpath=pyx_fullpath)] = {'fingerprint': fingerprint, 'pyi_hash': pyi_hash}
+
+
+class ArtifactManifest:
+    """ Record of every file the builds produced for each pyx file, so cleaning removes exactly those without searching
+        the project. Lives in projdir/ext. Files are recorded by kind: 'c', 'html', 'pyi' and per ABI the extension
+        ('extension <abi>'), the bundle it links to ('bundle <abi>') and the instrumented extension ('instrumented <abi>').
+        A file that was replaced by another one of the same kind, and that no other pyx file still uses (like a
+        bundle after building without --bundle), is kept in a stale list until it is removed
+    """
+
+    def __init__(self, manifest_path:str, project_dir:str):
+        self.manifest_path = manifest_path
+        self.project_dir = project_dir
+        self.sources:{str: {str: str}} = {}
+        self.stale:[str] = []
+        self.load()
+
+    def _rel(self, path:str) -> str:
+        return os.path.relpath(path, self.project_dir).replace(os.sep, '/')
+
+    def _abs(self, relpath:str) -> str:
+        return os.path.join(self.project_dir, relpath.replace('/', os.sep))
+
+    def load(self) -> None:
+        if (not os.path.isfile(self.manifest_path)):
+            return
+        try:
+            with open(self.manifest_path, 'r') as f:
+                content = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug(msg=f"[{ArtifactManifest.load.__name__}] - ignoring unreadable manifest {self.manifest_path}: {e}")
+            return
+        if (content.get('version') != MANIFEST_VERSION):
+            logger.debug(msg=f"[{ArtifactManifest.load.__name__}] - ignoring manifest with version {content.get('version')}")
+            return
+        self.sources = content.get('sources', {})
+        self.stale = content.get('stale', [])
+
+    def save(self) -> None:
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'sources': self.sources, 'stale': sorted(set(self.stale))}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _in_use(self, relpath:str) -> bool:
+        return any(relpath in artifacts.values() for artifacts in self.sources.values())
+
+    def record(self, pyx_fullpath:str, kind:str, path:str) -> None:
+        artifacts = self.sources.setdefault(self._rel(path=pyx_fullpath), {})
+        previous = artifacts.get(kind)
+        artifacts[kind] = self._rel(path=path)
+        if (artifacts[kind] in self.stale):
+            self.stale.remove(artifacts[kind])
+        if (previous is not None and previous != artifacts[kind] and not self._in_use(relpath=previous)):
+            self.stale.append(previous)
+
+    def forget(self, pyx_fullpath:str, kinds:[str]=None) -> [str]:
+        """ Stops tracking the [kinds] of artifacts (default all) of a pyx file. Returns their paths that no other pyx file
+            uses, for the caller to remove
+        """
+        artifacts = self.sources.get(self._rel(path=pyx_fullpath), {})
+        relpaths = [artifacts.pop(kind) for kind in (list(artifacts) if (kinds is None) else kinds) if (kind in artifacts)]
+        if (len(artifacts) == 0):
+            self.sources.pop(self._rel(path=pyx_fullpath), None)
+        return [self._abs(relpath=p) for p in relpaths if (not self._in_use(relpath=p))]
+
+    def retire(self, pyx_fullpath:str, kinds:[str]) -> None:
+        """ Stops tracking the [kinds] of artifacts of a pyx file; the ones no other pyx file uses become stale """
+        self.stale += [self._rel(path=p) for p in self.forget(pyx_fullpath=pyx_fullpath, kinds=kinds)]
+
+    def path_of(self, pyx_fullpath:str, kind:str) -> str:
+        relpath = self.sources.get(self._rel(path=pyx_fullpath), {}).get(kind)
+        return None if (relpath is None) else self._abs(relpath=relpath)
+
+    def targets(self) -> [str]:
+        """ The pyx files with recorded artifacts """
+        return [self._abs(relpath=p) for p in self.sources]
+
+    def orphans(self) -> [str]:
+        """ The pyx files with recorded artifacts that no longer exist """
+        return [n for n in self.targets() if (not os.path.isfile(n))]
+
+    def remove(self, pyx_fullpath:str, kinds:[str]=None) -> [str]:
+        """ Removes the [kinds] of artifacts (default all) of a pyx file. Returns the removed files """
+        return self._remove_files(paths=self.forget(pyx_fullpath=pyx_fullpath, kinds=kinds))
+
+    def remove_stale(self) -> [str]:
+        """ Removes the files that were replaced since and that no pyx file uses. Returns the removed files """
+        paths = [self._abs(relpath=p) for p in self.stale if (not self._in_use(relpath=p))]
+        self.stale = []
+        return self._remove_files(paths=paths)
+
+    @staticmethod
+    def _remove_files(paths:[str]) -> [str]:
+        removed = []
+        for path in paths:
+            # lexists: the extension of a bundled module is a symlink, possibly to a bundle that is gone already
+            if (not os.path.lexists(path)):
+                continue
+            os.remove(path)
+            removed.append(path)
+        return removed
@@ -0,0 +1,679 @@
+import contextlib
+import dataclasses
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+from . import appsettings
+from .artifact_cache import artifact_key, is_portable, open_artifact_store, publish_artifact, restore_artifact
+from .build_manifest import ArtifactManifest, BuildManifest, abi_tag, artifact_path, build_fingerprint, bundle_path
+from .compiler_cache import CacheStats, ObjectCache, default_cache_dir, install_compiler_cache, launcher_counters, resolve_compiler_cache
+from .config import load_config
+from .dependencies import DependencyGraph, dotted_module_name, top_package
+from .directives import resolve_directives
+from .discovery import discover_project
+from .helpers import FilesAndFolders
+from .logs import logger
+from .openmp import cimports_openmp, nogil_prange_lines, openmp_flags, openmp_supported, uses_openmp
+from .profiles import BuildProfile, resolve_profile, small_variant
+from .scheduler import estimate_costs, longest_first, memory_budget, next_unit
+from .timings import BuildTimer, Span
+
+
+@dataclass
+class BuildOptions:
+    """ Settings of a build, for Builder.build and as the keyword arguments of cy_build.
+        [create_annotations] has Cython write an html annotation of every file. [include_numpy] adds numpy's headers.
+        [force] rebuilds files whose source and build settings did not change since their last build (see
+        ext/build_manifest.json).
+        [profile] selects the compiler settings (see appsettings.build_profiles and [tool.cythonbuilder.profiles] in
+        pyproject.toml) by name or as a BuildProfile; default is the 'profile' setting in [tool.cythonbuilder] or else
+        'default'. [build_dir] is the build folder, which is kept between builds; default is ext/build/<abi>/<profile>
+        (the root can be set with 'build_dir' in [tool.cythonbuilder]). The extensions are installed next to the pyx files.
+        [directives] are Cython compiler directives: a preset name (see appsettings.directive_presets), a dict or a
+        string like "fast,language_level=3". They are combined with the ones in pyproject.toml, see resolve_directives.
+        [compiler_cache] avoids recompiling identical C code: 'auto' (default, or 'compiler_cache' in [tool.cythonbuilder])
+        uses ccache or sccache when installed, else 'builtin', a cache in ~/.cache/cythonbuilder (or 'compiler_cache_dir');
+        'none' disables it.
+        [artifact_cache] is a folder (local or a network mount) or an http(s) url where finished extensions are shared
+        between machines, keyed by everything that determines them (default: $CYTHONBUILDER_ARTIFACT_CACHE or
+        'artifact_cache' in [tool.cythonbuilder]; 'none' disables it). Files found there are installed instead of built,
+        files built are published to it.
+        [bundle] links all modules of a top-level package into one shared library, pkg/__cybundle__.<abi>.so, and makes
+        the extension of every module a symlink to it (default: 'bundle' in [tool.cythonbuilder]). Unix only.
+        [instrument] builds with the profile and linetrace directives and CYTHON_TRACE_NOGIL into a variant of the
+        profile that is installed in ext/instrumented/<abi>, so the regular extensions stay as they are (see cy_profile).
+        [openmp] None (default, or 'openmp' in [tool.cythonbuilder]) compiles and links the files that use
+        cython.parallel or cimport openmp with OpenMP; True does so for all files and fails without compiler support,
+        False for none. A nogil prange loop built without OpenMP is logged as a warning.
+        [small] builds smaller extensions that load faster: hidden symbols, unused functions dropped by the linker, no
+        symbol table and no pyx source in the C comments, as the '<profile>-small' variant of the profile (default:
+        'small' in [tool.cythonbuilder]).
+        [capture_output] collects the Cython and compiler output per target instead of printing it.
+        Besides these, cy_build takes [target_files], [jobs] (default: cpu count), [cache_stats] and [artifact_stats]
+        (which receive the compiler and artifact cache hits and misses), [timer] (the timed fingerprint, translate,
+        compile and link steps of every file), [footprints] ({pyx file: (ExtensionFootprint before, after)} with the size
+        and import time of every built extension; before is None when there was no extension yet) and [builder] (a
+        Builder to build with, so its worker processes are reused; see cy_watch)
+    """
+    create_annotations: bool = True
+    include_numpy: bool = False
+    force: bool = False
+    profile: object = None          # profile name or BuildProfile
+    build_dir: str = None
+    directives: object = None       # preset name, dict or "fast,language_level=3"
+    compiler_cache: str = None
+    artifact_cache: str = None
+    bundle: bool = None
+    instrument: bool = False
+    openmp: bool = None
+    small: bool = None
+    capture_output: bool = True
+
+
+@dataclass
+class TargetResult:
+    file: str
+    status: str                     # 'built', 'restored' (from the artifact cache), 'up to date', 'failed' or 'missing'
+    artifact: str = None            # the installed extension, unless failed or missing
+    duration: float = 0.0           # seconds from the start of translating to the end of linking
+    error: str = None
+    diagnostics: str = ''           # Cython and compiler output, when captured
+    warnings: [str] = field(default_factory=list)
+    c_size: int = None              # bytes of generated C of the extension, when built
+    peak_memory: int = None         # largest resident set of its compiler and linker in bytes, when measured
+
+
+@dataclass
+class BuildResult:
+    targets: [TargetResult] = field(default_factory=list)
+    duration: float = 0.0
+    cache_stats: CacheStats = field(default_factory=CacheStats)
+    artifact_stats: CacheStats = field(default_factory=lambda: CacheStats(label='artifact cache', backend='none'))
+    timer: BuildTimer = field(default_factory=BuildTimer)
+
+    @property
+    def ok(self) -> bool:
+        return all(t.status != 'failed' for t in self.targets)
+
+    @property
+    def built_files(self) -> [str]:
+        """ The files that got a new extension, built or restored from the artifact cache """
+        return [t.file for t in self.targets if (t.status in ('built', 'restored'))]
+
+    @property
+    def failures(self) -> {str: str}:
+        return {t.file: t.error for t in self.targets if (t.status == 'failed')}
+
+
+@dataclass
+class _BuildPlan:
+    """ What Builder.build resolved before building, and per target file what it is built with """
+    options: BuildOptions
+    config: dict
+    profile: BuildProfile
+    small: bool
+    install_dir: str                # None, or the folder of an instrumented build
+    manifest: BuildManifest
+    targets: [str]                  # as asked for, plus the other files of their bundles
+    existing_files: [str]
+    bundles: {str: [str]}           # {top package folder: its pyx files}
+    bundle_of: {str: str}
+    include_dirs: [str]
+    graph: DependencyGraph = None
+    fingerprints: {str: dict} = field(default_factory=dict)
+    directives: {str: dict} = field(default_factory=dict)
+    openmp_args: {str: tuple} = field(default_factory=dict)
+    warnings: {str: [str]} = field(default_factory=dict)
+
+# Runs a command and writes the peak memory of the processes it started (KiB on Linux, bytes on macOS) to the file
+# descriptor in argv[1]. A process forked from the build worker would report the worker's memory as its own, so the
+# command is started from a fresh, small interpreter
+_MEASURE_SCRIPT = (
+    "import os, resource, subprocess, sys; code = subprocess.call(sys.argv[2:]); "
+    "os.write(int(sys.argv[1]), str(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss).encode()); sys.exit(code)"
+)
+
+
+def _build_target(target_files:[str], include_dirs:[str], create_annotations:bool, profile:BuildProfile, build_dir:str, directives:{str: dict}=None,
+                  compiler_cache:str='none', cache_dir:str=None, track:str=None, capture_output:bool=False, bundle_dir:str=None,
+                  install_dir:str=None, openmp:{str: tuple}=None) -> (str, CacheStats, [Span], str, dict):
+    """ Translates and compiles a single pyx file, or with [bundle_dir] all pyx files of the package in that folder into
+        one shared library. Returns the error message (None on success), the hits and misses of the built-in compiler
+        cache, the timed translate, compile and link steps, the captured output and what it cost: {'duration': seconds,
+        'c_size': bytes of generated C, 'peak_memory': largest resident set of the compiler and linker in bytes, None
+        where that cannot be measured}, which the scheduler uses to plan the next build.
+        Runs in a worker process so everything in here must be picklable and import its own dependencies. It also runs
+        in the calling process, many times over, so it leaves no global state behind.
+        [build_dir] is the persistent build folder: objects go to build_dir/temp, the extension to build_dir/lib, from
+        where it is installed next to the pyx file. A bundle is installed as bundle_path(bundle_dir) and every module's
+        extension becomes a symlink to it; [install_dir] installs it there instead (see artifact_path). [directives] are the Cython compiler directives per pyx file.
+        [openmp] holds the OpenMP (compile args, link args) of the files that need them.
+        [compiler_cache] is a backend from resolve_compiler_cache; the built-in one stores objects in [cache_dir].
+        [track] names the timeline the steps are shown on; default is 'worker <pid>'. [capture_output] collects what
+        Cython and the compiler print instead of letting it through
+    """
+    from setuptools import Distribution, Extension
+    from Cython.Distutils import build_ext
+    from Cython.Build import cythonize
+    import Cython.Compiler.Options
+    from distutils import dir_util
+    from distutils.errors import DistutilsExecError
+
+    # distutils caches the folders it created, so it would not create them again after the build folder was removed.
+    # The cache is private: newer setuptools versions renamed or removed it
+    created_paths = getattr(dir_util, '_path_created', None)
+    if (hasattr(created_paths, 'clear')):
+        created_paths.clear()
+
+    # Modules are named after their place in the package, so relative cimports work and same-named modules in
+    # different packages do not collide in the build folder
+    module_names = {n: dotted_module_name(filepath=n) for n in target_files}
+    target_path = target_files[0] if (bundle_dir is None) else bundle_path(package_dir=bundle_dir)
+    directives = {} if (directives is None) else directives
+    openmp = {} if (openmp is None) else openmp
+
+    cache_stats = CacheStats(backend=compiler_cache)
+    timer = BuildTimer()
+    track = f"worker {os.getpid()}" if (track is None) else track
+    output = io.StringIO()
+    stats = {'duration': 0.0, 'c_size': 0, 'peak_memory': None}
+
+    def timed(func, phase:str, file:str):
+        def timed_func(*args, **kwargs):
+            name = os.path.splitext(os.path.basename(file))[0]
+            with timer.span(name=f"{phase} {name}", phase=phase, track=track, file=file):
+                return func(*args, **kwargs)
+        return timed_func
+
+    def measured_spawn(cmd, env:dict=None, **kwargs):
+        """ Runs a compiler or linker command through _MEASURE_SCRIPT and keeps its peak memory """
+        peak_pipe = os.pipe() if (os.name == 'posix' and sys.executable) else None
+        command = list(cmd) if (peak_pipe is None) else [sys.executable, '-I', '-S', '-c', _MEASURE_SCRIPT, str(peak_pipe[1])] + list(cmd)
+        kwargs = dict(stdout=subprocess.PIPE, stderr=subprocess.STDOUT) if (capture_output) else {}
+        try:
+            process = subprocess.Popen(command, universal_newlines=True, env=env, pass_fds=() if (peak_pipe is None) else (peak_pipe[1],), **kwargs)
+        finally:
+            if (peak_pipe is not None):
+                os.close(peak_pipe[1])
+        text, _ = process.communicate()
+        if (peak_pipe is not None):
+            with os.fdopen(peak_pipe[0], 'rb') as f:
+                reported = f.read()
+            if (reported.isdigit()):
+                peak = int(reported) if (sys.platform == 'darwin') else int(reported) * 1024
+                stats['peak_memory'] = max(stats['peak_memory'] or 0, peak)
+        if (capture_output):
+            output.write(f"{' '.join(cmd)}\n{text}")
+        if (process.returncode != 0):
+            raise DistutilsExecError(f"command {cmd[0]!r} failed with exit code {process.returncode}")
+
+    class cached_build_ext(build_ext):
+        def build_extensions(self):
+            install_compiler_cache(compiler=self.compiler, backend=compiler_cache, cache_dir=cache_dir, stats=cache_stats)
+            self.compiler.spawn = measured_spawn
+            self.compiler.compile = timed(func=self.compiler.compile, phase='compile', file=target_path)
+            self.compiler.link = timed(func=self.compiler.link, phase='link', file=target_path)
+            super().build_extensions()
+
+    # build out of tree; errors are returned as text because not every Cython/distutils error survives pickling.
+    # The manifest has decided this file is stale, so neither Cython nor distutils may skip it because some output in
+    # the persistent build folder (or a kept C file) is newer than the sources
+    annotate = Cython.Compiler.Options.annotate
+    redirect = (contextlib.redirect_stdout(output), contextlib.redirect_stderr(output)) if (capture_output) else (contextlib.nullcontext(), contextlib.nullcontext())
+    error = None
+    try:
+        with redirect[0], redirect[1]:
+            # Annotation is whether or not the html should be created
+            Cython.Compiler.Options.annotate = create_annotations
+            ext_modules = []
+            for n in target_files:
+                ext_modules += timed(func=cythonize, phase='translate', file=n)([Extension(name=module_names[n], sources=[n])], quiet=True, force=True, compiler_directives=directives.get(n, {}))
+                stats['c_size'] += sum(os.path.getsize(s) for s in ext_modules[-1].sources if (s.endswith(('.c', '.cpp')) and os.path.isfile(s)))
+                if (n in openmp):
+                    ext_modules[-1].extra_compile_args += openmp[n][0]
+                    ext_modules[-1].extra_link_args += openmp[n][1]
+            if (bundle_dir is not None):
+                # One extension from the C files of all modules; each keeps its own PyInit_<name> export
+                bundle = Extension(name=dotted_module_name(filepath=os.path.join(bundle_dir, f"{appsettings.cython_bundle_name}.pyx")), sources=[])
+                for ext in ext_modules:
+                    for attr in ['sources', 'include_dirs', 'define_macros', 'undef_macros', 'library_dirs', 'libraries', 'runtime_library_dirs', 'extra_objects', 'extra_compile_args', 'extra_link_args', 'depends']:
+                        getattr(bundle, attr).extend(v for v in getattr(ext, attr) if (v not in getattr(bundle, attr)))
+                    bundle.language = bundle.language or ext.language
+                ext_modules = [bundle]
+
+            # Compiler settings are added after cythonize: Cython writes the Extension settings into the C file, and the
+            # generated C must not change with the profile (PGO matches profile data to source lines)
+            for ext in ext_modules:
+                ext.extra_compile_args += profile.extra_compile_args
+                ext.extra_link_args += profile.extra_link_args
+                ext.define_macros += profile.define_macros
+
+            # The command is run directly instead of through setup(), which reads sys.argv and exits on errors
+            command = cached_build_ext(Distribution({'ext_modules': ext_modules}))
+            command.include_dirs = list(include_dirs)
+            command.build_lib = os.path.join(build_dir, 'lib')
+            command.build_temp = os.path.join(build_dir, 'temp')
+            os.makedirs(command.build_lib, exist_ok=True)
+            os.makedirs(command.build_temp, exist_ok=True)
+            command.force = True
+            command.ensure_finalized()
+            command.run()
+        built_path = command.get_ext_fullpath(ext_modules[0].name)
+        if (bundle_dir is None):
+            FilesAndFolders.install_file(srcfilename=built_path, dstfilename=artifact_path(pyx_fullpath=target_path, install_dir=install_dir))
+        else:
+            FilesAndFolders.install_file(srcfilename=built_path, dstfilename=target_path)
+            for n in target_files:
+                FilesAndFolders.install_link(srcfilename=target_path, dstfilename=artifact_path(pyx_fullpath=n))
+    except (Exception, SystemExit) as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        Cython.Compiler.Options.annotate = annotate
+    if (len(timer.spans) > 0):
+        stats['duration'] = max(s.end for s in timer.spans) - min(s.start for s in timer.spans)
+    return error, cache_stats, timer.spans, output.getvalue(), stats
+
+
+class Builder:
+    """ Builds the pyx files of a project, as many times as needed in one process. Changes no global state: no
+        sys.argv, no working directory, no SystemExit. The worker processes are started by the first build that needs
+        them and kept until close(), so later builds do not pay for importing setuptools and Cython again
+            with Builder(project_dir="path/to/project", jobs=4) as builder:
+                result = builder.build(targets=["pkg/fast.pyx"], options=BuildOptions(profile='release'))
+    """
+
+    def __init__(self, project_dir:str=None, jobs:int=None):
+        self.project_dir = os.getcwd() if (project_dir is None) else os.path.abspath(project_dir)
+        self.jobs = os.cpu_count() if (jobs is None) else jobs
+        if (self.jobs < 1):
+            raise ValueError(f"[{Builder.__name__}] - jobs must be 1 or more, got {self.jobs}")
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """ Stops the worker processes """
+        if (self._pool is not None):
+            self._pool.shutdown()
+            self._pool = None
+
+    def _submit(self, fn, **kwargs):
+        """ Runs [fn] in a worker process. The workers are started on first use, and again when one of them died (killed,
+            out of memory), which breaks the pool for all of them
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        if (self._pool is None):
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs)
+        try:
+            return self._pool.submit(fn, **kwargs)
+        except BrokenProcessPool:
+            logger.debug(msg=f"[{Builder._submit.__name__}] - a worker process died; starting new ones")
+            self.close()
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs)
+            return self._pool.submit(fn, **kwargs)
+
+    def _init(self) -> None:
+        FilesAndFolders.create_folder(folderpath=os.path.join(self.project_dir, appsettings.cython_extensions_dirname))
+        FilesAndFolders.create_folder(folderpath=os.path.join(self.project_dir, appsettings.cython_anno_dirname))
+
+    @staticmethod
+    def _restore(store, units:[tuple], artifact_keys:{tuple: str}, create_annotations:bool, timer:BuildTimer) -> [tuple]:
+        """ Installs the work units found in the artifact store, a few at a time since a remote store is mostly waiting.
+            Returns the restored units
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def restore(unit:tuple) -> bool:
+            files, bundle_dir = unit
+            target_path = files[0] if (bundle_dir is None) else bundle_path(package_dir=bundle_dir)
+            with timer.span(name=f"restore {os.path.splitext(os.path.basename(target_path))[0]}", phase='restore', file=target_path), tempfile.TemporaryDirectory() as tmp_dir:
+                return restore_artifact(store=store, key=artifact_keys[files], target_files=list(files), create_annotations=create_annotations, tmp_dir=tmp_dir, bundle_dir=bundle_dir)
+
+        with ThreadPoolExecutor(max_workers=appsettings.artifact_cache_connections) as executor:
+            restored = list(executor.map(restore, units))
+        return [unit for unit, is_restored in zip(units, restored) if (is_restored)]
+
+    @staticmethod
+    def _publish(store, units:[tuple], artifact_keys:{tuple: str}, create_annotations:bool) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        def publish(unit:tuple) -> None:
+            files, bundle_dir = unit
+            publish_artifact(store=store, key=artifact_keys[files], target_files=list(files), create_annotations=create_annotations, bundle_dir=bundle_dir)
+
+        with ThreadPoolExecutor(max_workers=appsettings.artifact_cache_connections) as executor:
+            list(executor.map(publish, units))
+
+    def _record_artifacts(self, results:[TargetResult], bundle_of:{str: str}, install_dir:str, create_annotations:bool) -> None:
+        """ Adds what the build produced to the artifact manifest, for cy_clean. Also the artifacts of files that were
+            up to date, so a project built before the artifact manifest existed gets one
+        """
+        manifest = ArtifactManifest(manifest_path=os.path.join(self.project_dir, appsettings.cython_artifact_manifest_path), project_dir=self.project_dir)
+        abi = abi_tag()
+        for target in results:
+            n = target.file
+            if (target.status not in ('built', 'restored', 'up to date')):
+                continue
+            if (install_dir is not None):
+                manifest.record(pyx_fullpath=n, kind=f"instrumented {abi}", path=target.artifact)
+            else:
+                manifest.record(pyx_fullpath=n, kind=f"extension {abi}", path=target.artifact)
+                if (n in bundle_of):
+                    manifest.record(pyx_fullpath=n, kind=f"bundle {abi}", path=bundle_path(package_dir=bundle_of[n]))
+                else:
+                    manifest.retire(pyx_fullpath=n, kinds=[f"bundle {abi}"])
+            if (target.status == 'up to date'):
+                continue
+            # Cython writes the C file and the annotation next to the pyx file; cy_clean removes and moves them
+            for c_path in [f"{os.path.splitext(n)[0]}.c", f"{os.path.splitext(n)[0]}.cpp"]:
+                if (os.path.isfile(c_path)):
+                    manifest.record(pyx_fullpath=n, kind='c', path=c_path)
+            if (create_annotations and install_dir is None):
+                manifest.record(pyx_fullpath=n, kind='html', path=f"{os.path.splitext(n)[0]}.html")
+        manifest.save()
+
+    def list_targets(self, exclude:[str]=None, rescan:bool=False) -> [str]:
+        """ All pyx files of the project, found the way cy_list finds them (see discovery.discover_project) """
+        self._init()
+        return [f for f in discover_project(project_dir=self.project_dir, exclude=exclude, rescan=rescan) if (f.endswith('.pyx'))]
+
+    def _plan(self, targets:[str], options:BuildOptions) -> _BuildPlan:
+        """ Resolves the settings of a build: profile and its variants, the bundles, include folders and manifest """
+        config = load_config(project_dir=self.project_dir)
+        build_profile = options.profile if (isinstance(options.profile, BuildProfile)) else resolve_profile(name=options.profile, config=config)
+        # An instrumented build is a variant of the profile with its own build folder, manifest and install folder
+        install_dir = None
+        manifest_path = os.path.join(self.project_dir, appsettings.cython_manifest_path)
+        if (options.instrument):
+            if (options.bundle):
+                raise ValueError(f"[{Builder.build.__name__}] - instrumented builds cannot be bundled")
+            if (options.small):
+                raise ValueError(f"[{Builder.build.__name__}] - instrumented builds cannot be small builds")
+            build_profile = dataclasses.replace(build_profile, name=f"{build_profile.name}-instrumented", define_macros=list(build_profile.define_macros) + appsettings.instrument_macros)
+            install_dir = os.path.join(self.project_dir, appsettings.cython_instrumented_dirname, abi_tag())
+            manifest_path = os.path.join(self.project_dir, appsettings.cython_instrumented_dirname, 'build_manifest.json')
+            options = dataclasses.replace(options, bundle=False, small=False, create_annotations=False, artifact_cache='none')
+        # A small build is a variant of the profile as well, but replaces the regular extensions
+        small = config.get('small', False) if (options.small is None) else options.small
+        if (small):
+            build_profile = small_variant(profile=build_profile)
+        logger.debug(msg=f"[{Builder.build.__name__}] - using build profile {build_profile}")
+
+        existing_target_files = []
+        for n in targets:
+            if (not os.path.isfile(n)):
+                logger.info(msg=f"File '{n}' not found; skipping..")
+                continue
+            existing_target_files.append(n)
+
+        # Bundles: {top package folder: its pyx files}. A bundle holds every module of the package or the symlinks of
+        # the ones left out would point to a library without them
+        bundles:{str: [str]} = {}
+        if (config.get('bundle', False) if (options.bundle is None) else options.bundle):
+            if (os.name == 'nt'):
+                raise ValueError(f"[{Builder.build.__name__}] - bundled builds need symlinks and are not supported on Windows")
+            project_files = None
+            for n in list(existing_target_files):
+                package_dir = top_package(folderpath=os.path.dirname(n))
+                if (package_dir is None or package_dir in bundles):
+                    continue
+                project_files = self.list_targets() if (project_files is None) else project_files
+                bundles[package_dir] = [f for f in project_files if (f.startswith(package_dir + os.sep))]
+                for f in bundles[package_dir]:
+                    if (f not in existing_target_files):
+                        existing_target_files.append(f)
+                        targets.append(f)
+            for package_dir, members in bundles.items():
+                # Python finds a module in a shared library by its PyInit_<last part of the name> function
+                short_names = [os.path.splitext(os.path.basename(f))[0] for f in members]
+                duplicates = sorted({name for name in short_names if (short_names.count(name) > 1)})
+                if (len(duplicates) > 0):
+                    raise ValueError(f"[{Builder.build.__name__}] - cannot bundle {package_dir}: more than one module is named {', '.join(duplicates)}")
+
+        # Extra include folders. Mainly for numpy.
+        include_dirs = []
+        if (options.include_numpy):
+            try:
+                import numpy
+                include_dirs += [numpy.get_include()]
+            except ImportError:
+                raise ValueError('Numpy is required, but not found. Please install')
+
+        self._init()
+        if (install_dir is not None):
+            os.makedirs(install_dir, exist_ok=True)
+        return _BuildPlan(
+            options=options,
+            config=config,
+            profile=build_profile,
+            small=small,
+            install_dir=install_dir,
+            manifest=BuildManifest(manifest_path=manifest_path, project_dir=self.project_dir, install_dir=install_dir),
+            targets=targets,
+            existing_files=existing_target_files,
+            bundles=bundles,
+            bundle_of={f: package_dir for package_dir, members in bundles.items() for f in members},
+            include_dirs=include_dirs,
+        )
+
+    def _stale_targets(self, plan:_BuildPlan, results:{str: TargetResult}) -> [str]:
+        """ The files that changed since their last build, including the pxd/pxi files they depend on, with every file
+            of a bundle that has one. The up to date files go into [results]. Fills in the fingerprints, directives,
+            OpenMP flags and warnings of the plan
+        """
+        options = plan.options
+        graph = DependencyGraph(project_dir=self.project_dir)
+        for n in plan.existing_files:
+            graph.add_file(filepath=n)
+        plan.graph = graph
+
+        # OpenMP for the extensions whose code (or included code) uses cython.parallel, unless overridden
+        openmp_setting = plan.config.get('openmp') if (options.openmp is None) else options.openmp
+        needs_openmp = {n: uses_openmp(filepaths=[n] + graph.transitive_dependencies(filepath=n)) for n in plan.existing_files}
+        openmp_enabled = {n: needs_openmp[n] if (openmp_setting is None) else bool(openmp_setting) for n in plan.existing_files}
+        openmp_reason = "--no-openmp" if (openmp_setting is False) else None
+        if (any(openmp_enabled.values()) and not openmp_supported()):
+            if (openmp_setting is True):
+                raise ValueError(f"[{Builder.build.__name__}] - OpenMP was asked for, but the compiler cannot build with {' '.join(sum(openmp_flags(), []))}")
+            openmp_enabled = {n: False for n in plan.existing_files}
+            openmp_reason = "the compiler has no OpenMP support"
+        plan.openmp_args = {n: openmp_flags() for n, enabled in openmp_enabled.items() if (enabled)}
+
+        stale_target_files = []
+        for n in plan.existing_files:
+            plan.directives[n] = resolve_directives(pyx_fullpath=n, project_dir=self.project_dir, config=plan.config, profile_directives=plan.profile.directives, cli_directives=options.directives)
+            if (options.instrument):
+                plan.directives[n].update(appsettings.instrument_directives)
+            if (plan.small):
+                plan.directives[n].update(appsettings.small_directives)
+            plan.fingerprints[n] = build_fingerprint(
+                pyx_fullpath=n,
+                include_dirs=plan.include_dirs,
+                profile=plan.profile.fingerprint(),
+                create_annotations=options.create_annotations,
+                dependency_hashes=graph.dependency_hashes(filepath=n),
+                directives=plan.directives[n],
+                module_name=dotted_module_name(filepath=n),
+                bundle=os.path.basename(plan.bundle_of[n]) if (n in plan.bundle_of) else None,
+                openmp=openmp_enabled[n],
+            )
+            if (not options.force and plan.manifest.is_up_to_date(pyx_fullpath=n, fingerprint=plan.fingerprints[n])):
+                logger.debug(msg=f"[{Builder.build.__name__}] - {n} is up to date; skipping..")
+                results[n] = TargetResult(file=n, status='up to date', artifact=artifact_path(pyx_fullpath=n, install_dir=plan.install_dir))
+                continue
+            stale_target_files.append(n)
+        # A bundle is linked as a whole
+        for members in plan.bundles.values():
+            if (any(f in stale_target_files for f in members)):
+                stale_target_files += [f for f in members if (f not in stale_target_files)]
+        logger.debug(msg=f"[{Builder.build.__name__}] - {len(plan.existing_files) - len(stale_target_files)} of {len(plan.existing_files)} files up to date")
+
+        for n in stale_target_files:
+            if (not needs_openmp[n] or openmp_enabled[n]):
+                continue
+            code_files = [f for f in [n] + graph.transitive_dependencies(filepath=n) if (f.endswith(('.pyx', '.pxd', '.pxi')))]
+            lines = [f"{os.path.relpath(f, self.project_dir)}:{line}" for f in code_files for line in nogil_prange_lines(filepath=f)]
+            plan.warnings[n] = [f"nogil prange loop at {', '.join(lines)} is built without OpenMP ({openmp_reason}) and runs on one thread"] if (len(lines) > 0) else []
+            if (any(cimports_openmp(filepath=f) for f in code_files)):
+                plan.warnings[n].append(f"cimports openmp but is built without OpenMP ({openmp_reason}); importing it will fail on the missing omp_* functions")
+            for warning in plan.warnings[n]:
+                logger.warning(msg=f"{os.path.relpath(n, self.project_dir)}: {warning}")
+        return stale_target_files
+
+    def _restore_artifacts(self, store, plan:_BuildPlan, units:[tuple], results:{str: TargetResult}, artifact_stats:CacheStats, timer:BuildTimer) -> ([tuple], {tuple: str}):
+        """ Installs the extensions built from exactly these inputs before, on this or another machine. Returns the work
+            units that are left to build, and the artifact keys of the units that can be shared
+        """
+        if (store is None or len(units) == 0):
+            return units, {}
+        artifact_stats.backend = store.name
+        artifact_keys = {files: artifact_key(fingerprints=[plan.fingerprints[n] for n in files]) for files, _ in units if (all(is_portable(fingerprint=plan.fingerprints[n]) for n in files))}
+        restored_units = self._restore(store=store, units=[u for u in units if (u[0] in artifact_keys)], artifact_keys=artifact_keys, create_annotations=plan.options.create_annotations, timer=timer)
+        artifact_stats.add(hits=len(restored_units), misses=len(artifact_keys) - len(restored_units))
+        for files, _ in restored_units:
+            for n in files:
+                results[n] = TargetResult(file=n, status='restored', artifact=artifact_path(pyx_fullpath=n))
+        logger.debug(msg=f"[{Builder.build.__name__}] - {artifact_stats}")
+        return [u for u in units if (u not in restored_units)], artifact_keys
+
+    def _run_scheduled(self, plan:_BuildPlan, units:[tuple], build_kwargs:dict) -> {tuple: tuple}:
+        """ Builds the work units, longest first and as many at a time as there are workers and memory for (see
+            scheduler.py); in-process when there is only one worker so debugging stays simple. Returns the outcome of
+            _build_target per unit
+        """
+        source_sizes = {(files, bundle_dir): sum(os.path.getsize(f) for f in set(files).union(*[plan.graph.transitive_dependencies(filepath=n) for n in files]) if (os.path.isfile(f)))
+                        for files, bundle_dir in units}
+        costs = estimate_costs(units=units, history={(files, bundle_dir): plan.manifest.stats_of(pyx_fullpath=files[0]) for files, bundle_dir in units}, source_sizes=source_sizes)
+        pending = longest_first(units=units, costs=costs)
+        outcomes:{tuple: tuple} = {}
+        if (self.jobs == 1 or len(units) <= 1):
+            for files, bundle_dir in pending:
+                logger.debug(msg=f"C {bundle_dir or files[0]}")
+                outcomes[files] = _build_target(target_files=list(files), directives=plan.directives, track='main', bundle_dir=bundle_dir, openmp=plan.openmp_args, **build_kwargs)
+            return outcomes
+
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from concurrent.futures.process import BrokenProcessPool
+        budget = memory_budget(max_memory_mb=plan.config.get('max_memory_mb'))
+        logger.debug(msg=f"[{Builder.build.__name__}] - building {len(units)} extensions with {self.jobs} workers within {'no' if (budget is None) else budget // (1024 * 1024)} MB")
+        running:{object: tuple} = {}
+        while (len(pending) > 0 or len(running) > 0):
+            while (len(running) < self.jobs):
+                unit = next_unit(pending=pending, costs=costs, running=list(running.values()), budget=budget)
+                if (unit is None):
+                    break
+                pending.remove(unit)
+                files, bundle_dir = unit
+                try:
+                    future = self._submit(_build_target, target_files=list(files), directives={n: plan.directives[n] for n in files}, bundle_dir=bundle_dir,
+                                          openmp={n: plan.openmp_args[n] for n in files if (n in plan.openmp_args)}, **build_kwargs)
+                except Exception as e:
+                    outcomes[files] = (f"{type(e).__name__}: {e}", CacheStats(), [], '', {})
+                    continue
+                running[future] = unit
+            if (len(running) == 0):
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, _ = running.pop(future)
+                try:
+                    outcomes[files] = future.result()
+                except BrokenProcessPool as e:
+                    # Fails every unit that was running; the ones still pending get new workers from _submit
+                    outcomes[files] = (f"{type(e).__name__}: a worker process died while building (killed or out of memory): {e}", CacheStats(), [], '', {})
+                except Exception as e:
+                    outcomes[files] = (f"{type(e).__name__}: {e}", CacheStats(), [], '', {})
+        return outcomes
+
+    def _record_results(self, plan:_BuildPlan, stale_target_files:[str], results:{str: TargetResult}) -> None:
+        """ Remembers what the built files were built from, and which artifacts the build produced """
+        manifest = plan.manifest
+        for n in stale_target_files:
+            if (results[n].status == 'failed'):
+                manifest.forget(pyx_fullpath=n)
+                logger.debug(msg=f"[{Builder.build.__name__}] - failed to build {n}: {results[n].error}")
+            elif (results[n].status == 'restored'):
+                manifest.record(pyx_fullpath=n, fingerprint=plan.fingerprints[n], stats=manifest.stats_of(pyx_fullpath=n))
+            else:
+                manifest.record(pyx_fullpath=n, fingerprint=plan.fingerprints[n], stats={'duration': results[n].duration, 'c_size': results[n].c_size, 'peak_memory': results[n].peak_memory})
+        manifest.save()
+        self._record_artifacts(results=[results[n] for n in plan.existing_files], bundle_of=plan.bundle_of, install_dir=plan.install_dir, create_annotations=plan.options.create_annotations)
+
+    def build(self, targets:[str]=None, options:BuildOptions=None) -> BuildResult:
+        """ Builds the [targets] (pyx paths, relative to the project or absolute; default all pyx files of the project)
+            that changed since their last build. Never raises for a file that fails to build: its TargetResult has
+            status 'failed', the error and the Cython and compiler output.
+            With options.bundle every package is linked into one shared library, so all pyx files of the package of
+            a target are built (and reported) along with it
+        """
+        started = time.time()
+        options = BuildOptions() if (options is None) else options
+        targets = self.list_targets() if (targets is None) else [os.path.join(self.project_dir, t) for t in targets]
+        plan = self._plan(targets=targets, options=options)
+        result = BuildResult()
+        results:{str: TargetResult} = {n: TargetResult(file=n, status='missing') for n in plan.targets if (n not in plan.existing_files)}
+
+        # 1. Skip files that were built from the exact same inputs before
+        with result.timer.span(name='fingerprint', phase='fingerprint'):
+            stale_target_files = self._stale_targets(plan=plan, results=results)
+
+        # 2. Restore or build every work unit: a single pyx file or a whole bundle
+        backend = resolve_compiler_cache(name=plan.options.compiler_cache or plan.config.get('compiler_cache'))
+        cache_dir = plan.config.get('compiler_cache_dir') or default_cache_dir()
+        result.cache_stats.backend = backend
+        counters_before = launcher_counters(launcher=backend) if (backend in ('ccache', 'sccache') and len(stale_target_files) > 0) else None
+        build_dir = os.path.join(self.project_dir, plan.config.get('build_dir', appsettings.cython_build_root), abi_tag(), plan.profile.name) if (plan.options.build_dir is None) else plan.options.build_dir
+        build_kwargs = dict(include_dirs=plan.include_dirs, create_annotations=plan.options.create_annotations, profile=plan.profile, build_dir=build_dir,
+                            compiler_cache=backend, cache_dir=cache_dir, capture_output=plan.options.capture_output, install_dir=plan.install_dir)
+        units:[tuple] = [((n,), None) for n in stale_target_files if (n not in plan.bundle_of)]
+        units += [(tuple(members), package_dir) for package_dir, members in plan.bundles.items() if (members[0] in stale_target_files)]
+        store = open_artifact_store(location=plan.options.artifact_cache or os.environ.get('CYTHONBUILDER_ARTIFACT_CACHE') or plan.config.get('artifact_cache'))
+        units, artifact_keys = self._restore_artifacts(store=store, plan=plan, units=units, results=results, artifact_stats=result.artifact_stats, timer=result.timer)
+        outcomes = self._run_scheduled(plan=plan, units=units, build_kwargs=build_kwargs)
+        for files, (error, target_cache_stats, spans, diagnostics, target_stats) in outcomes.items():
+            result.cache_stats.add(hits=target_cache_stats.hits, misses=target_cache_stats.misses)
+            result.timer.add(spans=spans)
+            for n in files:
+                results[n] = TargetResult(
+                    file=n,
+                    status='built' if (error is None) else 'failed',
+                    artifact=artifact_path(pyx_fullpath=n, install_dir=plan.install_dir) if (error is None) else None,
+                    duration=target_stats.get('duration', 0.0),
+                    error=error,
+                    diagnostics=diagnostics,
+                    c_size=target_stats.get('c_size') if (error is None) else None,
+                    peak_memory=target_stats.get('peak_memory'),
+                )
+
+        # Share what was built; a read-only cache ('artifact_cache_publish = false') is only read from
+        if (store is not None and plan.config.get('artifact_cache_publish', True)):
+            self._publish(store=store, units=[(files, bundle_dir) for files, bundle_dir in units if (files in artifact_keys and outcomes[files][0] is None)],
+                          artifact_keys=artifact_keys, create_annotations=plan.options.create_annotations)
+
+        # ccache and sccache count for themselves; the built-in cache is trimmed once all workers are done
+        if (counters_before is not None):
+            counters_after = launcher_counters(launcher=backend)
+            if (counters_after is not None):
+                result.cache_stats.add(hits=counters_after[0] - counters_before[0], misses=counters_after[1] - counters_before[1])
+        elif (backend == 'builtin' and len(stale_target_files) > 0):
+            max_size = plan.config.get('compiler_cache_max_mb')
+            evicted = ObjectCache(cache_dir=cache_dir, max_size=None if (max_size is None) else max_size * 1024 * 1024).evict()
+            logger.debug(msg=f"[{Builder.build.__name__}] - {result.cache_stats}; evicted {evicted} objects from {cache_dir}")
+
+        # 3. Remember what the built files were built from
+        self._record_results(plan=plan, stale_target_files=stale_target_files, results=results)
+        for n, warnings in plan.warnings.items():
+            results[n].warnings = warnings
+        result.targets = [results[n] for n in plan.targets]
+        result.duration = time.time() - started
+        return result
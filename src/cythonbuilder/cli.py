@@ -1,3 +1,5 @@
+import json
+import os
 import sys
 import typing
 
@@ -5,6 +7,9 @@ import typer
 
 from . import helpers, appsettings, cython_builder
 from .definitions import DefaultArgs
+# Modules that only some commands need are imported in those commands; see bench/bench_startup.py
+if (typing.TYPE_CHECKING):
+    from .timings import BuildTimer
 
 _VERBOSE = '-v' in sys.argv or '--verbose' in sys.argv
 
@@ -22,12 +27,13 @@ def init_cb():
 @app.command(name="list", help="List all .pyx files", short_help="List all .pyx files")
 def list_(
     target_filenames: typing.List[str] = typer.Option(None, "--files", help="Filter by these files"),
+    EXCLUDE: typing.List[str] = DefaultArgs.exclude, USE_GIT: bool = DefaultArgs.use_git, RESCAN: bool = DefaultArgs.rescan,
     VERBOSE: bool = DefaultArgs.verbose,
 ):
     # Lists all pyx files that can be built
     filtermsg = f" (filtered by {' '.join(target_filenames)}) " if (target_filenames) else ""
     typer.secho(message=f"Listing all pyx files{filtermsg}..", color=typer.colors.GREEN)
-    found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames)
+    found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames, exclude=EXCLUDE or None, use_git=USE_GIT, rescan=RESCAN)
     if (len(found_pyx_files) > 0):
         found_files_string = "\n".join([f"\t - {fle}" for fle in found_pyx_files])
         typer.secho(message=f"Found files:\n{found_files_string}", color=typer.colors.GREEN)
@@ -35,6 +41,36 @@ def list_(
         typer.secho(message=f"No pyx files found", color=typer.colors.GREEN)
 
 
+def _print_timings(timer:'BuildTimer', top:int=10) -> None:
+    """ Phase totals, worker utilization and the slowest files of a build """
+    phase_rows = [f"\t{phase:<12} {wall:>8.2f}s wall {busy:>8.2f}s busy" for phase, (wall, busy) in timer.phase_totals().items()]
+    utilization = timer.utilization()
+    if (utilization is not None):
+        phase_rows.append(f"\tworker utilization {utilization:.0%}")
+    file_rows = []
+    for fle, phases in list(timer.file_totals().items())[:top]:
+        phase_string = "  ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phases.items())
+        file_rows.append(f"\t{sum(phases.values()):>8.2f}s  {os.path.relpath(fle, cython_builder.project_dir):<40} {phase_string}")
+    phase_string, file_string = "\n".join(phase_rows), "\n".join(file_rows)
+    typer.secho(message=f"Build phases:\n{phase_string}\nSlowest files:\n{file_string}", color=typer.colors.GREEN)
+
+
+def _print_footprints(footprints:{str: tuple}) -> None:
+    """ Size and import time of every built extension, before and after the build """
+    def size_string(footprint) -> str:
+        return "-" if (footprint is None) else f"{footprint.size / 1024:.1f} KB"
+
+    def import_string(footprint) -> str:
+        return "-" if (footprint is None or footprint.import_time is None) else f"{footprint.import_time * 1000:.2f} ms"
+
+    rows = []
+    for fle, (before, after) in footprints.items():
+        change_string = f" ({after.size / before.size - 1:+.0%})" if (before is not None) else ""
+        rows.append(f"\t - {os.path.relpath(fle, cython_builder.project_dir)}: {size_string(before)} -> {size_string(after)}{change_string}, import {import_string(before)} -> {import_string(after)}")
+    rows_string = "\n".join(rows)
+    typer.secho(message=f"Extension size and import time, before -> after:\n{rows_string}", color=typer.colors.GREEN)
+
+
 @app.command(name="build", help="compile all .pyx files", short_help="Compile all .pyx files to C")
 def build(
         target_filenames: typing.List[str] = typer.Option(None, "--files", help="Target .pyx file names"),
@@ -43,9 +79,33 @@ def build(
         dont_generate_pyi: bool = typer.Option(False, "--no-interface", help="Skip generating .pyi stub files"),
         keep_c_files: bool = typer.Option(False, "--no-cleanup", help="Skip removing generated C-files"),
         encoding: str = typer.Option('UTF-8', "--encoding", help="Encoding of your .pyx files"),
-        ACCEPT: bool = DefaultArgs.accept, VERBOSE: bool = DefaultArgs.verbose
+        jobs: int = typer.Option(None, "--jobs", '-j', min=1, help="Number of files to build in parallel (default: cpu count)"),
+        profile: str = typer.Option(None, "--profile", help="Compiler settings: default, release, native, lto, debug or one from [tool.cythonbuilder.profiles]"),
+        directives: str = typer.Option(None, "--directives", help="Cython compiler directives: a preset (fast, safe) and/or name=value pairs, like 'fast,language_level=3'"),
+        compiler_cache: str = typer.Option(None, "--compiler-cache", help="Reuse compiled objects of identical C code: auto (ccache/sccache if installed, else builtin), ccache, sccache, builtin or none"),
+        artifact_cache: str = typer.Option(None, "--artifact-cache", help="Folder or http(s) url of an artifact cache shared between machines, or 'none'"),
+        openmp: bool = typer.Option(None, "--openmp/--no-openmp", help="OpenMP for all files / for none (default: for files that use cython.parallel)"),
+        instrument: bool = typer.Option(False, "--instrument", help="Build with profile/linetrace into ext/instrumented, next to the regular extensions (see `profile`)"),
+        bundle: bool = typer.Option(None, "--bundle/--no-bundle", help="Link all modules of a package into one shared library (unix)"),
+        small: bool = typer.Option(None, "--small/--no-small", help="Smaller, faster loading extensions: hidden symbols, unused sections dropped, stripped; --small reports size and import time before and after"),
+        show_timings: bool = typer.Option(False, "--timings", help="Print how long every build phase and the slowest files took"),
+        trace_path: str = typer.Option(None, "--trace", help="Write a Chrome/Perfetto trace of the build (one track per worker) to this file"),
+        pgo_command: str = typer.Option(None, "--pgo", help="Profile-guided optimization (gcc): build instrumented, run this training command, rebuild optimized; always rebuilds all files"),
+        EXCLUDE: typing.List[str] = DefaultArgs.exclude, USE_GIT: bool = DefaultArgs.use_git, RESCAN: bool = DefaultArgs.rescan,
+        FORCE: bool = DefaultArgs.force, ACCEPT: bool = DefaultArgs.accept, VERBOSE: bool = DefaultArgs.verbose
 ):
+    from .compiler_cache import CacheStats
+    from .config import load_config
+    from .profiles import resolve_profile
+    from .timings import BuildTimer
+
     # Validate arguments
+    if (pgo_command):
+        # PGO builds everything twice from the same C files, without caches, into the regular extensions
+        conflicting = [name for name, is_set in [('--instrument', instrument), ('--compiler-cache', compiler_cache is not None),
+                                                 ('--artifact-cache', artifact_cache is not None), ('--trace', trace_path is not None)] if (is_set)]
+        if (len(conflicting) > 0):
+            raise typer.BadParameter(f"cannot be combined with {', '.join(conflicting)}", param_hint="'--pgo'")
     numpy_is_installed = helpers.package_is_installed(package_import_name='numpy')
     if include_numpy and not numpy_is_installed:
         typer.secho(message=f"You want to include numpy but your current project does not have numpy installed. Please install numpy and try again", color=typer.colors.YELLOW)
@@ -57,9 +117,11 @@ def build(
 
     # Building
     typer.secho(message=f"Building Cython files..", color=typer.colors.GREEN)
+    timer = BuildTimer()
     try:
         # 1. Find pyx files
-        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames)
+        with timer.span(name='discover', phase='discover'):
+            found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames, exclude=EXCLUDE or None, use_git=USE_GIT, rescan=RESCAN)
         if (len(found_pyx_files) == 0):
             typer.secho(message=f"No .pyx files found", color=typer.colors.GREEN)
             sys.exit(0)
@@ -73,56 +135,128 @@ def build(
                 print(msg="Exiting..")
                 typer.secho(message="Exiting..", color=typer.colors.GREEN)
                 sys.exit(0)
-        typer.secho(message=f"Building {len(found_pyx_files)} pyx files..", color=typer.colors.GREEN)
+        build_profile = resolve_profile(name=profile, config=load_config(project_dir=cython_builder.project_dir))
+        typer.secho(message=f"Building {len(found_pyx_files)} pyx files with profile '{build_profile.name}'..", color=typer.colors.GREEN)
 
-        # 3. Build
-        cython_builder.cy_build(
-            target_files=found_pyx_files,
-            create_annotations=not dont_generate_annotations,
-            include_numpy=include_numpy,
-        )
-        typer.secho(message=f"Built {len(found_pyx_files)} pyx files, cleaning up..", color=typer.colors.GREEN)
+        # 3a. Profile-guided build: instrumented build, training, optimized build
+        if (pgo_command):
+            timings = cython_builder.cy_pgo(
+                training_command=pgo_command,
+                target_files=found_pyx_files,
+                create_annotations=not dont_generate_annotations,
+                include_numpy=include_numpy,
+                jobs=jobs,
+                profile=build_profile.name,
+                keep_c_files=keep_c_files,
+                directives=directives,
+                bundle=bundle,
+                openmp=openmp,
+                small=small,
+            )
+            timings_string = "\n".join([f"\t - {step}: {seconds:.2f}s" for step, seconds in timings.items()])
+            typer.secho(message=f"Built {len(found_pyx_files)} pyx files with profile-guided optimization:\n{timings_string}", color=typer.colors.GREEN)
+            if (not dont_generate_pyi):
+                written_pyi_files = cython_builder.cy_interface(target_files=found_pyx_files, encoding=encoding, jobs=jobs)
+                typer.secho(message=f"Generated pyi interface files ({len(written_pyi_files)} changed)", color=typer.colors.GREEN)
+            typer.secho(message="Cython build success", color=typer.colors.GREEN)
+            sys.exit(0)
+
+        # 3. Build; failed files are collected so the others can still be cleaned and get an interface
+        build_failures:{str: str} = {}
+        cache_stats = CacheStats()
+        artifact_stats = CacheStats(label='artifact cache', backend='none')
+        footprints = {} if (small) else None
+        try:
+            compiled_pyx_files = cython_builder.cy_build(
+                target_files=found_pyx_files,
+                create_annotations=not dont_generate_annotations,
+                include_numpy=include_numpy,
+                jobs=jobs,
+                force=FORCE,
+                profile=build_profile.name,
+                directives=directives,
+                compiler_cache=compiler_cache,
+                artifact_cache=artifact_cache,
+                bundle=bundle,
+                instrument=instrument,
+                openmp=openmp,
+                small=small,
+                cache_stats=cache_stats,
+                artifact_stats=artifact_stats,
+                timer=timer,
+                footprints=footprints,
+            )
+        except cython_builder.CythonBuildError as e:
+            build_failures = e.failures
+            compiled_pyx_files = e.built_files
+        built_pyx_files = [fle for fle in found_pyx_files if (fle not in build_failures)]
+        typer.secho(message=f"Built {len(compiled_pyx_files)} pyx files ({len([fle for fle in built_pyx_files if (fle not in compiled_pyx_files)])} up to date), cleaning up..", color=typer.colors.GREEN)
+        if (len(compiled_pyx_files) + len(build_failures) > 0 and cache_stats.backend != 'none'):
+            typer.secho(message=f"{cache_stats}", color=typer.colors.GREEN)
+        if (artifact_stats.backend != 'none'):
+            typer.secho(message=f"{artifact_stats}", color=typer.colors.GREEN)
+        if (footprints):
+            _print_footprints(footprints=footprints)
 
-        # 4. Cleanup after build
-        cython_builder.cy_clean(target_files=found_pyx_files, keep_c_files=keep_c_files)
+        # 4. Cleanup after build; files that were up to date have nothing to clean
+        with timer.span(name='clean', phase='clean'):
+            cython_builder.cy_clean(target_files=compiled_pyx_files, keep_c_files=keep_c_files)
 
         # 5.  Generate pyi files
         if (not dont_generate_pyi):
-            cython_builder.cy_interface(target_files=found_pyx_files, encoding=encoding)
-            typer.secho(message=f"Generated pyi interface files", color=typer.colors.GREEN)
+            with timer.span(name='interface', phase='interface'):
+                written_pyi_files = cython_builder.cy_interface(target_files=built_pyx_files, encoding=encoding, jobs=jobs)
+            typer.secho(message=f"Generated pyi interface files ({len(written_pyi_files)} changed)", color=typer.colors.GREEN)
+
+        # 6. Where the time went
+        if (show_timings):
+            _print_timings(timer=timer)
+        if (trace_path):
+            timer.write_trace(trace_path=trace_path)
+            typer.secho(message=f"Wrote build trace to {trace_path}; open it in ui.perfetto.dev or chrome://tracing", color=typer.colors.GREEN)
+
+        # 7. Report failures together
+        if (len(build_failures) > 0):
+            failed_files_string = "\n".join([f"\t - {fle}: {err}" for fle, err in build_failures.items()])
+            typer.secho(message=f"Failed to build {len(build_failures)} pyx files:\n{failed_files_string}", color=typer.colors.RED)
+            sys.exit(1)
 
         typer.secho(message=f"Cython build success", color=typer.colors.GREEN)
     except Exception as e:
         typer.secho(message=f"build error: {e}", color=typer.colors.RED)
         sys.exit(1)
 
-@app.command(name="clean", help="Clean your project; remove all .c ", short_help="Clean your project")
+@app.command(name="clean", help="Clean your project; remove the generated C files and what was built for deleted pyx files", short_help="Clean your project")
 def cb_clean(
         target_filenames: typing.List[str] = typer.Option(None, "--files", help="Target .pyx file names"),
         keep_c_files: bool = typer.Option(False, "--no-cleanup", help="Skip removing generated C-files"),
+        remove_artifacts: bool = typer.Option(False, "--all", help="Also remove the extensions, annotations and pyi files"),
+        EXCLUDE: typing.List[str] = DefaultArgs.exclude, USE_GIT: bool = DefaultArgs.use_git, RESCAN: bool = DefaultArgs.rescan,
         ACCEPT: bool = DefaultArgs.accept, VERBOSE: bool = DefaultArgs.verbose
 ):
     # Clean
     try:
-        # 1. Find pyx files
-        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames)
-        if (len(found_pyx_files) == 0):
+        # 1. Find pyx files; without --files, the ones something was built for (see ext/artifact_manifest.json)
+        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames, exclude=EXCLUDE or None, use_git=USE_GIT, rescan=RESCAN) if (target_filenames) else None
+        if (found_pyx_files is not None and len(found_pyx_files) == 0):
             typer.secho(message=f"No .pyx files found", color=typer.colors.GREEN)
             sys.exit(0)
-        typer.secho(message=f"Found {len(found_pyx_files)} to clean", color=typer.colors.GREEN)
 
         # 2. Confirm that we want to build
         if (not ACCEPT):
-            __formatted_package_list = "\n".join(f"\t - {file}" for file in found_pyx_files)
-            do_accept = typer.confirm(f"[{appsettings.package_name}] these {len(found_pyx_files)} pyx files?\n(y/n) \n {__formatted_package_list}")
+            if (found_pyx_files is None):
+                do_accept = typer.confirm(f"[{appsettings.package_name}] clean up after all built pyx files{' and remove their extensions' if (remove_artifacts) else ''}?")
+            else:
+                __formatted_package_list = "\n".join(f"\t - {file}" for file in found_pyx_files)
+                do_accept = typer.confirm(f"[{appsettings.package_name}] these {len(found_pyx_files)} pyx files?\n(y/n) \n {__formatted_package_list}")
             if not do_accept:
                 typer.secho(message=f"Exiting..", color=typer.colors.GREEN)
                 sys.exit(0)
 
         # 3. Clean
-        typer.secho(message=f"Cleaning {len(found_pyx_files)} pyx files..", color=typer.colors.GREEN)
-        cython_builder.cy_clean(target_files=found_pyx_files, keep_c_files=keep_c_files)
-        typer.secho(message=f"Cleanup complete", color=typer.colors.GREEN)
+        typer.secho(message=f"Cleaning {'all built' if (found_pyx_files is None) else len(found_pyx_files)} pyx files..", color=typer.colors.GREEN)
+        removed_files = cython_builder.cy_clean(target_files=found_pyx_files, keep_c_files=keep_c_files, remove_artifacts=remove_artifacts)
+        typer.secho(message=f"Cleanup complete; removed {len(removed_files)} files", color=typer.colors.GREEN)
     except Exception as e:
         typer.secho(message=f"Cleanup error: {e}", color=typer.colors.RED)
         sys.exit(1)
@@ -130,11 +264,14 @@ def cb_clean(
 @app.command(name="interface", help="Create .pyi files for use in your Python project", short_help="generate interface files")
 def cb_interface(
         target_filenames: typing.List[str] = typer.Option(None, "--files", help="Target .pyx file names"),
-        ACCEPT: bool = DefaultArgs.accept, VERBOSE: bool = DefaultArgs.verbose
+        encoding: str = typer.Option('UTF-8', "--encoding", help="Encoding of your .pyx files"),
+        jobs: int = typer.Option(None, "--jobs", '-j', min=1, help="Number of files to generate in parallel (default: cpu count)"),
+        EXCLUDE: typing.List[str] = DefaultArgs.exclude, USE_GIT: bool = DefaultArgs.use_git, RESCAN: bool = DefaultArgs.rescan,
+        FORCE: bool = DefaultArgs.force, ACCEPT: bool = DefaultArgs.accept, VERBOSE: bool = DefaultArgs.verbose
 ):
     try:
         # 1. Find pyx files
-        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames)
+        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames, exclude=EXCLUDE or None, use_git=USE_GIT, rescan=RESCAN)
         if (len(found_pyx_files) == 0):
             typer.secho(message=f"No .pyx files found", color=typer.colors.GREEN)
             sys.exit(0)
@@ -150,8 +287,213 @@ def cb_interface(
 
         # 3. Generate pyi files
         typer.secho(message=f"Generating {len(found_pyx_files)} interface files..", color=typer.colors.GREEN)
-        cython_builder.cy_interface(target_files=found_pyx_files)
-        typer.secho(message=f"Generating interface files complete", color=typer.colors.GREEN)
+        written_pyi_files = cython_builder.cy_interface(target_files=found_pyx_files, encoding=encoding, jobs=jobs, force=FORCE)
+        typer.secho(message=f"Generating interface files complete; {len(written_pyi_files)} changed", color=typer.colors.GREEN)
     except Exception as e:
         typer.secho(message=f"Error generating interface(s): {e}", color=typer.colors.RED)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+@app.command(name="deps", help="Show the cimport/include dependency graph of your .pyx files", short_help="Show dependency graph")
+def cb_deps(
+        target_filenames: typing.List[str] = typer.Option(None, "--files", help="Target .pyx file names"),
+        changed_filenames: typing.List[str] = typer.Option(None, "--changed", help="Show which .pyx files must be rebuilt when these files change"),
+        EXCLUDE: typing.List[str] = DefaultArgs.exclude, USE_GIT: bool = DefaultArgs.use_git, RESCAN: bool = DefaultArgs.rescan,
+        VERBOSE: bool = DefaultArgs.verbose
+):
+    try:
+        # 1. Find pyx files and build the graph
+        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames, exclude=EXCLUDE or None, use_git=USE_GIT, rescan=RESCAN)
+        if (len(found_pyx_files) == 0):
+            typer.secho(message="No .pyx files found", color=typer.colors.GREEN)
+            sys.exit(0)
+        graph = cython_builder.cy_deps(target_files=found_pyx_files)
+
+        # 2. Print graph
+        relpath = lambda p: os.path.relpath(p, cython_builder.project_dir)
+        graph_lines = []
+        for fle in sorted(graph.dependencies):
+            graph_lines.append(f"\t - {relpath(fle)}")
+            graph_lines += [f"\t\t -> {relpath(dep)}" for dep in sorted(graph.dependencies[fle])]
+        graph_string = "\n".join(graph_lines)
+        typer.secho(message=f"Dependency graph:\n{graph_string}", color=typer.colors.GREEN)
+
+        # 3. Print rebuild set
+        if (changed_filenames):
+            rebuild_pyx_files = graph.rebuild_set(changed_files=changed_filenames)
+            rebuild_string = "\n".join([f"\t - {relpath(fle)}" for fle in rebuild_pyx_files])
+            typer.secho(message=f"Changing {' '.join(changed_filenames)} rebuilds {len(rebuild_pyx_files)} pyx files:\n{rebuild_string}", color=typer.colors.GREEN)
+    except Exception as e:
+        typer.secho(message=f"Error building dependency graph: {e}", color=typer.colors.RED)
+        sys.exit(1)
+
+@app.command(name="hotspots", help="Rank lines and functions by Python interaction, from the annotation html of the last build", short_help="Show Python interaction hotspots")
+def cb_hotspots(
+        target_filenames: typing.List[str] = typer.Option(None, "--files", help="Target .pyx file names"),
+        by: str = typer.Option('line', "--by", help="Rank single lines ('line') or whole functions ('function')"),
+        top: int = typer.Option(20, "--top", min=1, help="Number of hotspots to show"),
+        as_json: bool = typer.Option(False, "--json", help="Print the report as JSON"),
+        fail_above: int = typer.Option(None, "--fail-above", help="Exit with 1 if a line (or function with --by function) scores higher than this"),
+        EXCLUDE: typing.List[str] = DefaultArgs.exclude, USE_GIT: bool = DefaultArgs.use_git, RESCAN: bool = DefaultArgs.rescan,
+        VERBOSE: bool = DefaultArgs.verbose
+):
+    try:
+        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames, exclude=EXCLUDE or None, use_git=USE_GIT, rescan=RESCAN)
+        report = cython_builder.cy_hotspots(target_files=found_pyx_files)
+        if (len(report.lines) == 0):
+            typer.secho(message=f"No annotations found in {appsettings.cython_anno_dirname}; build with annotations first", color=typer.colors.YELLOW)
+            sys.exit(0)
+        hotspots = report.ranked(by=by, top=top)
+        offenders = [h for h in report.ranked(by=by) if (fail_above is not None and h.score > fail_above)]
+
+        if (as_json):
+            report_dict = report.to_dict(by=by, top=top)
+            report_dict['fail_above'] = fail_above
+            report_dict['failed'] = len(offenders) > 0
+            typer.echo(json.dumps(report_dict, indent=2))
+        else:
+            if (by == 'line'):
+                rows = [f"\t{h.score:>6}  {h.file + ':' + str(h.line):<32} {h.function or '':<24} {h.code}" for h in hotspots]
+            else:
+                rows = [f"\t{h.score:>6}  {h.file + ':' + str(h.worst_line):<32} {h.function:<24} {h.lines} lines" for h in hotspots]
+            rows_string = "\n".join(rows)
+            typer.secho(message=f"Top {len(hotspots)} {by} hotspots (score ~ Python C-API calls, total {sum(l.score for l in report.lines)}):\n{rows_string}", color=typer.colors.GREEN)
+            if (len(offenders) > 0):
+                typer.secho(message=f"{len(offenders)} {by}s score higher than {fail_above}", color=typer.colors.RED)
+        if (len(offenders) > 0):
+            sys.exit(1)
+    except ValueError as e:
+        typer.secho(message=f"Error creating hotspot report: {e}", color=typer.colors.RED)
+        sys.exit(1)
+
+def _format_seconds(seconds:float) -> str:
+    for unit, factor in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+        if (seconds >= factor):
+            return f"{seconds / factor:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+@app.command(name="bench", help="Time the bench_* functions in bench_<module>.py files against the compiled and the pure-Python module", short_help="Benchmark compiled vs Python")
+def cb_bench(
+        target_filenames: typing.List[str] = typer.Option(None, "--files", help="Target .pyx file names"),
+        warmup: int = typer.Option(None, "--warmup", min=0, help="Rounds to discard before timing (default 1)"),
+        repeats: int = typer.Option(None, "--repeats", min=1, help="Timed rounds (default 7)"),
+        baseline_path: str = typer.Option(None, "--baseline", help="Earlier JSON report to compare the compiled timings with"),
+        output_path: str = typer.Option(None, "--output", help="Where to save the JSON report (default: ext/bench/bench-<time>.json)"),
+        as_json: bool = typer.Option(False, "--json", help="Print the report as JSON"),
+        EXCLUDE: typing.List[str] = DefaultArgs.exclude, USE_GIT: bool = DefaultArgs.use_git, RESCAN: bool = DefaultArgs.rescan,
+        VERBOSE: bool = DefaultArgs.verbose
+):
+    try:
+        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames, exclude=EXCLUDE or None, use_git=USE_GIT, rescan=RESCAN)
+        report = cython_builder.cy_bench(target_files=found_pyx_files, warmup=warmup, repeats=repeats, baseline_path=baseline_path, output_path=output_path)
+    except (ValueError, OSError) as e:
+        typer.secho(message=f"Error running benchmarks: {e}", color=typer.colors.RED)
+        sys.exit(1)
+    if (as_json):
+        typer.echo(json.dumps(report, indent=2))
+        sys.exit(0)
+    if (len(report['benchmarks']) == 0):
+        typer.secho(message="No benchmarks found; add bench_* functions to bench_<module>.py next to your .pyx files", color=typer.colors.YELLOW)
+        sys.exit(0)
+
+    rows = []
+    for b in report['benchmarks']:
+        columns = [f"{b['file'] + ' ' + b['name']:<40}"]
+        for variant in ['compiled', 'python']:
+            timing = b[variant]
+            columns.append(f"{variant} {_format_seconds(timing['median'])} (p95 {_format_seconds(timing['p95'])})" if (timing is not None) else f"{variant} -")
+        if (b['speedup'] is not None):
+            columns.append(f"speedup {b['speedup']:.2f}x")
+        if (b['baseline_speedup'] is not None):
+            columns.append(f"vs baseline {b['baseline_speedup']:.2f}x")
+        rows.append("\t" + "  ".join(columns))
+        rows += [f"\t\t{variant}: {err}" for variant, err in b['errors'].items()]
+    rows_string = "\n".join(rows)
+    typer.secho(message=f"Median time per call over {report['settings']['repeats']} rounds:\n{rows_string}", color=typer.colors.GREEN)
+    typer.secho(message=f"Saved report to {report['output_path']}", color=typer.colors.GREEN)
+
+@app.command(name="profile", help="Build instrumented extensions and run a script against them under cProfile or a line tracer; time per Cython function or line",
+             short_help="Profile Cython code with a workload", context_settings={'allow_extra_args': True, 'ignore_unknown_options': True})
+def cb_profile(
+        script: str = typer.Argument(..., help="Python script that runs the workload; arguments after it are passed on"),
+        script_args: typing.List[str] = typer.Argument(None, help="Arguments of the script"),
+        target_filenames: typing.List[str] = typer.Option(None, "--files", help="Target .pyx file names"),
+        by_line: bool = typer.Option(False, "--lines", help="Time every line instead of every function (slower)"),
+        top: int = typer.Option(20, "--top", min=1, help="Number of functions or lines to show"),
+        include_numpy: bool = typer.Option(False, "--include-numpy", help="Include numpy if numpy is installed in your project"),
+        jobs: int = typer.Option(None, "--jobs", '-j', min=1, help="Number of files to build in parallel (default: cpu count)"),
+        profile: str = typer.Option(None, "--profile", help="Compiler settings to instrument: default, release, native, lto, debug or one from [tool.cythonbuilder.profiles]"),
+        output_path: str = typer.Option(None, "--output", help="Where to save the JSON report (default: ext/profile/profile-<time>.json)"),
+        as_json: bool = typer.Option(False, "--json", help="Print the report as JSON"),
+        EXCLUDE: typing.List[str] = DefaultArgs.exclude, USE_GIT: bool = DefaultArgs.use_git, RESCAN: bool = DefaultArgs.rescan,
+        VERBOSE: bool = DefaultArgs.verbose
+):
+    try:
+        found_pyx_files: [str] = cython_builder.cy_list(target_files=target_filenames, exclude=EXCLUDE or None, use_git=USE_GIT, rescan=RESCAN)
+        report = cython_builder.cy_profile(script=script, script_args=script_args or [], target_files=found_pyx_files, mode='line' if (by_line) else 'function',
+                                           include_numpy=include_numpy, jobs=jobs, profile=profile, output_path=output_path)
+    except (ValueError, OSError) as e:
+        typer.secho(message=f"Error profiling: {e}", color=typer.colors.RED)
+        sys.exit(1)
+    if (as_json):
+        typer.echo(json.dumps(report.to_dict(top=top), indent=2))
+        sys.exit(report.exit_code)
+
+    items = report.ranked(top=top)
+    if (report.mode == 'function'):
+        rows = [f"\t{_format_seconds(f.own_time):>8} {_format_seconds(f.total_time):>8} {f.calls:>10}  {f.file + ':' + str(f.line):<32} {f.function}" for f in items]
+        header = f"\t{'own':>8} {'total':>8} {'calls':>10}  location"
+    else:
+        rows = [f"\t{_format_seconds(l.time):>8} {l.hits:>10}  {l.file + ':' + str(l.line):<32} {l.code}" for l in items]
+        header = f"\t{'time':>8} {'hits':>10}  location"
+    rows_string = "\n".join([header] + rows)
+    typer.secho(message=f"Top {len(items)} {report.mode}s of the Cython code, workload ran {report.wall_time:.2f}s:\n{rows_string}", color=typer.colors.GREEN)
+    typer.secho(message=f"Saved report to {report.output_path}", color=typer.colors.GREEN)
+    if (report.exit_code != 0):
+        typer.secho(message=f"{script} exited with code {report.exit_code}", color=typer.colors.YELLOW)
+    sys.exit(report.exit_code)
+
+@app.command(name="watch", help="Rebuild .pyx files and their .pyi files whenever they or their dependencies change", short_help="Rebuild on file change")
+def cb_watch(
+        target_filenames: typing.List[str] = typer.Option(None, "--files", help="Target .pyx file names"),
+        include_numpy: bool = typer.Option(False, "--include-numpy", help="Include numpy if numpy is installed in your project"),
+        dont_generate_annotations: bool = typer.Option(False, "--no-annotation", help="Skip generating annotations (html)"),
+        dont_generate_pyi: bool = typer.Option(False, "--no-interface", help="Skip generating .pyi stub files"),
+        keep_c_files: bool = typer.Option(False, "--no-cleanup", help="Skip removing generated C-files"),
+        encoding: str = typer.Option('UTF-8', "--encoding", help="Encoding of your .pyx files"),
+        jobs: int = typer.Option(None, "--jobs", '-j', min=1, help="Number of files to build in parallel (default: cpu count)"),
+        profile: str = typer.Option(None, "--profile", help="Compiler settings: default, release, native, lto, debug or one from [tool.cythonbuilder.profiles]"),
+        directives: str = typer.Option(None, "--directives", help="Cython compiler directives: a preset (fast, safe) and/or name=value pairs, like 'fast,language_level=3'"),
+        compiler_cache: str = typer.Option(None, "--compiler-cache", help="Reuse compiled objects of identical C code: auto (ccache/sccache if installed, else builtin), ccache, sccache, builtin or none"),
+        use_polling: bool = typer.Option(False, "--poll", help="Poll for changes instead of using inotify"),
+        debounce: float = typer.Option(0.3, "--debounce", min=0.0, help="Seconds without changes before rebuilding"),
+        EXCLUDE: typing.List[str] = DefaultArgs.exclude, VERBOSE: bool = DefaultArgs.verbose
+):
+    typer.secho(message="Watching for changes, press Ctrl+C to stop..", color=typer.colors.GREEN)
+    try:
+        rebuilds = cython_builder.cy_watch(
+            target_files=target_filenames,
+            create_annotations=not dont_generate_annotations,
+            include_numpy=include_numpy,
+            generate_pyi=not dont_generate_pyi,
+            keep_c_files=keep_c_files,
+            encoding=encoding,
+            jobs=jobs,
+            profile=profile,
+            directives=directives,
+            compiler_cache=compiler_cache,
+            exclude=EXCLUDE or None,
+            use_polling=use_polling,
+            debounce=debounce,
+        )
+        for rebuild in rebuilds:
+            changed_string = f" after changes to {', '.join(os.path.relpath(f, cython_builder.project_dir) for f in rebuild.changed_files)}" if (rebuild.changed_files) else ""
+            cache_string = f" ({rebuild.cache_stats})" if (len(rebuild.built_files) > 0 and rebuild.cache_stats.backend != 'none') else ""
+            typer.secho(message=f"Rebuilt {len(rebuild.built_files)} pyx files in {rebuild.duration:.2f}s{changed_string}{cache_string}", color=typer.colors.GREEN)
+            for fle, err in rebuild.failures.items():
+                typer.secho(message=f"\t - {os.path.relpath(fle, cython_builder.project_dir)}: {err}", color=typer.colors.RED)
+    except KeyboardInterrupt:
+        typer.secho(message="Stopped watching", color=typer.colors.GREEN)
+    except Exception as e:
+        typer.secho(message=f"watch error: {e}", color=typer.colors.RED)
+        sys.exit(1)
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+from dataclasses import dataclass
+
+from . import appsettings
+from .logs import logger
+
+COMPILER_CACHES = ('auto', 'ccache', 'sccache', 'builtin', 'none')
+_LAUNCHERS = ('ccache', 'sccache')
+
+
+@dataclass
+class CacheStats:
+    """ Object (or artifact) cache hits and misses of one or more builds """
+    backend: str = None
+    hits: int = 0
+    misses: int = 0
+    label: str = 'compiler cache'
+
+    def add(self, hits:int=0, misses:int=0) -> None:
+        self.hits += hits
+        self.misses += misses
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = f", {self.hits / lookups:.0%} hit rate" if (lookups > 0) else ""
+        return f"{self.label} ({self.backend}): {self.hits} hits, {self.misses} misses{hit_rate}"
+
+
+def default_cache_dir() -> str:
+    """ $CYTHONBUILDER_CACHE_DIR, else $XDG_CACHE_HOME/cythonbuilder/objects, else ~/.cache/cythonbuilder/objects """
+    if (os.environ.get('CYTHONBUILDER_CACHE_DIR')):
+        return os.environ['CYTHONBUILDER_CACHE_DIR']
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, appsettings.package_name, 'objects')
+
+
+def resolve_compiler_cache(name:str=None) -> str:
+    """ The backend to compile with: 'ccache' or 'sccache' (a launcher in front of the compiler), 'builtin' (ObjectCache)
+        or 'none'. 'auto' (default) picks ccache or sccache when installed, else the built-in cache
+    """
+    name = 'auto' if (name is None) else name
+    if (name not in COMPILER_CACHES):
+        raise ValueError(f"[{resolve_compiler_cache.__name__}] - unknown compiler cache '{name}'; choose from {', '.join(COMPILER_CACHES)}")
+    if (name == 'auto'):
+        return next((launcher for launcher in _LAUNCHERS if (shutil.which(launcher) is not None)), 'builtin')
+    if (name in _LAUNCHERS and shutil.which(name) is None):
+        raise ValueError(f"[{resolve_compiler_cache.__name__}] - compiler cache '{name}' is not installed")
+    return name
+
+
+def launcher_counters(launcher:str) -> (int, int):
+    """ Total (hits, misses) ccache or sccache has counted so far; the difference before and after a build is the
+        result of that build. None if the statistics cannot be read
+    """
+    try:
+        if (launcher == 'ccache'):
+            # ccache 4+: one "<counter>\t<value>" line per counter
+            output = subprocess.run(['ccache', '--print-stats'], capture_output=True, check=True, text=True).stdout
+            counters = dict(line.split('\t', 1) for line in output.splitlines() if ('\t' in line))
+            hits = int(counters.get('direct_cache_hit', 0)) + int(counters.get('preprocessed_cache_hit', 0))
+            return hits, int(counters.get('cache_miss', 0))
+        output = subprocess.run(['sccache', '--show-stats', '--stats-format=json'], capture_output=True, check=True, text=True).stdout
+        stats = json.loads(output)['stats']
+        return sum(stats['cache_hits']['counts'].values()), sum(stats['cache_misses']['counts'].values())
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError) as e:
+        logger.debug(msg=f"[{launcher_counters.__name__}] - cannot read {launcher} statistics: {e}")
+        return None
+
+
+class ObjectCache:
+    """ Content-addressed store of compiled object files. Like ccache's direct mode, nothing is preprocessed: the key
+        of a compilation is the hash of the compiler binary, all compiler flags and the C source, and the object is
+        stored under that key plus the hashes of the headers the source included (as reported by the compiler with -MD
+        on a miss). Files are written through a temp file and renamed, so parallel workers can share one cache. Least
+        recently used files are evicted once the cache grows beyond [max_size] bytes
+    """
+
+    def __init__(self, cache_dir:str, max_size:int=None):
+        self.cache_dir = cache_dir
+        self.max_size = appsettings.compiler_cache_max_size if (max_size is None) else max_size
+        # (path, size, mtime) -> sha256 of the headers hashed so far; the Python headers are shared by every file
+        self._header_hashes = {}
+
+    def _path(self, key:str, suffix:str='.o') -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}{suffix}")
+
+    def key(self, compiler_cmd:[str], src:str, compile_args:[str]) -> str:
+        """ None when the source cannot be read; the file is then compiled without the cache """
+        sha = hashlib.sha256()
+        compiler_path = shutil.which(compiler_cmd[0]) or compiler_cmd[0]
+        try:
+            compiler_stat = os.stat(compiler_path)
+            sha.update(f"{compiler_path}:{compiler_stat.st_size}:{compiler_stat.st_mtime_ns}\0".encode())
+        except OSError:
+            sha.update(f"{compiler_path}\0".encode())
+        sha.update("\0".join(compiler_cmd + compile_args).encode())
+        sha.update(b"\0")
+        try:
+            with open(src, 'rb') as f:
+                sha.update(f.read())
+        except OSError:
+            return None
+        return sha.hexdigest()
+
+    def object_key(self, key:str, headers:[str]) -> str:
+        """ The key the object of [key] is stored under, given the headers it includes. None if a header is gone """
+        sha = hashlib.sha256(key.encode())
+        for header in headers:
+            try:
+                stat = os.stat(header)
+                cache_key = (header, stat.st_size, stat.st_mtime_ns)
+                if (cache_key not in self._header_hashes):
+                    with open(header, 'rb') as f:
+                        self._header_hashes[cache_key] = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                return None
+            sha.update(f"\0{header}\0{self._header_hashes[cache_key]}".encode())
+        return sha.hexdigest()
+
+    def headers(self, key:str) -> [str]:
+        """ The headers the last compilation of [key] included, None if it was never compiled through the cache """
+        try:
+            with open(self._path(key=key, suffix='.headers'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_headers(self, key:str, headers:[str]) -> None:
+        self._write(path=self._path(key=key, suffix='.headers'), data=json.dumps(headers).encode())
+
+    def fetch(self, key:str, obj_path:str) -> bool:
+        """ Copies the cached object to [obj_path]. A hit marks the object as recently used """
+        cached_path = self._path(key=key)
+        try:
+            shutil.copyfile(cached_path, obj_path)
+            os.utime(cached_path)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key:str, obj_path:str) -> None:
+        try:
+            with open(obj_path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logger.debug(msg=f"[{ObjectCache.store.__name__}] - cannot cache {obj_path}: {e}")
+            return
+        self._write(path=self._path(key=key), data=data)
+
+    def _write(self, path:str, data:bytes) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(msg=f"[{ObjectCache._write.__name__}] - cannot write {path}: {e}")
+
+    def evict(self) -> int:
+        """ Removes the least recently used files until the cache fits in max_size. Returns the number removed """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, os.path.join(root, name)))
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if (total_size <= self.max_size):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            removed += 1
+        return removed
+
+
+def install_compiler_cache(compiler, backend:str, cache_dir:str, stats:CacheStats) -> None:
+    """ Makes a distutils compiler compile through ccache/sccache or the built-in ObjectCache. Only the unix compiler
+        (gcc, clang) is supported; MSVC builds are not cached. Hits and misses of the built-in cache go into [stats]
+    """
+    if (backend == 'none' or compiler.compiler_type != 'unix'):
+        return
+    if (backend in _LAUNCHERS):
+        if (os.path.basename(compiler.compiler_so[0]) not in _LAUNCHERS):
+            compiler.compiler_so = [backend] + compiler.compiler_so
+        return
+
+    cache = ObjectCache(cache_dir=cache_dir)
+    original_compile = compiler._compile
+
+    def _compile(obj, src, ext, cc_args, extra_postargs, pp_opts):
+        key = cache.key(compiler_cmd=list(compiler.compiler_so), src=src, compile_args=list(cc_args) + list(extra_postargs))
+        if (key is None):
+            original_compile(obj, src, ext, cc_args, extra_postargs, pp_opts)
+            stats.add(misses=1)
+            return
+        headers = cache.headers(key=key)
+        object_key = None if (headers is None) else cache.object_key(key=key, headers=headers)
+        if (object_key is not None and cache.fetch(key=object_key, obj_path=obj)):
+            stats.add(hits=1)
+            return
+
+        # the compiler lists the headers it read while compiling, so a miss costs no extra preprocessor run
+        dependency_path = f"{obj}.d"
+        original_compile(obj, src, ext, cc_args, list(extra_postargs) + ['-MD', '-MF', dependency_path], pp_opts)
+        stats.add(misses=1)
+        headers = read_dependency_file(dependency_path=dependency_path, src=src)
+        object_key = None if (headers is None) else cache.object_key(key=key, headers=headers)
+        if (object_key is not None):
+            cache.store(key=object_key, obj_path=obj)
+            cache.store_headers(key=key, headers=headers)
+
+    compiler._compile = _compile
+
+
+def read_dependency_file(dependency_path:str, src:str) -> [str]:
+    """ The headers in a make rule written by the compiler's -MD option, as absolute paths; the file is removed.
+        None when it cannot be read
+    """
+    try:
+        with open(dependency_path, 'r') as f:
+            rule = f.read()
+        os.remove(dependency_path)
+    except OSError as e:
+        logger.debug(msg=f"[{read_dependency_file.__name__}] - cannot read {dependency_path}: {e}")
+        return None
+    _, _, prerequisites = rule.replace("\\\n", " ").partition(": ")
+    paths = {os.path.abspath(p.replace("\\ ", " ")) for p in re.split(r"(?<!\\)\s+", prerequisites) if (len(p) > 0)}
+    return sorted(paths - {os.path.abspath(src)})
@@ -0,0 +1,25 @@
+import os
+import sys
+
+from . import appsettings
+from .logs import logger
+
+if (sys.version_info >= (3, 11)):
+    import tomllib
+else:
+    import tomli as tomllib
+
+
+def load_config(project_dir:str) -> dict:
+    """ The [tool.cythonbuilder] table of projdir/pyproject.toml. Empty if there is no pyproject.toml or no such table """
+    pyproject_path = os.path.join(project_dir, 'pyproject.toml')
+    if (not os.path.isfile(pyproject_path)):
+        return {}
+    try:
+        with open(pyproject_path, 'rb') as f:
+            pyproject = tomllib.load(f)
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"[{load_config.__name__}] - cannot read {pyproject_path}: {e}")
+    config = pyproject.get('tool', {}).get(appsettings.package_name, {})
+    logger.debug(msg=f"[{load_config.__name__}] - loaded [tool.{appsettings.package_name}] with keys {sorted(config)}")
+    return config
@@ -1,12 +1,24 @@
-import pathlib
-from pathlib import Path
+import json
 import os
-import shutil
+import subprocess
 import sys
+import time
+import typing
+from dataclasses import dataclass, field
 
 from .helpers import FilesAndFolders
 from .helpers import logger
-from . import pyigenerator, appsettings
+from . import appsettings
+from .discovery import DiscoveryIndex, discover_project, git_ls_files
+# Everything else is imported by the function that needs it, so `cybuilder list` does not pay for building,
+# benchmarking or watching (see bench/bench_startup.py)
+if (typing.TYPE_CHECKING):
+    from .builder import Builder
+    from .compiler_cache import CacheStats
+    from .dependencies import DependencyGraph
+    from .hotspots import HotspotReport
+    from .profiler import ProfileReport
+    from .timings import BuildTimer
 
 project_dir = os.getcwd()
 
@@ -18,18 +30,29 @@ def cy_init():
     FilesAndFolders.create_folder(folderpath=os.path.join(project_dir, appsettings.cython_extensions_dirname))
     FilesAndFolders.create_folder(folderpath=os.path.join(project_dir, appsettings.cython_anno_dirname))
     logger.debug(msg=f"[{cy_init.__name__}] - Initialized cybuilder at {project_dir}")
-def cy_list(target_files:[str]=None) -> [str]:
-    """ Target files is optional filter. Returns a list of fullpaths to pyxfiles """
+def _discover(exclude:[str]=None, rescan:bool=False) -> [str]:
+    """ All .pyx, .pxd and .pxi files in the project, see discovery.discover_project """
+    return discover_project(project_dir=project_dir, exclude=exclude, rescan=rescan)
+def cy_list(target_files:[str]=None, exclude:[str]=None, use_git:bool=False, rescan:bool=False) -> [str]:
+    """ Target files is optional filter. Returns a list of fullpaths to pyxfiles.
+        Virtual environments, .gitignored paths and folders matching [exclude] (default:
+        appsettings.default_excluded_dirnames) are skipped. [use_git] lists files through git ls-files when possible.
+        Otherwise a directory index in /ext is used; [rescan] ignores it and walks the whole project
+    """
 
     target_files = [] if (target_files is None) else target_files
 
     # 1. Find all fullpaths to pyx files in all folders but the /venv
-    venv_paths_folders = [os.path.dirname(path) for path in Path(project_dir).rglob('pyvenv.cfg')]
-    pyx_fullpaths = [str(pyxpath) for pyxpath in Path(project_dir).rglob('*.pyx')]
-    for venvpath in venv_paths_folders:
-        pyx_fullpaths = [pf for pf in pyx_fullpaths if (venvpath not in pf)]
+    pyx_fullpaths = None
+    if (use_git):
+        pyx_fullpaths = git_ls_files(project_dir=project_dir, extensions=('.pyx',), exclude=exclude)
+    if (pyx_fullpaths is None):
+        pyx_fullpaths = [f for f in _discover(exclude=exclude, rescan=rescan) if (f.endswith('.pyx'))]
 
     # 2. Apply optional file name filter
+    return _filter_by_name(pyx_fullpaths=pyx_fullpaths, target_files=target_files)
+def _filter_by_name(pyx_fullpaths:[str], target_files:[str]) -> [str]:
+    """ Keeps the pyx files whose name is in target_files (with or without .pyx). No filter if target_files is empty """
     if (len(target_files) > 0):
         my_pyx_file_names = [os.path.splitext(os.path.basename(p))[0] for p in pyx_fullpaths]
         target_file_names = [os.path.splitext(p)[0] for p in target_files]
@@ -45,133 +68,514 @@ def cy_list(target_files:[str]=None) -> [str]:
         pyx_fullpaths = _pyx_fullpaths
 
     return pyx_fullpaths
-def cy_build(target_files:[str] = None, create_annotations:bool=True, include_numpy:bool=False):
-    """ Builds all pyx files in the /ext folder """
+class CythonBuildError(ValueError):
+    """ Raised after a build in which one or more target files failed. Holds {pyx_fullpath: error message} and the
+        files that did build
+    """
+
+    def __init__(self, failures:{str: str}, built_files:[str] = None):
+        self.failures = failures
+        self.built_files = [] if (built_files is None) else built_files
+        failed_files_string = "\n".join([f"\t - {fle}: {err}" for fle, err in failures.items()])
+        super().__init__(f"{len(failures)} file(s) failed to build:\n{failed_files_string}")
+
+
+def cy_build(target_files:[str] = None, jobs:int=None, cache_stats:'CacheStats'=None, artifact_stats:'CacheStats'=None, timer:'BuildTimer'=None,
+             footprints:{str: tuple}=None, builder:'Builder'=None, **options) -> [str]:
+    """ Builds the changed pyx files (default: all of the project) with [jobs] workers and the [options] of
+        builder.BuildOptions, which describes them and the other arguments. Returns the built files; raises a
+        CythonBuildError with all failures after building the other files
+    """
+
+    import contextlib
+    import shutil
+    import tempfile
+    from .build_manifest import artifact_path
+    from .builder import BuildOptions, Builder
 
     # 1. Get target files
     if (target_files == None):
         target_files = cy_list()
+    options = BuildOptions(**{'capture_output': False, **options})
+
+    # 2. Build; the extensions that get replaced are kept aside to compare them with their successors
+    with tempfile.TemporaryDirectory() as previous_dir:
+        previous_paths = {}
+        if (footprints is not None and not options.instrument):
+            for n in target_files:
+                if (os.path.isfile(artifact_path(pyx_fullpath=n))):
+                    previous_paths[n] = os.path.join(previous_dir, f"{len(previous_paths)}-{os.path.basename(artifact_path(pyx_fullpath=n))}")
+                    shutil.copyfile(artifact_path(pyx_fullpath=n), previous_paths[n])
+        with (Builder(project_dir=project_dir, jobs=jobs) if (builder is None) else contextlib.nullcontext(builder)) as target_builder:
+            result = target_builder.build(targets=target_files, options=options)
+        if (footprints is not None and not options.instrument):
+            from .footprint import measure_footprint
+            for n in result.built_files:
+                before = measure_footprint(pyx_fullpath=n, extension_path=previous_paths[n]) if (n in previous_paths) else None
+                footprints[n] = (before, measure_footprint(pyx_fullpath=n, extension_path=artifact_path(pyx_fullpath=n)))
+    if (cache_stats is not None):
+        cache_stats.backend = result.cache_stats.backend
+        cache_stats.add(hits=result.cache_stats.hits, misses=result.cache_stats.misses)
+    if (artifact_stats is not None):
+        artifact_stats.backend = result.artifact_stats.backend
+        artifact_stats.add(hits=result.artifact_stats.hits, misses=result.artifact_stats.misses)
+    if (timer is not None):
+        timer.add(spans=result.timer.spans)
+
+    # 3. Report all failures at once
+    if (not result.ok):
+        raise CythonBuildError(failures=result.failures, built_files=result.built_files)
+    return result.built_files
+def cy_pgo(training_command:str, target_files:[str] = None, create_annotations:bool=True, include_numpy:bool=False, jobs:int=None, profile:str=None, keep_c_files:bool=False, directives=None,
+           bundle:bool=None, openmp:bool=None, small:bool=None) -> {str: float}:
+    """ Profile-guided optimization build (gcc only) of the target files:
+            1. build with -fprofile-generate in an isolated build folder (ext/pgo) and install the instrumented extensions
+            2. run [training_command] (a shell command, from the project folder) to collect profile data
+            3. build again with -fprofile-use and install the optimized extensions
+        Profile data of earlier runs is removed first, and ext/pgo again afterwards. When a step fails, the instrumented
+        extensions are removed as well. [profile] is the base profile the PGO flags are added to; [bundle], [openmp] and
+        [small] apply to both builds, like in cy_build. Every file is rebuilt, without the compiler and artifact caches.
+        Returns the duration in seconds of every step
+    """
+
+    from .config import load_config
+    from .profiles import BuildProfile, check_pgo_support, pgo_profiles, resolve_profile
 
+    # 1. Get target files
+    if (target_files == None):
+        target_files = cy_list()
+    check_pgo_support()
+    base_profile = profile if (isinstance(profile, BuildProfile)) else resolve_profile(name=profile, config=load_config(project_dir=project_dir))
 
-    # We want to build in place
-    sys.argv = [sys.argv[0], 'build_ext', '--inplace']
-
-    from setuptools import setup, Extension
-    from Cython.Distutils import build_ext
-    from Cython.Build import cythonize
-    import Cython.Compiler.Options
-
-    # Annotation is whether or not the html should be created
-    Cython.Compiler.Options.annotate = create_annotations
-
-    # Create Extension objects
-    ext_modules = []
-    for n in target_files:
-        if (not os.path.isfile(n)):
-            logger.info(msg=f"File '{n}' not found; skipping..")
-            continue
-        logger.debug(msg=f"C {n}")
-        module_name, extension = os.path.splitext(os.path.basename(n))
-        # The name must be plain, no path
-        obj = Extension(
-            name=module_name,
-            sources=[n],
-            # extra_compile_args=["-O2", "-march=native"]
-        )
-        ext_modules.append(obj)
-
-    # Extra include folders. Mainly for numpy.
-    include_dirs = []
-    if (include_numpy):
+    # Stale profile data would be mixed into the new profile
+    cy_init()
+    pgo_dir = os.path.join(project_dir, appsettings.cython_pgo_dirname)
+    profile_data_dir = os.path.join(pgo_dir, 'profile-data')
+    FilesAndFolders.remove_folder(folderpath=pgo_dir)
+    generate_profile, use_profile = pgo_profiles(profile=base_profile, profile_data_dir=profile_data_dir)
+    # The object and artifact caches are keyed by the C source and flags, not by the profile data that -fprofile-use reads
+    build_kwargs = dict(create_annotations=create_annotations, include_numpy=include_numpy, jobs=jobs, force=True, build_dir=os.path.join(pgo_dir, 'build'), directives=directives,
+                        compiler_cache='none', artifact_cache='none', bundle=bundle, openmp=openmp, small=small)
+    timings:{str: float} = {}
+
+    # A failed step leaves no instrumented extensions behind: they would write profile data on every import
+    instrumented_files:[str] = []
+    optimized_files:[str] = []
+    try:
+        # 2. Instrumented build
+        started = time.perf_counter()
         try:
-            import numpy
-            include_dirs += [numpy.get_include()]
-        except:
-            raise ValueError('Numpy is required, but not found. Please install')
-
-    # build
-    setup(
-        cmdclass={'build_ext': build_ext},
-        include_dirs=include_dirs,
-        ext_modules=cythonize(ext_modules),
-        # buid_dir=path_build_dir
-    )
-def cy_clean(target_files:[str] = None, keep_c_files:bool=False):
-    """ Clean up all files """
-    logger.debug(msg=f"[{cy_clean.__name__}] - start cy_clean with {target_files}")
+            instrumented_files = cy_build(target_files=target_files, profile=generate_profile, **build_kwargs)
+        except CythonBuildError as e:
+            instrumented_files = e.built_files
+            raise
+        cy_clean(target_files=instrumented_files, keep_c_files=True)
+        timings['instrumented build'] = time.perf_counter() - started
+        logger.debug(msg=f"[{cy_pgo.__name__}] - instrumented build of {len(instrumented_files)} files took {timings['instrumented build']:.2f}s")
+
+        # 3. Training run
+        started = time.perf_counter()
+        completed = subprocess.run(training_command, shell=True, cwd=project_dir)
+        timings['training'] = time.perf_counter() - started
+        if (completed.returncode != 0):
+            raise ValueError(f"[{cy_pgo.__name__}] - training command failed with exit code {completed.returncode}: {training_command}")
+        if (not os.path.isdir(profile_data_dir) or len(os.listdir(profile_data_dir)) == 0):
+            raise ValueError(f"[{cy_pgo.__name__}] - training command did not produce profile data; does it import the compiled modules?")
+
+        # 4. Optimized build from the same C files and object paths so gcc finds and trusts the profile data
+        started = time.perf_counter()
+        try:
+            optimized_files = cy_build(target_files=instrumented_files, profile=use_profile, **build_kwargs)
+        except CythonBuildError as e:
+            optimized_files = e.built_files
+            raise
+        cy_clean(target_files=optimized_files, keep_c_files=keep_c_files)
+        timings['optimized build'] = time.perf_counter() - started
+    finally:
+        _remove_instrumented(pyx_fullpaths=[n for n in instrumented_files if (n not in optimized_files)], keep_c_files=keep_c_files)
+        FilesAndFolders.remove_folder(folderpath=pgo_dir)
+    return timings
+def _remove_instrumented(pyx_fullpaths:[str], keep_c_files:bool) -> None:
+    """ Removes the extensions a failed cy_pgo left installed with -fprofile-generate; the next build replaces them """
+    from .build_manifest import ArtifactManifest, abi_tag
+
+    if (len(pyx_fullpaths) == 0):
+        return
+    cy_clean(target_files=pyx_fullpaths, keep_c_files=keep_c_files)
+    manifest = ArtifactManifest(manifest_path=os.path.join(project_dir, appsettings.cython_artifact_manifest_path), project_dir=project_dir)
+    removed = []
+    for n in pyx_fullpaths:
+        removed += manifest.remove(pyx_fullpath=n, kinds=[f"extension {abi_tag()}", f"bundle {abi_tag()}"])
+    manifest.save()
+    logger.warning(msg=f"[{cy_pgo.__name__}] - removed {len(removed)} instrumented extensions; build again to restore them")
+def cy_deps(target_files:[str] = None) -> 'DependencyGraph':
+    """ Builds the cimport/include dependency graph of the target pyx files and every project file they depend on """
+    from .dependencies import DependencyGraph
 
     # 1. Get target files
     if (target_files == None):
         target_files = cy_list()
 
+    graph = DependencyGraph(project_dir=project_dir)
+    for pyx_fullpath in target_files:
+        if (not os.path.isfile(pyx_fullpath)):
+            logger.info(msg=f"File {pyx_fullpath} not found; skipping..")
+            continue
+        graph.add_file(filepath=pyx_fullpath)
+    logger.debug(msg=f"[{cy_deps.__name__}] - found {len(graph.dependencies)} files in the dependency graph of {len(target_files)} pyx files")
+    return graph
+def cy_clean(target_files:[str] = None, keep_c_files:bool=False, remove_artifacts:bool=False) -> [str]:
+    """ Removes the generated C files and moves the annotation html files to ext/annotations/<pkg.module>.html. Goes by
+        the files the builds recorded in ext/artifact_manifest.json instead of searching the project, and also removes
+        what was built for pyx files that no longer exist and files that were replaced since, like a bundle after
+        building without --bundle. [remove_artifacts] removes all recorded files of the targets: extensions, C, html and
+        pyi files. The build folder is kept so the next build can reuse it. Returns the removed files
+    """
+    from .build_manifest import ArtifactManifest
+    from .dependencies import dotted_module_name
+
+    logger.debug(msg=f"[{cy_clean.__name__}] - start cy_clean with {target_files}")
+
     # Make sure cybuilder is init because we need to move files to /ext/annotations
     cy_init()
+    manifest = ArtifactManifest(manifest_path=os.path.join(project_dir, appsettings.cython_artifact_manifest_path), project_dir=project_dir)
 
-    annotations_dir = os.path.join(project_dir, appsettings.cython_anno_dirname)
+    # 1. Get target files: all files something was built for
+    if (target_files == None):
+        target_files = manifest.targets()
 
-    # Remove build folder
-    build_folder_path = os.path.join(project_dir, 'build')
-    if (os.path.isdir(build_folder_path)):
-        shutil.rmtree(path=build_folder_path)
+    # 2. Extensions of deleted pyx files would still be imported
+    removed_files = []
+    for pyx_fullpath in manifest.orphans():
+        logger.info(msg=f"File {pyx_fullpath} no longer exists; removing what was built for it..")
+        removed_files += manifest.remove(pyx_fullpath=pyx_fullpath)
 
+    annotations_dir = os.path.join(project_dir, appsettings.cython_anno_dirname)
     for built_file in target_files:
         if (not os.path.isfile(built_file)):
             logger.info(msg=f"File {built_file} not found; skipping..")
             continue
-
-        _filename = os.path.splitext(os.path.basename(built_file))[0]    # no ext
+        if (remove_artifacts):
+            removed_files += manifest.remove(pyx_fullpath=built_file)
+            continue
 
         # Clean up C files
         if (not keep_c_files):
-            filepath = f"{os.path.splitext(built_file)[0]}.c"
-            if (not os.path.isfile(filepath)):
-                logger.debug(msg=f"[{cy_clean.__name__}]: cannot remove file: does not exist {filepath}")
-                continue
-
-            FilesAndFolders.remove_file(targetfilename=f"{os.path.splitext(built_file)[0]}.c")
+            removed_files += manifest.remove(pyx_fullpath=built_file, kinds=['c'])
 
         # Move annotation html files
-        src_htmlpath = pathlib.Path(f"{os.path.splitext(built_file)[0]}.html")
-        if (not src_htmlpath.exists()):
+        src_htmlpath = manifest.path_of(pyx_fullpath=built_file, kind='html')
+        if (src_htmlpath is None or not os.path.isfile(src_htmlpath) or os.path.dirname(src_htmlpath) == annotations_dir):
             continue
-        dst_htmlpath = os.path.join(annotations_dir, os.path.basename(src_htmlpath))
+        # Named after the module, since pkg_a/mod.pyx and pkg_b/mod.pyx both have a mod.html
+        dst_htmlpath = os.path.join(annotations_dir, f"{dotted_module_name(filepath=built_file)}.html")
         logger.debug(msg=f"[{cy_clean.__name__}] - Moving annotation files from {src_htmlpath} to {dst_htmlpath}")
         FilesAndFolders.move_file(
             srcfilename=src_htmlpath,
             dstfilename=dst_htmlpath,
             overwrite=True
         )
-        # Move PYD files
-        built_file_folder = os.path.dirname(built_file)
-        pyd_file = ([fn for fn in os.listdir(project_dir) if (_filename in fn and ('.pyd' in fn or '.so' in fn))])[0]
-        logger.debug(msg=f"[{cy_clean.__name__}] - Moving pyd files from {os.path.join(project_dir, pyd_file)} to {os.path.join(built_file_folder, pyd_file)}")
-        FilesAndFolders.move_file(
-            srcfilename=os.path.join(project_dir, pyd_file),
-            dstfilename=os.path.join(built_file_folder, pyd_file),
-            overwrite=True
-        )
-def cy_interface(target_files:[str] = None, encoding:str='UTF-8'):
-    """ Creates .pyi interface files from the provided target_files """
-
+        manifest.record(pyx_fullpath=built_file, kind='html', path=dst_htmlpath)
+
+    # 3. Files no build uses anymore
+    removed_files += manifest.remove_stale()
+    manifest.save()
+    logger.debug(msg=f"[{cy_clean.__name__}] - removed {len(removed_files)} files")
+    return removed_files
+
+
+def _generate_interface(pyx_fullpath:str, encoding:str) -> (bool, str, str):
+    """ Generates the pyi file of a single pyx file; runs in a worker process. Returns whether the pyi was written
+        (False when it already had this content), the hash of the pyi and the error message (None on success)
+    """
+    from . import pyigenerator
+    from .build_manifest import file_hash
+    pyi_fullpath = f"{os.path.splitext(pyx_fullpath)[0]}.pyi"
+    try:
+        with open(pyx_fullpath, mode='r', encoding=encoding) as open_pyx:
+            pyi_content = "".join(pyigenerator.pyx_to_pyi(open_pyx=open_pyx))
+        written = FilesAndFolders.write_if_changed(filepath=pyi_fullpath, content=pyi_content, encoding=encoding)
+        return written, file_hash(filepath=pyi_fullpath), None
+    except Exception as e:
+        return False, None, f"{type(e).__name__}: {e}"
+def cy_interface(target_files:[str] = None, encoding:str='UTF-8', jobs:int=None, force:bool=False) -> [str]:
+    """ Creates .pyi interface files from the provided target_files, in parallel over [jobs] worker processes
+        (default: cpu count). pyx files that did not change since their pyi was generated (see
+        ext/interface_manifest.json) are skipped unless [force], and a pyi is only rewritten when its content changes,
+        so its mtime stays the same for mypy, IDEs and build caches. Returns the pyi files that were written
+    """
+    from . import pyigenerator
+    from .build_manifest import ArtifactManifest, InterfaceManifest, file_hash
 
     # 1. Get target files
     if (target_files == None):
         target_files = cy_list()
+    jobs = os.cpu_count() if (jobs is None) else jobs
+    if (jobs < 1):
+        raise ValueError(f"[{cy_interface.__name__}] - jobs must be 1 or more, got {jobs}")
     logger.debug(msg=f"[{cy_interface.__name__}] - generating interface files for {len(target_files)} found pyx files")
 
-
+    # 2. Skip pyx files whose source, encoding and generator did not change
+    cy_init()
+    manifest = InterfaceManifest(manifest_path=os.path.join(project_dir, appsettings.cython_interface_manifest_path), project_dir=project_dir)
+    generator_hash = file_hash(filepath=pyigenerator.__file__)
+    fingerprints:{str: dict} = {}
     for pyx_fullpath in target_files:
         if (not os.path.isfile(pyx_fullpath)):
             logger.info(msg=f"File {pyx_fullpath} not found; skipping..")
             continue
+        fingerprints[pyx_fullpath] = {'source_hash': file_hash(filepath=pyx_fullpath), 'encoding': encoding, 'generator_hash': generator_hash}
+        if (not force and manifest.is_up_to_date(pyx_fullpath=pyx_fullpath, fingerprint=fingerprints[pyx_fullpath])):
+            logger.debug(msg=f"[{cy_interface.__name__}] - {pyx_fullpath} did not change; skipping..")
+            del fingerprints[pyx_fullpath]
+
+    # 3. Generate
+    results:{str: tuple} = {}
+    if (jobs == 1 or len(fingerprints) <= 1):
+        for pyx_fullpath in fingerprints:
+            logger.debug(msg=f"Creating .pyi for {pyx_fullpath}")
+            results[pyx_fullpath] = _generate_interface(pyx_fullpath=pyx_fullpath, encoding=encoding)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(jobs, len(fingerprints))) as pool:
+            futures = {n: pool.submit(_generate_interface, pyx_fullpath=n, encoding=encoding) for n in fingerprints}
+            results = {n: future.result() for n, future in futures.items()}
+
+    # 4. Remember the sources; report all failures at once
+    failures:{str: str} = {}
+    written_files = []
+    for pyx_fullpath, (written, pyi_hash, error) in results.items():
+        if (error is not None):
+            failures[pyx_fullpath] = error
+            manifest.forget(pyx_fullpath=pyx_fullpath)
+            continue
+        manifest.record(pyx_fullpath=pyx_fullpath, fingerprint=fingerprints[pyx_fullpath], pyi_hash=pyi_hash)
+        if (written):
+            written_files.append(f"{os.path.splitext(pyx_fullpath)[0]}.pyi")
+    manifest.save()
+    # for cy_clean, also the pyi files that were up to date
+    artifact_manifest = ArtifactManifest(manifest_path=os.path.join(project_dir, appsettings.cython_artifact_manifest_path), project_dir=project_dir)
+    for pyx_fullpath in target_files:
         pyi_fullpath = f"{os.path.splitext(pyx_fullpath)[0]}.pyi"
-        logger.debug(msg=f"Creating .pyi for {pyx_fullpath}")
-
-        with open(pyx_fullpath, mode='r', encoding=encoding) as open_pyx:
-            pyi_content:[str] = pyigenerator.pyx_to_pyi(open_pyx=open_pyx)
-
-        with open(pyi_fullpath, 'w') as pyi_out:
-            pyi_out.writelines(pyi_content)
+        if (pyx_fullpath not in failures and os.path.isfile(pyx_fullpath) and os.path.isfile(pyi_fullpath)):
+            artifact_manifest.record(pyx_fullpath=pyx_fullpath, kind='pyi', path=pyi_fullpath)
+    artifact_manifest.save()
+    logger.debug(msg=f"[{cy_interface.__name__}] - wrote {len(written_files)} of {len(target_files)} pyi files")
+    if (len(failures) > 0):
+        failed_files_string = ", ".join(f"{n}: {error}" for n, error in failures.items())
+        raise ValueError(f"[{cy_interface.__name__}] - cannot generate {len(failures)} pyi files: {failed_files_string}")
+    return written_files
+
+
+def cy_hotspots(target_files:[str] = None) -> 'HotspotReport':
+    """ Ranks the lines and functions of the target pyx files by how much they fall back to the Python C-API, using
+        the annotation html files their last build recorded in the artifact manifest. Files without annotations (built
+        with --no-annotation) are skipped
+    """
+    from .build_manifest import ArtifactManifest
+    from .hotspots import hotspot_report
+    if (target_files == None):
+        target_files = cy_list()
 
+    # The manifest knows where the annotation of every pyx file is, moved to ext/annotations by cy_clean or not
+    manifest = ArtifactManifest(manifest_path=os.path.join(project_dir, appsettings.cython_artifact_manifest_path), project_dir=project_dir)
+    annotations:{str: str} = {}
+    for n in target_files:
+        html_path = manifest.path_of(pyx_fullpath=n, kind='html')
+        if (html_path is None or not os.path.isfile(html_path)):
+            logger.debug(msg=f"[{cy_hotspots.__name__}] - no annotations for {n}; skipping..")
+            continue
+        annotations[html_path] = os.path.relpath(n, project_dir).replace(os.sep, '/')
+    return hotspot_report(annotations=annotations)
+
+
+def cy_profile(script:str, script_args:[str] = None, target_files:[str] = None, mode:str='function', include_numpy:bool=False, jobs:int=None, profile:str=None,
+               output_path:str=None) -> 'ProfileReport':
+    """ Builds the target pyx files instrumented (see cy_build) and runs [script] with [script_args] against those
+        extensions, in a child process from the project folder. [mode] 'function' profiles with cProfile and reports
+        every cdef/cpdef/def function of the pyx files, 'line' traces and times every executed line of them.
+        The raw report is saved as JSON to [output_path], default ext/profile/profile-<time>.json
+    """
+    from .build_manifest import abi_tag
+    from .definitions import PACKAGE_ROOT
+    from .profiler import FunctionProfile, ProfileReport
+
+    if (mode not in ('function', 'line')):
+        raise ValueError(f"[{cy_profile.__name__}] - profile by 'function' or 'line', not '{mode}'")
+    if (not os.path.isfile(script)):
+        raise ValueError(f"[{cy_profile.__name__}] - script not found: {script}")
+    if (target_files == None):
+        target_files = cy_list()
 
+    # 1. Instrumented build, next to the regular one
+    built_files = cy_build(target_files=target_files, create_annotations=False, include_numpy=include_numpy, jobs=jobs, profile=profile, instrument=True)
+    cy_clean(target_files=built_files)
 
+    # 2. Run the workload; cythonbuilder itself must be importable in the child process
+    cy_init()
+    FilesAndFolders.create_folder(folderpath=os.path.join(project_dir, appsettings.cython_profile_dirname))
+    if (output_path is None):
+        output_path = os.path.join(project_dir, appsettings.cython_profile_dirname, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.dirname(PACKAGE_ROOT)] + [p for p in [os.environ.get('PYTHONPATH')] if (p)]))
+    command = [sys.executable, '-m', f"{appsettings.package_name}.profiler", '--install-dir', os.path.join(project_dir, appsettings.cython_instrumented_dirname, abi_tag()),
+               '--output', output_path, '--mode', mode, os.path.abspath(script)] + list(script_args or [])
+    logger.debug(msg=f"[{cy_profile.__name__}] - running {' '.join(command)}")
+    completed = subprocess.run(command, cwd=project_dir, env=env)
+    if (not os.path.isfile(output_path)):
+        raise ValueError(f"[{cy_profile.__name__}] - profiling {script} failed with exit code {completed.returncode}")
+
+    # 3. Report the Cython code by project relative path, with the source of every line
+    with open(output_path, 'r') as f:
+        report = ProfileReport.from_dict(content=json.load(f))
+    sources:{str: [str]} = {}
+    for item in report.functions + report.lines:
+        fullpath = os.path.join(project_dir, item.file)
+        item.file = os.path.relpath(fullpath, project_dir).replace(os.sep, '/')
+        if (isinstance(item, FunctionProfile) or not os.path.isfile(fullpath)):
+            continue
+        if (fullpath not in sources):
+            with open(fullpath, 'r', encoding='UTF-8', errors='replace') as f:
+                sources[fullpath] = f.read().splitlines()
+        item.code = sources[fullpath][item.line - 1].strip() if (0 < item.line <= len(sources[fullpath])) else ''
+    report.output_path = output_path
+    return report
+
+
+def cy_bench(target_files:[str] = None, warmup:int=None, repeats:int=None, min_time:float=None, baseline_path:str=None, output_path:str=None) -> dict:
+    """ Runs the benchmarks of the target pyx files (bench_<module>.py next to the pyx file or [tool.cythonbuilder.bench]
+        files) against the compiled extension and the pyx file imported as plain Python. Every bench_* function in a
+        benchmark file is called with the module under test. [baseline_path] is an earlier report to compare the
+        compiled timings with. The report is saved as JSON to [output_path], default ext/bench/bench-<time>.json
+    """
+    from .benchmark import compare_to_baseline, discover_benchmarks, run_benchmarks
+    from .config import load_config
+    if (target_files == None):
+        target_files = cy_list()
+    config = load_config(project_dir=project_dir)
+    bench_config = config.get('bench', {})
+    warmup = bench_config.get('warmup', 1) if (warmup is None) else warmup
+    repeats = bench_config.get('repeats', 7) if (repeats is None) else repeats
+    min_time = bench_config.get('min_time', 0.05) if (min_time is None) else min_time
+    if (repeats < 1):
+        raise ValueError(f"[{cy_bench.__name__}] - repeats must be 1 or more, got {repeats}")
+
+    results = []
+    for n in target_files:
+        bench_files = discover_benchmarks(pyx_fullpath=n, project_dir=project_dir, config=config)
+        if (len(bench_files) == 0):
+            logger.debug(msg=f"[{cy_bench.__name__}] - no benchmarks for {n}; skipping..")
+            continue
+        results += run_benchmarks(pyx_fullpath=n, bench_files=bench_files, project_dir=project_dir, warmup=warmup, repeats=repeats, min_time=min_time)
+    if (baseline_path is not None):
+        with open(baseline_path, 'r') as f:
+            compare_to_baseline(results=results, baseline=json.load(f))
+
+    import Cython
+    from dataclasses import asdict
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'cython': Cython.__version__,
+        'settings': {'warmup': warmup, 'repeats': repeats, 'min_time': min_time},
+        'baseline': baseline_path,
+        'benchmarks': [asdict(r) for r in results],
+    }
+    if (output_path is None):
+        cy_init()
+        FilesAndFolders.create_folder(folderpath=os.path.join(project_dir, appsettings.cython_bench_dirname))
+        output_path = os.path.join(project_dir, appsettings.cython_bench_dirname, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    report['output_path'] = output_path
+    return report
+
+
+@dataclass
+class WatchRebuild:
+    """ Outcome of a single rebuild in cy_watch """
+    changed_files: [str]
+    built_files: [str]
+    failures: {str: str} = field(default_factory=dict)
+    duration: float = 0.0   # seconds from detecting the change to the rebuilt extensions and pyi files
+    cache_stats: 'CacheStats' = None
+def cy_watch(target_files:[str] = None, create_annotations:bool=True, include_numpy:bool=False, generate_pyi:bool=True,
+             keep_c_files:bool=False, encoding:str='UTF-8', jobs:int=None, profile:str=None, directives=None, compiler_cache:str=None, exclude:[str]=None,
+             use_polling:bool=False, poll_interval:float=0.5, debounce:float=0.3):
+    """ Builds every out-of-date pyx file, then keeps watching the project and rebuilds the extensions (and pyi files)
+        affected by every change to a .pyx, .pxd, .pxi or header file. Bursts of saves within [debounce] seconds are
+        combined. Uses inotify on Linux and polls every [poll_interval] seconds elsewhere or when [use_polling].
+        Generator: yields a WatchRebuild after every rebuild. Runs until the caller stops iterating.
+    """
+    from .builder import Builder
+    from .compiler_cache import CacheStats
+    from .watcher import create_watcher, wait_for_changes
+    extensions = ('.pyx', '.pxd', '.pxi')
+
+    # The index and dependency graph are kept in memory for the whole session
+    cy_init()
+    index = DiscoveryIndex(
+        index_path=os.path.join(project_dir, appsettings.cython_discovery_index_path),
+        project_dir=project_dir,
+        extensions=extensions,
+        exclude=exclude,
+    )
+    index.load()
+    project_files = index.walk()
+    targets = _filter_by_name(pyx_fullpaths=[f for f in project_files if (f.endswith('.pyx'))], target_files=[] if (target_files is None) else target_files)
+    graph = cy_deps(target_files=targets)
+    # So are the worker processes, which would otherwise import setuptools and Cython again for every save
+    builder = Builder(project_dir=project_dir, jobs=jobs)
+
+    def rebuild(pyx_files:[str], changed_files:[str], started:float) -> WatchRebuild:
+        failures = {}
+        cache_stats = CacheStats()
+        try:
+            built_files = cy_build(target_files=pyx_files, create_annotations=create_annotations, include_numpy=include_numpy, jobs=jobs, profile=profile, directives=directives,
+                                   compiler_cache=compiler_cache, cache_stats=cache_stats, builder=builder)
+        except CythonBuildError as e:
+            built_files = e.built_files
+            failures = e.failures
+        cy_clean(target_files=built_files, keep_c_files=keep_c_files)
+        if (generate_pyi):
+            cy_interface(target_files=built_files, encoding=encoding, jobs=jobs)
+        return WatchRebuild(changed_files=changed_files, built_files=built_files, failures=failures, duration=time.perf_counter() - started, cache_stats=cache_stats)
+
+    # 1. Watch from before the initial build, so files saved while it runs get rebuilt as well
+    watcher = create_watcher(
+        folders=[os.path.join(project_dir, relpath) for relpath in index.folders],
+        list_files=lambda: index.walk() + [f for f in graph.dependencies if (not f.endswith(extensions))],
+        extensions=extensions + ('.h',),
+        exclude=index.exclude,
+        use_polling=use_polling,
+        poll_interval=poll_interval,
+    )
+    logger.debug(msg=f"[{cy_watch.__name__}] - watching {len(index.folders)} folders with {type(watcher).__name__}")
+    try:
+        # 2. Initial build of everything that is out of date
+        yield rebuild(pyx_files=targets, changed_files=[], started=time.perf_counter())
+
+        while (True):
+            changed = wait_for_changes(watcher=watcher, debounce=debounce)
+            if (changed is not None and len(changed) == 0):
+                continue
+            started = time.perf_counter()
+
+            # 3. Update index and graph; None means the watcher lost events, so everything is checked
+            project_files = index.walk()
+            targets = _filter_by_name(pyx_fullpaths=[f for f in project_files if (f.endswith('.pyx'))], target_files=[] if (target_files is None) else target_files)
+            if (changed is None):
+                changed = set(project_files)
+            graph.refresh(filepaths=sorted(changed))
+            for pyx_fullpath in targets:
+                if (pyx_fullpath not in graph.dependencies):
+                    graph.add_file(filepath=pyx_fullpath)
+
+            # 4. Rebuild the affected targets
+            affected = [f for f in graph.rebuild_set(changed_files=sorted(changed)) if (f in targets)]
+            logger.debug(msg=f"[{cy_watch.__name__}] - {len(changed)} changed files affect {len(affected)} pyx files")
+            if (len(affected) == 0):
+                continue
+            yield rebuild(pyx_files=affected, changed_files=sorted(changed), started=started)
+    finally:
+        watcher.close()
+        builder.close()
@@ -1,13 +1,11 @@
 import os
-import sys
+import typing
 from dataclasses import dataclass
 
 import typer
 
-from . import appsettings
-
 ROOT_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
-PACKAGE_ROOT = sys.modules[appsettings.package_name].__path__[0]
+PACKAGE_ROOT = os.path.dirname(os.path.realpath(__file__))
 
 @dataclass
 class DefaultArgs:
@@ -15,3 +13,6 @@ class DefaultArgs:
     force:bool =     typer.Option(False, "--force", '-f', help="Force this operation")#, prompt=f"{helpy_mascotte} Are you sure you want to delete the user?", )
     overwrite:bool = typer.Option(False, "--overwrite", '-o', help="Overwrite existing")
     accept:bool =    typer.Option(False, "--accept", '-y', help="Yes to all prompts")
+    exclude:typing.List[str] = typer.Option(None, "--exclude", help="Skip folders matching these names/patterns when searching .pyx files (replaces the defaults)")
+    use_git:bool =   typer.Option(False, "--git", help="Find .pyx files with git ls-files when the project is a git repository")
+    rescan:bool =    typer.Option(False, "--rescan", help="Ignore the cached directory index and search the whole project")
@@ -0,0 +1,219 @@
+import os
+import re
+
+from .build_manifest import file_hash
+from .logs import logger
+
+_RE_CIMPORT = re.compile(r'^\s*cimport\s+(.+)$')
+_RE_FROM_CIMPORT = re.compile(r'^\s*from\s+(\.*)([\w.]*)\s+cimport\s+(.+)$')
+_RE_INCLUDE = re.compile(r'''^\s*include\s+["'](.+?)["']''')
+_RE_EXTERN_FROM = re.compile(r'''^\s*cdef\s+extern\s+from\s+["'](.+?)["']''')
+
+
+def parse_dependency_statements(lines:[str]) -> [tuple]:
+    """ Finds all cimport, from-cimport, include and 'cdef extern from' statements in the lines of a Cython file.
+        Returns a list of (kind, value) where kind is one of:
+            'cimport'   value = dotted module name                              cimport a.b as c
+            'from'      value = (leading dots, dotted module name, [names])     from .a cimport x, y
+            'include'   value = file path                                       include "a.pxi"
+            'extern'    value = header path                                     cdef extern from "a.h":
+    """
+    statements = []
+    for line in lines:
+        match = _RE_INCLUDE.match(line) or _RE_EXTERN_FROM.match(line)
+        if (match):
+            kind = 'include' if (match.re is _RE_INCLUDE) else 'extern'
+            statements.append((kind, match.group(1)))
+            continue
+
+        line = line.split("#")[0].rstrip()
+        match = _RE_CIMPORT.match(line)
+        if (match):
+            for module in match.group(1).split(","):
+                module = module.split()[0] if (len(module.split()) > 0) else ''
+                if (len(module) > 0):
+                    statements.append(('cimport', module))
+            continue
+        match = _RE_FROM_CIMPORT.match(line)
+        if (match):
+            names = [name.split()[0] for name in match.group(3).strip("()\\ ").split(",") if (len(name.split()) > 0)]
+            statements.append(('from', (match.group(1), match.group(2), names)))
+    return statements
+
+
+def package_root(folderpath:str) -> str:
+    """ The folder above the top-most package (folder with an __init__ file) that contains [folderpath] """
+    root = folderpath
+    while any(os.path.isfile(os.path.join(root, f"__init__{ext}")) for ext in ('.py', '.pyx', '.pxd')):
+        parent = os.path.dirname(root)
+        if (parent == root):
+            break
+        root = parent
+    return root
+
+
+def top_package(folderpath:str) -> str:
+    """ The top-most package folder that contains [folderpath]; None when [folderpath] is not part of a package """
+    root = package_root(folderpath=folderpath)
+    if (os.path.samefile(root, folderpath)):
+        return None
+    return os.path.join(root, os.path.relpath(folderpath, root).split(os.sep)[0])
+
+
+def dotted_module_name(filepath:str) -> str:
+    """ Dotted name of the module a Cython file defines, from the package layout: pkg/sub/mod.pyx is pkg.sub.mod when
+        pkg and pkg/sub are packages, and just mod outside a package
+    """
+    fullpath = os.path.abspath(filepath)
+    root = package_root(folderpath=os.path.dirname(fullpath))
+    return os.path.relpath(os.path.splitext(fullpath)[0], root).replace(os.sep, '.')
+
+
+class DependencyGraph:
+    """ Which project files (.pyx, .pxd, .pxi, headers) each Cython file depends on through cimport, include and
+        'cdef extern from' statements. Files outside the project (libc, numpy, ..) are not part of the graph.
+    """
+
+    def __init__(self, project_dir:str, encoding:str='UTF-8'):
+        self.project_dir = project_dir
+        self.encoding = encoding
+        self.dependencies:{str: set} = {}  # fullpath -> fullpaths it depends on directly
+        self._hashes:{str: str} = {}
+
+    # Building
+    def add_file(self, filepath:str) -> None:
+        """ Adds a file and, recursively, every project file it depends on """
+        pending = [os.path.abspath(filepath)]
+        while (len(pending) > 0):
+            current = pending.pop()
+            if (current in self.dependencies):
+                continue
+            self.dependencies[current] = self._direct_dependencies(filepath=current)
+            pending.extend(self.dependencies[current])
+
+    def refresh(self, filepaths:[str]) -> None:
+        """ Parses changed files again. Deleted files are removed from the graph """
+        for filepath in filepaths:
+            filepath = os.path.abspath(filepath)
+            self.dependencies.pop(filepath, None)
+            self._hashes.pop(filepath, None)
+            if (os.path.isfile(filepath)):
+                self.add_file(filepath=filepath)
+
+    def _direct_dependencies(self, filepath:str) -> set:
+        deps = set()
+        folder = os.path.dirname(filepath)
+        name, extension = os.path.splitext(filepath)
+
+        # A pyx file implicitly cimports its own pxd
+        if (extension == '.pyx' and os.path.isfile(f"{name}.pxd")):
+            deps.add(f"{name}.pxd")
+        if (extension not in ('.pyx', '.pxd', '.pxi')):
+            return deps
+
+        try:
+            with open(filepath, 'r', encoding=self.encoding) as f:
+                statements = parse_dependency_statements(lines=f)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.debug(msg=f"[{DependencyGraph._direct_dependencies.__name__}] - cannot read {filepath}: {e}")
+            return deps
+
+        search_dirs = [folder, package_root(folderpath=folder), self.project_dir]
+        for kind, value in statements:
+            if (kind in ('include', 'extern')):
+                found = self._find_file(relpath=value, search_dirs=[folder, self.project_dir])
+                if (found is not None):
+                    deps.add(found)
+            elif (kind == 'cimport'):
+                found = self._find_module(module=value, search_dirs=search_dirs)
+                if (found is not None):
+                    deps.add(found)
+            elif (kind == 'from'):
+                dots, module, names = value
+                if (len(dots) > 0):
+                    base = folder
+                    for _ in range(len(dots) - 1):
+                        base = os.path.dirname(base)
+                    module_dirs = [base]
+                else:
+                    module_dirs = search_dirs
+                # from a cimport b: 'a' is a module, 'b' is either a name in it or a submodule
+                modules = [module] if (len(module) > 0) else []
+                modules += [f"{module}.{n}" if (len(module) > 0) else n for n in names]
+                for mod in modules:
+                    found = self._find_module(module=mod, search_dirs=module_dirs)
+                    if (found is not None):
+                        deps.add(found)
+        deps.discard(filepath)
+        return deps
+
+    def _find_file(self, relpath:str, search_dirs:[str]) -> str:
+        for folder in search_dirs:
+            candidate = os.path.abspath(os.path.join(folder, relpath))
+            if (os.path.isfile(candidate) and self._in_project(filepath=candidate)):
+                return candidate
+        return None
+
+    def _find_module(self, module:str, search_dirs:[str]) -> str:
+        module_path = os.path.join(*module.split("."))
+        for folder in search_dirs:
+            for candidate in (f"{module_path}.pxd", os.path.join(module_path, '__init__.pxd')):
+                found = self._find_file(relpath=candidate, search_dirs=[folder])
+                if (found is not None):
+                    return found
+        return None
+
+    def _in_project(self, filepath:str) -> bool:
+        project_dir = os.path.abspath(self.project_dir)
+        try:
+            return os.path.commonpath([project_dir, filepath]) == project_dir
+        except ValueError:
+            # Different drives on Windows
+            return False
+
+    # Querying
+    def transitive_dependencies(self, filepath:str) -> [str]:
+        """ All files [filepath] depends on, directly or through other files """
+        filepath = os.path.abspath(filepath)
+        seen = set()
+        pending = list(self.dependencies.get(filepath, []))
+        while (len(pending) > 0):
+            current = pending.pop()
+            if (current in seen):
+                continue
+            seen.add(current)
+            pending.extend(self.dependencies.get(current, []))
+        seen.discard(filepath)
+        return sorted(seen)
+
+    def dependents(self) -> {str: set}:
+        """ Reversed graph: fullpath -> fullpaths that depend on it directly """
+        reverse:{str: set} = {f: set() for f in self.dependencies}
+        for f, deps in self.dependencies.items():
+            for dep in deps:
+                reverse.setdefault(dep, set()).add(f)
+        return reverse
+
+    def rebuild_set(self, changed_files:[str]) -> [str]:
+        """ The pyx files that must be rebuilt when [changed_files] change: the changed pyx files themselves and every
+            pyx file that depends on a changed file, transitively
+        """
+        reverse = self.dependents()
+        affected = set()
+        pending = [os.path.abspath(f) for f in changed_files]
+        while (len(pending) > 0):
+            current = pending.pop()
+            if (current in affected):
+                continue
+            affected.add(current)
+            pending.extend(reverse.get(current, []))
+        return sorted(f for f in affected if (f.endswith('.pyx')))
+
+    def dependency_hashes(self, filepath:str) -> {str: str}:
+        """ {project relative path: content hash} of all transitive dependencies of [filepath] """
+        hashes = {}
+        for dep in self.transitive_dependencies(filepath=filepath):
+            if (dep not in self._hashes):
+                self._hashes[dep] = file_hash(filepath=dep)
+            hashes[os.path.relpath(dep, self.project_dir).replace(os.sep, '/')] = self._hashes[dep]
+        return hashes
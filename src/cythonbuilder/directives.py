@@ -0,0 +1,59 @@
+import fnmatch
+import os
+
+from . import appsettings
+
+
+def _validate(directives:dict, source:str) -> dict:
+    """ Raises ValueError for directive names Cython does not know """
+    from Cython.Compiler import Options
+
+    known_directives = Options.get_directive_defaults()
+    unknown = sorted(name for name in directives if (name not in known_directives))
+    if (len(unknown) > 0):
+        raise ValueError(f"[{_validate.__name__}] - unknown compiler directive(s) {', '.join(unknown)} in {source}")
+    return dict(directives)
+
+
+def expand_directives(value, source:str) -> dict:
+    """ Turns a directive setting into a dict. The setting is a preset name (see appsettings.directive_presets), a
+        dict of directives or a comma separated string mixing both: "fast,language_level=3". Later entries win
+    """
+    if (value is None):
+        return {}
+    if (isinstance(value, dict)):
+        return _validate(directives=value, source=source)
+
+    from Cython.Compiler import Options
+
+    directives = {}
+    for part in [p.strip() for p in str(value).split(",") if (len(p.strip()) > 0)]:
+        if ('=' not in part):
+            if (part not in appsettings.directive_presets):
+                raise ValueError(f"[{expand_directives.__name__}] - unknown directive preset '{part}' in {source}; choose from {', '.join(sorted(appsettings.directive_presets))}")
+            directives.update(appsettings.directive_presets[part])
+            continue
+        try:
+            directives.update(Options.parse_directive_list(part, relaxed_bool=True))
+        except ValueError as e:
+            raise ValueError(f"[{expand_directives.__name__}] - invalid compiler directive '{part}' in {source}: {e}")
+    return directives
+
+
+def resolve_directives(pyx_fullpath:str, project_dir:str, config:dict=None, profile_directives=None, cli_directives=None) -> dict:
+    """ The Cython compiler directives for a single pyx file. Applied in order, later ones win:
+            1. 'directives' in [tool.cythonbuilder]
+            2. 'directives' of the build profile
+            3. --directives on the command line
+            4. every glob in [tool.cythonbuilder.file_directives] that matches the file path relative to the project
+    """
+    config = {} if (config is None) else config
+    directives = expand_directives(value=config.get('directives'), source='[tool.cythonbuilder] directives')
+    directives.update(expand_directives(value=profile_directives, source='build profile'))
+    directives.update(expand_directives(value=cli_directives, source='--directives'))
+
+    relpath = os.path.relpath(pyx_fullpath, project_dir).replace(os.sep, '/')
+    for pattern, file_directives in config.get('file_directives', {}).items():
+        if (fnmatch.fnmatch(relpath, pattern)):
+            directives.update(expand_directives(value=file_directives, source=f"[tool.cythonbuilder.file_directives] '{pattern}'"))
+    return directives
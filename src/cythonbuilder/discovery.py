@@ -0,0 +1,310 @@
+import fnmatch
+import json
+import os
+import re
+import subprocess
+import time
+
+from . import appsettings
+from .logs import logger
+
+
+def _glob_to_regex(pattern:str) -> str:
+    """ Translates a gitignore glob into a regex that matches a '/'-separated relative path """
+    regex = ''
+    i = 0
+    while (i < len(pattern)):
+        if (pattern.startswith('**/', i)):
+            regex += '(?:.*/)?'
+            i += 3
+        elif (pattern.startswith('/**', i) and i + 3 == len(pattern)):
+            regex += '/.*'
+            i += 3
+        elif (pattern[i] == '*'):
+            regex += '[^/]*'
+            i += 1
+        elif (pattern[i] == '?'):
+            regex += '[^/]'
+            i += 1
+        elif (pattern[i] == '['):
+            end = pattern.find(']', i + 1)
+            if (end == -1):
+                regex += re.escape(pattern[i])
+                i += 1
+            else:
+                regex += pattern[i:end + 1].replace('[!', '[^')
+                i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+class GitIgnore:
+    """ Patterns of a single .gitignore file. Supports negation (!), directory-only patterns (trailing /),
+        anchored patterns (containing /) and ** wildcards.
+    """
+
+    def __init__(self, base_dir:str, lines:[str]):
+        self.base_dir = base_dir
+        self.rules:[tuple] = []  # (regex, negate, dir_only)
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if (len(line) == 0 or line.startswith('#')):
+                continue
+            negate = line.startswith('!')
+            if (negate):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if ('/' in line):
+                regex = _glob_to_regex(pattern=line.lstrip('/'))
+            else:
+                regex = f"(?:.*/)?{_glob_to_regex(pattern=line)}"
+            self.rules.append((re.compile(f"^{regex}$"), negate, dir_only))
+
+    @staticmethod
+    def from_file(filepath:str):
+        try:
+            with open(filepath, 'r', encoding='UTF-8', errors='replace') as f:
+                return GitIgnore(base_dir=os.path.dirname(filepath), lines=f.readlines())
+        except OSError as e:
+            logger.debug(msg=f"[{GitIgnore.from_file.__name__}] - cannot read {filepath}: {e}")
+            return None
+
+    def match(self, fullpath:str, is_dir:bool) -> bool:
+        """ None if no pattern applies, else True when ignored and False when explicitly un-ignored (!) """
+        # Paths come from scandir below base_dir, so slicing is a lot cheaper than os.path.relpath
+        relpath = fullpath[len(self.base_dir) + 1:].replace(os.sep, '/')
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if (dir_only and not is_dir):
+                continue
+            if (regex.match(relpath)):
+                result = not negate
+        return result
+
+
+def _is_ignored(fullpath:str, is_dir:bool, gitignores:[GitIgnore]) -> bool:
+    """ Deeper .gitignore files take precedence over the ones above them """
+    for gitignore in reversed(gitignores):
+        result = gitignore.match(fullpath=fullpath, is_dir=is_dir)
+        if (result is not None):
+            return result
+    return False
+
+
+def _exclude_regex(exclude:[str]):
+    exclude = appsettings.default_excluded_dirnames if (exclude is None) else exclude
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in exclude)) if (len(exclude) > 0) else None
+
+
+def _scan_folder(folder:str, gitignores:[GitIgnore], is_root:bool, extensions:tuple, exclude_regex, use_gitignore:bool) -> tuple:
+    """ Lists a single folder. Returns (matching file names, subfolder names to descend into, gitignores that apply to
+        the subfolders) or None if the folder is a virtual environment or cannot be read
+    """
+    try:
+        with os.scandir(folder) as it:
+            entries = list(it)
+    except OSError as e:
+        logger.debug(msg=f"[{_scan_folder.__name__}] - cannot read folder {folder}: {e}")
+        return None
+
+    names = {entry.name for entry in entries}
+    if ('pyvenv.cfg' in names and not is_root):
+        return None
+    if (use_gitignore and '.gitignore' in names):
+        gitignore = GitIgnore.from_file(filepath=os.path.join(folder, '.gitignore'))
+        if (gitignore is not None):
+            gitignores = gitignores + [gitignore]
+
+    files = []
+    folders = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if (is_dir):
+            if (exclude_regex is not None and exclude_regex.match(entry.name)):
+                continue
+            if (len(gitignores) > 0 and _is_ignored(fullpath=entry.path, is_dir=True, gitignores=gitignores)):
+                continue
+            folders.append(entry.name)
+        elif (entry.name.endswith(extensions)):
+            if (len(gitignores) > 0 and _is_ignored(fullpath=entry.path, is_dir=False, gitignores=gitignores)):
+                continue
+            files.append(entry.name)
+    return files, folders, gitignores
+
+
+def walk_project(project_dir:str, extensions:tuple=('.pyx',), exclude:[str]=None, use_gitignore:bool=True) -> [str]:
+    """ Finds all files with the given extensions in a single os.scandir pass over the project. Does not descend into
+        virtual environments (folders containing pyvenv.cfg), folders whose name matches a pattern in [exclude]
+        (default: appsettings.default_excluded_dirnames) or, when [use_gitignore], paths ignored by a .gitignore.
+    """
+    exclude_regex = _exclude_regex(exclude=exclude)
+    root = os.path.abspath(project_dir)
+    found_files = []
+
+    pending:[tuple] = [(root, [])]
+    while (len(pending) > 0):
+        folder, gitignores = pending.pop()
+        scanned = _scan_folder(folder=folder, gitignores=gitignores, is_root=folder == root, extensions=extensions, exclude_regex=exclude_regex, use_gitignore=use_gitignore)
+        if (scanned is None):
+            continue
+        files, folders, gitignores = scanned
+        found_files += [os.path.join(folder, name) for name in files]
+        pending += [(os.path.join(folder, name), gitignores) for name in folders]
+    return sorted(found_files)
+
+
+class DiscoveryIndex:
+    """ On-disk cache of walk_project. Stores per folder its mtime, the matching files and the subfolders to descend
+        into. A later walk only stats each folder and rescans the ones whose mtime (or .gitignore) changed, so
+        discovery on an unchanged tree costs one stat per folder instead of listing every file.
+    """
+    INDEX_VERSION = 1
+
+    def __init__(self, index_path:str, project_dir:str, extensions:tuple, exclude:[str]=None, use_gitignore:bool=True):
+        self.index_path = index_path
+        self.project_dir = os.path.abspath(project_dir)
+        self.extensions = tuple(extensions)
+        self.exclude = appsettings.default_excluded_dirnames if (exclude is None) else exclude
+        self.use_gitignore = use_gitignore
+        self.folders:{str: dict} = {}   # relpath ('' for root) -> {mtime_ns, gitignore_mtime_ns, files, folders}
+        self.rescanned_count = 0
+
+    @property
+    def _settings(self) -> dict:
+        return {'extensions': list(self.extensions), 'exclude': list(self.exclude), 'use_gitignore': self.use_gitignore}
+
+    def load(self) -> None:
+        if (not os.path.isfile(self.index_path)):
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                content = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug(msg=f"[{DiscoveryIndex.load.__name__}] - ignoring unreadable index {self.index_path}: {e}")
+            return
+        if (content.get('version') != self.INDEX_VERSION or content.get('settings') != self._settings):
+            logger.debug(msg=f"[{DiscoveryIndex.load.__name__}] - index was made with other settings; rescanning")
+            return
+        self.folders = content.get('folders', {})
+
+    def save(self) -> None:
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.INDEX_VERSION, 'settings': self._settings, 'folders': self.folders}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def walk(self, rescan:bool=False) -> [str]:
+        """ Same result as walk_project. [rescan] ignores the cached folders and walks everything """
+        exclude_regex = _exclude_regex(exclude=self.exclude)
+        old_folders = {} if (rescan) else self.folders
+        new_folders:{str: dict} = {}
+        self.rescanned_count = 0
+        # Folders changed in the last seconds may change again within the same mtime tick; never trust them next time
+        racy_mtime_ns = time.time_ns() - 2 * 10**9
+        found_files = []
+
+        # (relpath, gitignore paths that apply, force rescan of this subtree)
+        pending:[tuple] = [('', [], False)]
+        parsed_gitignores:{str: GitIgnore} = {}
+        while (len(pending) > 0):
+            relpath, gitignore_paths, force = pending.pop()
+            folder = os.path.join(self.project_dir, relpath) if (relpath != '') else self.project_dir
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            gitignore_path = os.path.join(folder, '.gitignore')
+            try:
+                gitignore_mtime_ns = os.stat(gitignore_path).st_mtime_ns if (self.use_gitignore) else None
+            except OSError:
+                gitignore_mtime_ns = None
+
+            cached = old_folders.get(relpath)
+            gitignore_changed = cached is not None and cached['gitignore_mtime_ns'] != gitignore_mtime_ns
+            if (not force and cached is not None and cached['mtime_ns'] == mtime_ns and not gitignore_changed):
+                entry = cached
+            else:
+                # Changed .gitignore rules apply to the whole subtree
+                force = force or gitignore_changed
+                gitignores = [parsed_gitignores.setdefault(p, GitIgnore.from_file(filepath=p)) for p in gitignore_paths]
+                scanned = _scan_folder(folder=folder, gitignores=[g for g in gitignores if (g is not None)], is_root=relpath == '',
+                                       extensions=self.extensions, exclude_regex=exclude_regex, use_gitignore=self.use_gitignore)
+                self.rescanned_count += 1
+                # Virtual environments are remembered as empty folders so they are not listed again
+                files, folders, _ = ([], [], None) if (scanned is None) else scanned
+                entry = {
+                    'mtime_ns': mtime_ns if (mtime_ns < racy_mtime_ns) else None,
+                    'gitignore_mtime_ns': gitignore_mtime_ns,
+                    'files': files,
+                    'folders': folders,
+                }
+            new_folders[relpath] = entry
+
+            if (gitignore_mtime_ns is not None):
+                gitignore_paths = gitignore_paths + [gitignore_path]
+            found_files += [os.path.join(folder, name) for name in entry['files']]
+            pending += [(f"{relpath}/{name}" if (relpath != '') else name, gitignore_paths, force) for name in entry['folders']]
+
+        self.folders = new_folders
+        return sorted(found_files)
+
+
+def discover_project(project_dir:str, exclude:[str]=None, rescan:bool=False) -> [str]:
+    """ All .pyx, .pxd and .pxi files of the project, through the DiscoveryIndex in projdir/ext so only folders that
+        changed since the last call are listed again. [rescan] walks the whole project. The index is only saved in a
+        project that has an ext folder already (created by a build), so listing never adds files to a project
+    """
+    index = DiscoveryIndex(
+        index_path=os.path.join(project_dir, appsettings.cython_discovery_index_path),
+        project_dir=project_dir,
+        extensions=('.pyx', '.pxd', '.pxi'),
+        exclude=exclude,
+    )
+    index.load()
+    found_files = index.walk(rescan=rescan)
+    logger.debug(msg=f"[{discover_project.__name__}] - rescanned {index.rescanned_count} of {len(index.folders)} folders")
+    if (not os.path.isdir(os.path.dirname(index.index_path))):
+        return found_files
+    try:
+        index.save()
+    except OSError as e:
+        logger.debug(msg=f"[{discover_project.__name__}] - cannot save discovery index: {e}")
+    return found_files
+
+
+def git_ls_files(project_dir:str, extensions:tuple=('.pyx',), exclude:[str]=None) -> [str]:
+    """ Lists tracked and untracked-but-not-ignored files with the given extensions through git. Much faster than
+        walking on large repositories. Returns None when git is not available or [project_dir] is not a git repository
+    """
+    exclude = appsettings.default_excluded_dirnames if (exclude is None) else exclude
+    pathspecs = [f"*{ext}" for ext in extensions] + ['pyvenv.cfg', '*/pyvenv.cfg']
+    try:
+        completed = subprocess.run(
+            ['git', 'ls-files', '--cached', '--others', '--exclude-standard', '-z', '--'] + pathspecs,
+            cwd=project_dir, capture_output=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.debug(msg=f"[{git_ls_files.__name__}] - git ls-files unavailable in {project_dir}: {e}")
+        return None
+
+    relpaths = sorted(set(p for p in completed.stdout.decode('UTF-8', errors='replace').split('\0') if (len(p) > 0)))
+    venv_dirs = set(os.path.dirname(p) for p in relpaths if (os.path.basename(p) == 'pyvenv.cfg' and os.path.dirname(p) != ''))
+    found_files = []
+    for relpath in relpaths:
+        if (not relpath.endswith(extensions)):
+            continue
+        parts = relpath.split('/')
+        if (any(fnmatch.fnmatch(part, pattern) for part in parts[:-1] for pattern in exclude)):
+            continue
+        if (any('/'.join(parts[:i]) in venv_dirs for i in range(1, len(parts)))):
+            continue
+        fullpath = os.path.join(os.path.abspath(project_dir), *parts)
+        if (os.path.isfile(fullpath)):  # deleted but still tracked
+            found_files.append(fullpath)
+    return found_files
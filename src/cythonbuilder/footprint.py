@@ -0,0 +1,62 @@
+""" Size and import time of compiled extensions, to see what a build setting (like `cybuilder build --small`) does to
+    them. The import time is measured in fresh interpreters, because an interpreter loads a shared library only once;
+    it includes loading the library and running the module's initialisation, but not importing its parent packages.
+"""
+import os
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass
+
+from . import appsettings
+from .dependencies import dotted_module_name
+
+# argv: module name, extension path, folder of its top package. Prints the seconds to import the extension
+_IMPORT_SCRIPT = (
+    "import importlib, importlib.util, sys, time\n"
+    "name, path = sys.argv[1], sys.argv[2]\n"
+    "sys.path.insert(0, sys.argv[3])\n"
+    "if ('.' in name):\n"
+    "    importlib.import_module(name.rpartition('.')[0])\n"
+    "started = time.perf_counter()\n"
+    "spec = importlib.util.spec_from_file_location(name, path)\n"
+    "module = importlib.util.module_from_spec(spec)\n"
+    "sys.modules[name] = module\n"
+    "spec.loader.exec_module(module)\n"
+    "print(time.perf_counter() - started)\n"
+)
+
+
+@dataclass
+class ExtensionFootprint:
+    file: str               # the pyx file
+    size: int               # bytes of its extension; of the whole bundle for a bundled module
+    import_time: float      # median seconds to import it, None if it cannot be imported
+
+
+def import_time(module_name:str, extension_path:str, root_dir:str, repeats:int=appsettings.footprint_repeats) -> float:
+    """ Median seconds over [repeats] fresh interpreters to import [extension_path] as [module_name]. [root_dir] is put on
+        sys.path for its packages and cimported modules. None if importing fails
+    """
+    times = []
+    for _ in range(repeats):
+        completed = subprocess.run([sys.executable, '-c', _IMPORT_SCRIPT, module_name, extension_path, root_dir], capture_output=True, text=True)
+        if (completed.returncode != 0):
+            return None
+        times.append(float(completed.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+
+def measure_footprint(pyx_fullpath:str, extension_path:str, repeats:int=appsettings.footprint_repeats) -> ExtensionFootprint:
+    """ Size and import time of [extension_path], the extension of [pyx_fullpath]; it may be a copy elsewhere, like the
+        previous build of the extension
+    """
+    module_name = dotted_module_name(filepath=pyx_fullpath)
+    root_dir = os.path.dirname(pyx_fullpath)
+    for _ in range(module_name.count('.')):
+        root_dir = os.path.dirname(root_dir)
+    return ExtensionFootprint(
+        file=pyx_fullpath,
+        size=os.path.getsize(os.path.realpath(extension_path)),
+        import_time=import_time(module_name=module_name, extension_path=extension_path, root_dir=root_dir, repeats=repeats),
+    )
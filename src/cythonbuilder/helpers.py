@@ -1,3 +1,4 @@
+import importlib.util
 import os
 import shutil
 
@@ -67,6 +68,51 @@ class FilesAndFolders:
             with open(source, 'r') as src:
                 dst.write(src.read())
 
+    @staticmethod
+    def write_if_changed(filepath:str, content:str, encoding:str='UTF-8') -> bool:
+        """ Writes [content] through a temp file and a rename, so readers never see a half written file. Leaves the
+            file (and its mtime) alone when it already has this content. Returns whether the file was written
+        """
+        if (os.path.isfile(filepath)):
+            with open(filepath, 'r', encoding=encoding, errors='replace') as file:
+                if (file.read() == content):
+                    return False
+        tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_filepath, 'w', encoding=encoding) as file:
+                file.write(content)
+            os.replace(tmp_filepath, filepath)
+        finally:
+            if (os.path.isfile(tmp_filepath)):
+                os.remove(tmp_filepath)
+        return True
+
+    @staticmethod
+    def install_file(srcfilename:str, dstfilename:str) -> None:
+        """ Copies a file through a temp file and a rename. The destination is replaced in one step, so a process
+            that has the old file open (or loaded, like an extension module) keeps its copy
+        """
+        if (not os.path.isfile(srcfilename)):
+            raise ValueError(f"{FilesAndFolders.install_file.__name__}] - provided source filename invalid; source file does not exist: {srcfilename}")
+        tmp_filename = f"{dstfilename}.{os.getpid()}.tmp"
+        try:
+            shutil.copy2(src=srcfilename, dst=tmp_filename)
+            os.replace(tmp_filename, dstfilename)
+        finally:
+            if (os.path.isfile(tmp_filename)):
+                os.remove(tmp_filename)
+
+    @staticmethod
+    def install_link(srcfilename:str, dstfilename:str) -> None:
+        """ Makes [dstfilename] a relative symlink to [srcfilename], replacing whatever is there in one step """
+        tmp_filename = f"{dstfilename}.{os.getpid()}.tmp"
+        try:
+            os.symlink(os.path.relpath(srcfilename, os.path.dirname(dstfilename)), tmp_filename)
+            os.replace(tmp_filename, dstfilename)
+        finally:
+            if (os.path.islink(tmp_filename)):
+                os.remove(tmp_filename)
+
     @staticmethod
     def remove_file(targetfilename:str) -> None:
         """ Remove specified file """
@@ -92,18 +138,15 @@ class FilesAndFolders:
 
 
 def package_is_installed(package_import_name:str=None) -> bool:
-    """ Returns t/f depending on whether a package is installed in this project
+    """ Returns t/f depending on whether a package is installed in this project. Only looks the package up; it is not
+        imported (importing numpy alone takes longer than the rest of cybuilder's startup)
         :arg package_import_name   str     name of the package you're checking
     """
 
     if (package_import_name == None or package_import_name == 'venv'):
         return False
-    _package_installed = False
     try:
-        exec(f"import {package_import_name}")
-        _package_installed = True
-    except ImportError:
-        pass
-    except Exception as e:
-        raise e
-    return _package_installed
+        return importlib.util.find_spec(package_import_name) is not None
+    except (ImportError, ValueError):
+        # a parent package of a dotted name is missing, or the module has no __spec__
+        return False
@@ -0,0 +1,100 @@
+import html
+import re
+from dataclasses import dataclass, field, asdict
+
+# <pre class="cython line score-47" onclick="...">+<span class="">1</span>: <span class="k">def</span>...</pre>
+_LINE_REGEX = re.compile(r'<pre class="cython line score-(\d+)"[^>]*>(.*?)</pre>', re.DOTALL)
+_LINENO_REGEX = re.compile(r'^[+\s]*(\d+):\s?(.*)$', re.DOTALL)
+_TAG_REGEX = re.compile(r'<[^>]+>')
+_DEF_REGEX = re.compile(r'^(\s*)(?:async\s+)?(?:cpdef|cdef|def)\s+(?:[\w\.\*\[\], ]+?\s+)?\**(\w+)\s*\(')
+_CLASS_REGEX = re.compile(r'^(\s*)(?:cdef\s+|cpdef\s+)?class\s+(\w+)')
+
+
+@dataclass
+class LineScore:
+    """ Cython's score of a single source line: roughly the number of Python C-API calls generated for it """
+    file: str
+    line: int
+    score: int
+    code: str
+    function: str = None
+
+
+@dataclass
+class FunctionScore:
+    file: str
+    function: str
+    score: int          # sum of the scores of its lines
+    lines: int          # lines with a score above 0
+    worst_line: int
+
+
+@dataclass
+class HotspotReport:
+    lines: [LineScore] = field(default_factory=list)
+    functions: [FunctionScore] = field(default_factory=list)
+
+    def ranked(self, by:str='line', top:int=None) -> list:
+        """ Lines or functions with a score above 0, the most Python interaction first """
+        if (by not in ('line', 'function')):
+            raise ValueError(f"[{HotspotReport.ranked.__name__}] - rank by 'line' or 'function', not '{by}'")
+        items = self.lines if (by == 'line') else self.functions
+        items = sorted([i for i in items if (i.score > 0)], key=lambda i: -i.score)
+        return items if (top is None) else items[:top]
+
+    def to_dict(self, by:str='line', top:int=None) -> dict:
+        return {
+            'total_score': sum(l.score for l in self.lines),
+            'by': by,
+            'hotspots': [asdict(i) for i in self.ranked(by=by, top=top)],
+        }
+
+
+def parse_annotation(html_path:str, source_name:str=None) -> [LineScore]:
+    """ The scored lines of a Cython annotation html file. Every line is attributed to the function (Class.method)
+        it is part of, if any. [source_name] is what the lines are reported as; default is the html path
+    """
+    with open(html_path, 'r', encoding='UTF-8', errors='replace') as f:
+        content = f.read()
+    source_name = html_path if (source_name is None) else source_name
+
+    line_scores = []
+    scopes:[tuple] = []     # (indentation, name) of the enclosing classes and functions
+    for score, line_html in _LINE_REGEX.findall(content):
+        match = _LINENO_REGEX.match(html.unescape(_TAG_REGEX.sub('', line_html)))
+        if (match is None):
+            continue
+        lineno, code = int(match.group(1)), match.group(2).rstrip()
+        if (len(code.strip()) > 0 and not code.lstrip().startswith('#')):
+            indentation = len(code) - len(code.lstrip())
+            while (len(scopes) > 0 and scopes[-1][0] >= indentation):
+                scopes.pop()
+            scope_match = _DEF_REGEX.match(code) or _CLASS_REGEX.match(code)
+            if (scope_match is not None):
+                scopes.append((indentation, scope_match.group(2)))
+        function = ".".join(name for _, name in scopes) if (len(scopes) > 0) else None
+        line_scores.append(LineScore(file=source_name, line=lineno, score=int(score), code=code.strip(), function=function))
+    return line_scores
+
+
+def hotspot_report(annotations:{str: str}) -> HotspotReport:
+    """ Report over {html path: source name} annotation files """
+    report = HotspotReport()
+    for html_path, source_name in annotations.items():
+        report.lines += parse_annotation(html_path=html_path, source_name=source_name)
+
+    functions:{tuple: FunctionScore} = {}
+    worst_scores:{tuple: int} = {}
+    for l in report.lines:
+        if (l.function is None):
+            continue
+        key = (l.file, l.function)
+        function = functions.setdefault(key, FunctionScore(file=l.file, function=l.function, score=0, lines=0, worst_line=l.line))
+        function.score += l.score
+        if (l.score > 0):
+            function.lines += 1
+        if (l.score > worst_scores.get(key, -1)):
+            worst_scores[key] = l.score
+            function.worst_line = l.line
+    report.functions = list(functions.values())
+    return report
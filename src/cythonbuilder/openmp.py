@@ -0,0 +1,105 @@
+import functools
+import os
+import re
+import subprocess
+import sys
+import sysconfig
+import tempfile
+
+from .logs import logger
+
+# from cython.parallel cimport prange, cimport cython.parallel, cython.parallel.prange(..), from cython cimport parallel
+_CYTHON_PARALLEL_REGEX = re.compile(r'\bcython\.parallel\b|^\s*from\s+cython\s+c?import\s+.*\bparallel\b')
+# cimport openmp, from openmp cimport omp_get_thread_num
+_CIMPORT_OPENMP_REGEX = re.compile(r'^\s*(?:cimport\s+(?:[\w\.]+\s*,\s*)*openmp\b|from\s+openmp\s+cimport\b)')
+_PRANGE_REGEX = re.compile(r'\bprange\s*\(')
+_NOGIL_ARG_REGEX = re.compile(r'\bnogil\s*=\s*True\b')
+_WITH_NOGIL_REGEX = re.compile(r'^(\s*)with\s+(?:[\w\.\(\)]+\s*,\s*)*nogil\b')
+_OPENMP_TEST_PROGRAM = "#include <omp.h>\nint main(void) { return omp_get_max_threads() > 0 ? 0 : 1; }\n"
+
+
+def _code_lines(filepath:str, encoding:str='UTF-8') -> [str]:
+    """ The lines of a Cython file without comments """
+    with open(filepath, 'r', encoding=encoding, errors='replace') as f:
+        return [line.split('#', 1)[0].rstrip() for line in f.read().splitlines()]
+
+
+def uses_openmp(filepaths:[str]) -> bool:
+    """ Whether the code in [filepaths] (a pyx file and the files it includes or cimports) uses cython.parallel or
+        cimports openmp, so its extension must be compiled and linked with OpenMP to run in parallel
+    """
+    for filepath in filepaths:
+        if (not filepath.endswith(('.pyx', '.pxd', '.pxi')) or not os.path.isfile(filepath)):
+            continue
+        if (any(_CYTHON_PARALLEL_REGEX.search(line) or _CIMPORT_OPENMP_REGEX.match(line) for line in _code_lines(filepath=filepath))):
+            return True
+    return False
+
+
+def cimports_openmp(filepath:str) -> bool:
+    """ Whether [filepath] cimports the OpenMP runtime functions; without OpenMP its extension cannot be imported """
+    return any(_CIMPORT_OPENMP_REGEX.match(line) for line in _code_lines(filepath=filepath))
+
+
+def nogil_prange_lines(filepath:str) -> [int]:
+    """ Line numbers of the prange loops in [filepath] that run without the GIL: prange(.., nogil=True) or a prange in a
+        `with nogil` block. Without OpenMP these run on one thread
+    """
+    found = []
+    nogil_indents = []      # indentation of the enclosing `with nogil` blocks
+    for lineno, line in enumerate(_code_lines(filepath=filepath), start=1):
+        if (line.strip() == ''):
+            continue
+        indent = len(line) - len(line.lstrip())
+        while (len(nogil_indents) > 0 and indent <= nogil_indents[-1]):
+            nogil_indents.pop()
+        if (_PRANGE_REGEX.search(line) and (len(nogil_indents) > 0 or _NOGIL_ARG_REGEX.search(line))):
+            found.append(lineno)
+        match = _WITH_NOGIL_REGEX.match(line)
+        if (match is not None):
+            nogil_indents.append(len(match.group(1)))
+    return found
+
+
+def _compiler_command() -> [str]:
+    return os.environ.get('CC', sysconfig.get_config_var('CC') or 'cc').split()
+
+
+@functools.lru_cache(maxsize=None)
+def openmp_flags() -> ([str], [str]):
+    """ The compile and link arguments that enable OpenMP for the compiler extensions are built with: /openmp for
+        MSVC, -fopenmp for gcc and clang, and Apple clang's -Xpreprocessor -fopenmp with libomp
+    """
+    if (sys.platform == 'win32'):
+        return ['/openmp'], []
+    if (sys.platform == 'darwin'):
+        try:
+            version = subprocess.run(_compiler_command()[:1] + ['--version'], capture_output=True, text=True).stdout
+        except OSError:
+            version = ''
+        if ('Apple clang' in version):
+            return ['-Xpreprocessor', '-fopenmp'], ['-lomp']
+    return ['-fopenmp'], ['-fopenmp']
+
+
+@functools.lru_cache(maxsize=None)
+def openmp_supported() -> bool:
+    """ Whether the compiler can build and link an OpenMP program with openmp_flags(), found out by doing so. Assumed
+        for MSVC, which always has it
+    """
+    if (sys.platform == 'win32'):
+        return True
+    compile_args, link_args = openmp_flags()
+    with tempfile.TemporaryDirectory() as folder:
+        source_path = os.path.join(folder, 'openmp_test.c')
+        with open(source_path, 'w') as f:
+            f.write(_OPENMP_TEST_PROGRAM)
+        command = _compiler_command() + compile_args + [source_path, '-o', os.path.join(folder, 'openmp_test')] + link_args
+        try:
+            completed = subprocess.run(command, capture_output=True, text=True, timeout=60)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug(msg=f"[{openmp_supported.__name__}] - cannot run {' '.join(command)}: {e}")
+            return False
+    if (completed.returncode != 0):
+        logger.debug(msg=f"[{openmp_supported.__name__}] - {' '.join(command)} failed:\n{completed.stderr}")
+    return completed.returncode == 0
@@ -0,0 +1,192 @@
+""" Runs a workload against the instrumented extensions (`cybuilder build --instrument`) under cProfile or a line
+    tracer, and reports the time per cdef/cpdef/def function or per source line of the pyx files.
+    The workload runs in a child process started as `python -m cythonbuilder.profiler`, so the instrumented
+    extensions never mix with extensions the calling process already imported.
+"""
+import argparse
+import importlib.abc
+import importlib.util
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field, asdict
+
+_CYTHON_SOURCES = ('.pyx', '.pxd', '.pxi')
+
+
+@dataclass
+class FunctionProfile:
+    file: str
+    line: int
+    function: str
+    calls: int
+    own_time: float         # seconds in the function itself
+    total_time: float       # seconds including the functions it called
+
+
+@dataclass
+class LineProfile:
+    file: str
+    line: int
+    hits: int
+    time: float             # seconds from reaching the line to reaching the next one, calls included
+    code: str = ''
+
+
+@dataclass
+class ProfileReport:
+    mode: str                                   # 'function' or 'line'
+    wall_time: float = 0.0
+    exit_code: int = 0
+    functions: [FunctionProfile] = field(default_factory=list)
+    lines: [LineProfile] = field(default_factory=list)
+    output_path: str = None
+
+    def ranked(self, top:int=None) -> list:
+        """ Functions by their own time or lines by their time, slowest first """
+        items = sorted(self.functions, key=lambda f: -f.own_time) if (self.mode == 'function') else sorted(self.lines, key=lambda l: -l.time)
+        return items if (top is None) else items[:top]
+
+    def to_dict(self, top:int=None) -> dict:
+        return {
+            'mode': self.mode,
+            'wall_time': self.wall_time,
+            'exit_code': self.exit_code,
+            'profile': [asdict(i) for i in self.ranked(top=top)],
+        }
+
+    @staticmethod
+    def from_dict(content:dict) -> 'ProfileReport':
+        return ProfileReport(
+            mode=content['mode'],
+            wall_time=content['wall_time'],
+            exit_code=content['exit_code'],
+            functions=[FunctionProfile(**f) for f in content.get('functions', [])],
+            lines=[LineProfile(**l) for l in content.get('lines', [])],
+        )
+
+
+class InstrumentedFinder(importlib.abc.MetaPathFinder):
+    """ Imports the modules that have an extension in [install_dir] (named <dotted name><EXT_SUFFIX>, see
+        build_manifest.artifact_path) from there, ahead of the regular extensions next to the pyx files
+    """
+
+    def __init__(self, install_dir:str, extension_suffix:str):
+        self.modules = {name[:-len(extension_suffix)]: os.path.join(install_dir, name) for name in os.listdir(install_dir) if (name.endswith(extension_suffix))}
+
+    def find_spec(self, fullname:str, path=None, target=None):
+        if (fullname not in self.modules):
+            return None
+        return importlib.util.spec_from_file_location(fullname, self.modules[fullname])
+
+
+class LineTracer:
+    """ Times the lines of Cython code in the calling thread. It is installed with PyEval_SetTrace, like line_profiler,
+        instead of sys.settrace: Cython frames that skip the 'call' event keep f_trace = None, and the sys.settrace
+        trampoline would call that None for their lines
+    """
+    _PyTrace_CALL, _PyTrace_EXCEPTION, _PyTrace_LINE, _PyTrace_RETURN = 0, 1, 2, 3
+
+    def __init__(self):
+        self.lines:{tuple: list} = {}    # (file, line) -> [hits, seconds]
+        self._frames:{int: list} = {}    # id(frame) -> [line, time] of the line it is on
+        self._is_cython:{object: bool} = {}
+        self._callback = None
+
+    def _trace(self, obj, frame, what:int, arg) -> int:
+        code = frame.f_code
+        if (code not in self._is_cython):
+            self._is_cython[code] = code.co_filename.endswith(_CYTHON_SOURCES)
+        if (not self._is_cython[code]):
+            return 0
+        # Time runs from a line event to the next line or return event of the same frame. Cython sends the call event
+        # of a cpdef function to its wrapper frame and the lines and return to another one, so a frame is only
+        # followed from its first line on
+        if (what == self._PyTrace_CALL):
+            self._frames.pop(id(frame), None)
+            return 0
+        if (what not in (self._PyTrace_LINE, self._PyTrace_RETURN)):
+            return 0
+        now = time.perf_counter()
+        current = self._frames.pop(id(frame), None)
+        if (current is not None):
+            self.lines[(code.co_filename, current[0])][1] += now - current[1]
+        if (what == self._PyTrace_LINE):
+            self.lines.setdefault((code.co_filename, frame.f_lineno), [0, 0.0])[0] += 1
+            self._frames[id(frame)] = [frame.f_lineno, time.perf_counter()]
+        return 0
+
+    def start(self) -> None:
+        import ctypes
+        tracefunc = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.py_object, ctypes.py_object, ctypes.c_int, ctypes.c_void_p)
+        self._callback = tracefunc(self._trace)
+        ctypes.pythonapi.PyEval_SetTrace.argtypes = [tracefunc, ctypes.py_object]
+        ctypes.pythonapi.PyEval_SetTrace.restype = None
+        ctypes.pythonapi.PyEval_SetTrace(self._callback, self)
+
+    def stop(self) -> None:
+        sys.settrace(None)
+
+
+def run_workload(script:str, script_args:[str], mode:str) -> dict:
+    """ Runs [script] as __main__ (like `python script args`) under cProfile or the line tracer. Returns the raw
+        profile of the Cython code; file names are as Cython reports them
+    """
+    import runpy
+
+    sys.argv = [script] + list(script_args)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    content = {'mode': mode, 'exit_code': 0}
+    if (mode == 'function'):
+        import cProfile
+        import pstats
+        tracer = cProfile.Profile()
+    else:
+        tracer = LineTracer()
+
+    started = time.perf_counter()
+    try:
+        if (mode == 'function'):
+            tracer.enable()
+        else:
+            tracer.start()
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        content['exit_code'] = e.code if (isinstance(e.code, int)) else (0 if (e.code is None) else 1)
+    finally:
+        if (mode == 'function'):
+            tracer.disable()
+        else:
+            tracer.stop()
+    content['wall_time'] = time.perf_counter() - started
+
+    if (mode == 'function'):
+        content['functions'] = [
+            {'file': filename, 'line': line, 'function': function, 'calls': calls, 'own_time': own_time, 'total_time': total_time}
+            for (filename, line, function), (_, calls, own_time, total_time, _) in pstats.Stats(tracer).stats.items()
+            if (filename.endswith(_CYTHON_SOURCES))
+        ]
+    else:
+        content['lines'] = [{'file': filename, 'line': line, 'hits': hits, 'time': seconds} for (filename, line), (hits, seconds) in tracer.lines.items()]
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=f"python -m {__name__}")
+    parser.add_argument('--install-dir', required=True, help="Folder with the instrumented extensions")
+    parser.add_argument('--output', required=True, help="Where to write the raw profile as JSON")
+    parser.add_argument('--mode', choices=['function', 'line'], default='function')
+    parser.add_argument('script')
+    parser.add_argument('script_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    from .build_manifest import extension_suffix
+    sys.meta_path.insert(0, InstrumentedFinder(install_dir=args.install_dir, extension_suffix=extension_suffix()))
+    content = run_workload(script=args.script, script_args=args.script_args, mode=args.mode)
+    with open(args.output, 'w') as f:
+        json.dump(content, f)
+
+
+if __name__ == '__main__':
+    main()
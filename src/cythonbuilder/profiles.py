@@ -0,0 +1,114 @@
+import dataclasses
+import subprocess
+import sys
+import sysconfig
+from dataclasses import dataclass, field
+
+from . import appsettings
+
+_PROFILE_KEYS = {'extra_compile_args', 'extra_link_args', 'define_macros', 'directives', 'msvc'}
+
+
+@dataclass
+class BuildProfile:
+    """ Compiler and linker settings that are applied to every Extension of a build """
+    name: str
+    extra_compile_args: [str] = field(default_factory=list)
+    extra_link_args: [str] = field(default_factory=list)
+    define_macros: [tuple] = field(default_factory=list)
+    directives: object = None   # preset name, dict or "preset,name=value" string; see directives.py
+
+    def fingerprint(self) -> dict:
+        """ What goes into the build manifest: a changed profile means the extension must be rebuilt """
+        return {
+            'name': self.name,
+            'extra_compile_args': list(self.extra_compile_args),
+            'extra_link_args': list(self.extra_link_args),
+            'define_macros': [list(m) for m in self.define_macros],
+        }
+
+
+def available_profiles(config:dict=None) -> {str: dict}:
+    """ The built-in profiles (appsettings.build_profiles) updated with the ones in [tool.cythonbuilder.profiles] """
+    profiles = dict(appsettings.build_profiles)
+    user_profiles = {} if (config is None) else config.get('profiles', {})
+    for name, settings in user_profiles.items():
+        unknown_keys = set(settings).difference(_PROFILE_KEYS)
+        if (len(unknown_keys) > 0):
+            raise ValueError(f"[{available_profiles.__name__}] - profile '{name}' has unknown settings {sorted(unknown_keys)}; valid are {sorted(_PROFILE_KEYS)}")
+        profiles[name] = settings
+    return profiles
+
+
+def resolve_profile(name:str=None, config:dict=None) -> BuildProfile:
+    """ Looks up a profile by name. Without a name the 'profile' setting in [tool.cythonbuilder] is used, then 'default'.
+        On Windows the settings in the profile's 'msvc' table replace the gcc/clang style ones
+    """
+    config = {} if (config is None) else config
+    name = config.get('profile', 'default') if (name is None) else name
+    profiles = available_profiles(config=config)
+    if (name not in profiles):
+        raise ValueError(f"[{resolve_profile.__name__}] - unknown build profile '{name}'; choose from {', '.join(sorted(profiles))}")
+
+    settings = dict(profiles[name])
+    msvc_settings = settings.pop('msvc', {})
+    if (sys.platform == 'win32'):
+        settings.update(msvc_settings)
+    return BuildProfile(
+        name=name,
+        extra_compile_args=list(settings.get('extra_compile_args', [])),
+        extra_link_args=list(settings.get('extra_link_args', [])),
+        define_macros=[tuple(m) for m in settings.get('define_macros', [])],
+        directives=settings.get('directives'),
+    )
+
+
+def small_variant(profile:BuildProfile) -> BuildProfile:
+    """ [profile] with the settings of appsettings.small_build for this platform added, as '<name>-small' so it gets
+        its own build folder
+    """
+    settings = {k: v for k, v in appsettings.small_build.items() if (k not in ('darwin', 'msvc'))}
+    if (sys.platform == 'win32'):
+        settings.update(appsettings.small_build['msvc'])
+    elif (sys.platform == 'darwin'):
+        settings.update(appsettings.small_build['darwin'])
+    return dataclasses.replace(
+        profile,
+        name=f"{profile.name}-small",
+        extra_compile_args=list(profile.extra_compile_args) + settings.get('extra_compile_args', []),
+        extra_link_args=list(profile.extra_link_args) + settings.get('extra_link_args', []),
+    )
+
+
+def check_pgo_support() -> None:
+    """ Profile-guided optimization uses gcc's -fprofile-generate/-fprofile-use. Raises ValueError for other compilers;
+        clang needs an extra llvm-profdata merge step and MSVC has a different workflow altogether
+    """
+    if (sys.platform == 'win32'):
+        raise ValueError(f"[{check_pgo_support.__name__}] - PGO builds are only supported with gcc, not with MSVC")
+    compiler = (sysconfig.get_config_var('CC') or 'cc').split()[0]
+    try:
+        version = subprocess.run([compiler, '--version'], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise ValueError(f"[{check_pgo_support.__name__}] - cannot determine compiler '{compiler}': {e}")
+    if ('clang' in version.lower()):
+        raise ValueError(f"[{check_pgo_support.__name__}] - PGO builds are only supported with gcc; '{compiler}' is clang")
+
+
+def pgo_profiles(profile:BuildProfile, profile_data_dir:str) -> (BuildProfile, BuildProfile):
+    """ The instrumented and the optimized variant of [profile]. Both must be compiled from the same object paths
+        (build_dir) so gcc can match the .gcda files written by the instrumented build
+    """
+    generate = dataclasses.replace(
+        profile,
+        name=f"{profile.name}+pgo-generate",
+        extra_compile_args=profile.extra_compile_args + [f"-fprofile-generate={profile_data_dir}"],
+        extra_link_args=profile.extra_link_args + [f"-fprofile-generate={profile_data_dir}"],
+    )
+    use = dataclasses.replace(
+        profile,
+        name=f"{profile.name}+pgo",
+        extra_compile_args=profile.extra_compile_args + [f"-fprofile-use={profile_data_dir}", '-fprofile-correction', '-Wno-missing-profile'],
+        extra_link_args=profile.extra_link_args + [f"-fprofile-use={profile_data_dir}"],
+    )
+    return generate, use
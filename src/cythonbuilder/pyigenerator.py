@@ -93,200 +93,219 @@ class LineConverter:
     # translate
     @property
     def py_line(self) -> str:
-
-        # Strip and remove double spaces
-        py_line = self.pyx_line.strip()
-        py_line = " ".join(py_line.split("  "))
-        if (self.is_import):
-            py_line = py_line.replace("cimport", "import")
-        if (self.is_class_def):
-            py_line = " ".join([w for w in py_line.split(" ") if (w not in ['cdef', 'cpdef'])])
-        if (self.is_func_def):
-
-            # replace definition
-            py_line = py_line.replace('cdef', 'def')
-            py_line = py_line.replace('cpdef', 'def')
-
-            # Handle return function types
-            py_return_type = None
-            if ('->' in py_line):
-                py_return_type = py_line.split('->')[1].strip().replace(":", "")
-                py_line = f"{py_line.split('->')[0].strip()}:"
-
-            array_between_brackets = re.findall('\(.*?\)', py_line)
-
-            for brackets in array_between_brackets:
-                # Replace C return type to -> returntype
-                func_part_one_old = py_line.replace(f"{brackets}:", "")
-                func_sig_parts = func_part_one_old.split(" ")
-
-                if (len(func_sig_parts) == 3):
-                    py_return_type = self.convert_type_cy_to_py(cy_type=func_sig_parts[1])
-                func_part_one_new = " ".join([func_sig_parts[0], func_sig_parts[-1]])
-                py_line = py_line.replace(func_part_one_old, func_part_one_new)
-                for argument in brackets.split(","):
-
-                    # Strip away parentheses and spaces
-                    argument = argument.strip("() ")
-
-
-                    # Rework arguments of c-function to py-style
-                    if (self.is_c_func_def):
-                        # C types are like (int age)
-                        arg_name_py:str = None
-                        arg_type_py:str = None
-                        arg_default_value_py:str = None
-                        # take out arg name and type if they are so specified
-                        if (' ' in argument):
-                            arg_name_py = argument.split(' ')[1]
-                            arg_type_py = self.convert_type_cy_to_py(argument.split(' ')[0])
-                        else:
-                            arg_name_py = argument
-
-                        # Get default value
-                        if ('=' in argument):
-                            arg_default_value_py = argument.split("=")[1].strip()
-
-                        # make sure default value is not part of name
-                        if (arg_name_py != None and "=" in arg_name_py):
-                            arg_name_py = arg_name_py.split("=")[0]
-                        arg_type_py = f":{arg_type_py}" if (arg_type_py != None) else ''
-                        arg_default_value_py = f"={arg_default_value_py}" if (arg_default_value_py != None) else ''
-                        newArg = f"{arg_name_py}{arg_type_py}{arg_default_value_py}"
-                        py_line = py_line.replace(argument, newArg)
-            # Add python return type
-            if (py_return_type != None):
-                py_line = py_line.strip(":") + f' -> {py_return_type}:'
-
-            # Add ... to function content
-            py_line = py_line + f"\n{self.file_spaces_for_one_tab * (self.indent_tabs + 1) * ' '}..."
-        # return indentation * spaces_for_one_tab * ' ' + line
-
-        if (self.is_enum_def):
-            enum_name = self.pyx_line.split()[-1].replace(":", "")
-            py_line = f"class {enum_name}(Enum):"
-        if (self.in_enum_body):
-            py_line = self.pyx_line
         if (self.is_name_main_def or self.in_name_main_body):
-            # py_line = "   "
             return None
+        py_line, has_body = _translate_line(
+            pyx_line=self.pyx_line,
+            is_import=self.is_import,
+            is_class_def=self.is_class_def,
+            is_func_def=self.is_func_def,
+            is_c_func_def=self.is_c_func_def,
+            is_enum_def=self.is_enum_def,
+            in_enum_body=self.in_enum_body,
+        )
+        # Add ... to function content
+        if (has_body):
+            py_line = py_line + f"\n{self.file_spaces_for_one_tab * (self.indent_tabs + 1) * ' '}..."
         # add original indentation back
-
-        py_line = f"{self.file_spaces_for_one_tab * self.indent_tabs * ' '}" + py_line
-
-        return py_line
-
+        return f"{self.file_spaces_for_one_tab * self.indent_tabs * ' '}" + py_line
 
     def convert_type_cy_to_py(self, cy_type:str):
-        """ """
-        # todo continue https://stackoverflow.com/questions/55451545/what-are-all-the-types-available-in-cython
-        cy_type = cy_type.lower()
-
-        if (cy_type in ['bint', 'bool']):
-            return 'bool'
-        elif (cy_type in ['char', 'short', 'int', 'long', 'long long']):
-            return 'int'
-        elif (cy_type in ['float', 'double', 'long double']):
-            return 'float'
-        elif (cy_type in ['float complex', 'double complex', 'complex']):
-            return 'complex'
-        elif (cy_type in ['char*', 'std::string', 'str']):
-            return 'str'
-        elif (cy_type in ['void']):
-            return 'None'
-        else:
-            # non-built-in type like np.ndarray
-            return cy_type
-
-
+        return convert_type_cy_to_py(cy_type=cy_type)
+
+
+def convert_type_cy_to_py(cy_type:str):
+    """ """
+    # todo continue https://stackoverflow.com/questions/55451545/what-are-all-the-types-available-in-cython
+    cy_type = cy_type.lower()
+
+    if (cy_type in ['bint', 'bool']):
+        return 'bool'
+    elif (cy_type in ['char', 'short', 'int', 'long', 'long long']):
+        return 'int'
+    elif (cy_type in ['float', 'double', 'long double']):
+        return 'float'
+    elif (cy_type in ['float complex', 'double complex', 'complex']):
+        return 'complex'
+    elif (cy_type in ['char*', 'std::string', 'str']):
+        return 'str'
+    elif (cy_type in ['void']):
+        return 'None'
+    else:
+        # non-built-in type like np.ndarray
+        return cy_type
+
+
+_BRACKETS_REGEX = re.compile(r'\(.*?\)')
+_DEF_WORDS = {'cdef', 'def', 'cpdef'}
+_C_DEF_WORDS = {'cpdef', 'cdef'}
+
+
+def _translate_line(pyx_line:str, is_import:bool, is_class_def:bool, is_func_def:bool, is_c_func_def:bool, is_enum_def:bool, in_enum_body:bool) -> (str, bool):
+    """ The pyi version of a pyx line, without indentation. Also returns whether it is a function that needs a '...' body """
+    if (in_enum_body):
+        return pyx_line, False
+    if (is_enum_def):
+        enum_name = pyx_line.split()[-1].replace(":", "")
+        return f"class {enum_name}(Enum):", False
+
+    # Strip and remove double spaces
+    py_line = pyx_line.strip()
+    py_line = " ".join(py_line.split("  "))
+    if (is_import):
+        py_line = py_line.replace("cimport", "import")
+    if (is_class_def):
+        py_line = " ".join([w for w in py_line.split(" ") if (w not in ['cdef', 'cpdef'])])
+    if (not is_func_def):
+        return py_line, False
+
+    # replace definition
+    py_line = py_line.replace('cdef', 'def')
+    py_line = py_line.replace('cpdef', 'def')
+
+    # Handle return function types
+    py_return_type = None
+    if ('->' in py_line):
+        py_return_type = py_line.split('->')[1].strip().replace(":", "")
+        py_line = f"{py_line.split('->')[0].strip()}:"
+
+    for brackets in _BRACKETS_REGEX.findall(py_line):
+        # Replace C return type to -> returntype
+        func_part_one_old = py_line.replace(f"{brackets}:", "")
+        func_sig_parts = func_part_one_old.split(" ")
+
+        if (len(func_sig_parts) == 3):
+            py_return_type = convert_type_cy_to_py(cy_type=func_sig_parts[1])
+        func_part_one_new = " ".join([func_sig_parts[0], func_sig_parts[-1]])
+        py_line = py_line.replace(func_part_one_old, func_part_one_new)
+        if (not is_c_func_def):
+            continue
+        for argument in brackets.split(","):
+
+            # Strip away parentheses and spaces
+            argument = argument.strip("() ")
+
+            # Rework arguments of c-function to py-style; C types are like (int age)
+            arg_name_py:str = None
+            arg_type_py:str = None
+            arg_default_value_py:str = None
+            # take out arg name and type if they are so specified
+            if (' ' in argument):
+                arg_name_py = argument.split(' ')[1]
+                arg_type_py = convert_type_cy_to_py(cy_type=argument.split(' ')[0])
+            else:
+                arg_name_py = argument
+
+            # Get default value
+            if ('=' in argument):
+                arg_default_value_py = argument.split("=")[1].strip()
+
+            # make sure default value is not part of name
+            if (arg_name_py != None and "=" in arg_name_py):
+                arg_name_py = arg_name_py.split("=")[0]
+            arg_type_py = f":{arg_type_py}" if (arg_type_py != None) else ''
+            arg_default_value_py = f"={arg_default_value_py}" if (arg_default_value_py != None) else ''
+            newArg = f"{arg_name_py}{arg_type_py}{arg_default_value_py}"
+            py_line = py_line.replace(argument, newArg)
+    # Add python return type
+    if (py_return_type != None):
+        py_line = py_line.strip(":") + f' -> {py_return_type}:'
+    return py_line, True
+
+
+def _classify(pyx_line:str) -> (bool, bool, bool, bool, bool):
+    """ (is_import, is_class_def, is_func_def, is_enum_def, is_property) of a non-empty pyx line, each decided once.
+        Same rules as the LineConverter properties
+    """
+    stripped = pyx_line.strip()
+    first_word = stripped.split(" ", 1)[0]
+    is_import = first_word in ('import', 'cimport') or (first_word == 'from' and 'import' in stripped.split(" "))
+    ends_with_colon = pyx_line[-1] == ':'
+    is_class_def = ends_with_colon and "class " in pyx_line
+    is_enum_def = ends_with_colon and 'def enum' in pyx_line
+    space_stripped = stripped if (stripped == pyx_line) else pyx_line.strip(' ')
+    is_func_def = (len(space_stripped) > 0 and space_stripped[-1] == ':' and not is_class_def
+                   and not _DEF_WORDS.isdisjoint(space_stripped.split()))
+    is_property = len(stripped) > 0 and stripped[0] == '@' and '@cython.' not in stripped
+    return is_import, is_class_def, is_func_def, is_enum_def, is_property
 
 
 def pyx_to_pyi(open_pyx:TextIO) -> [str]:
-    """ Reads all content from a pyx file, convers and writes a pyi """
-
-    # 1. Read pyx file
-    pyx_lines: [str] = open_pyx.readlines()
-
-    # 2. Strip away any content after a #
-    pyx_lines = list(map(lambda l: l.split("#")[0].rstrip() if "#" in l else l, pyx_lines))
-
-    # 3. Skip empty lines
-    pyx_lines = [l.strip("\n") for l in pyx_lines]
-    pyx_lines = [l for l in pyx_lines if (len(l) > 0)]
-
-    # 4. Determine file indentation
-    all_indentations = [get_line_indentation_spacecount(line=l) for l in pyx_lines]
-    all_indentations = [i for i in all_indentations if (i > 0)]
-    spaces_for_one_tab = min(all_indentations)
-
-    # Extra check: test wheter all are divisible by the space_for_one_tab
-    for indent in all_indentations:
-        if (indent % spaces_for_one_tab != 0):
-            raise ValueError(f"Found invalid indentation: {indent} not divisible by {spaces_for_one_tab}")
-
-
-    # 5. Convert lines to py
+    """ Reads all content from a pyx file, convers and writes a pyi.
+        Single pass over the lines of [open_pyx] (any iterable of lines): every line is classified once and only the
+        kept lines are translated. The indentation unit of the file is only known at the end, so function bodies ('...')
+        are indented when the result is assembled
+    """
     py_lines:[str] = []
-    prev_line:LineConverter = None
+    bodies:[tuple] = []                 # (index in py_lines, indentation) of the functions that get a '...' body
+    indentations:{int: None} = {}       # every indentation, in order of appearance
     contains_enum:bool = False
-    for line_idx in range(len(pyx_lines)):
-        pyxline = pyx_lines[line_idx]
-
-        ld = LineConverter(line=pyxline, file_spaces_for_one_tab=spaces_for_one_tab)
-
-        if (prev_line != None):
-            # Classes
-            if (prev_line.is_class_def):
-                ld.in_class_body = True
-            elif (prev_line.in_class_body and not ld.is_class_def):
-                ld.in_class_body = True
-
-            # if __name__ == "__main__"
-            if (prev_line.is_name_main_def):
-                ld.in_name_main_body = True
-            elif (prev_line.in_name_main_body):
-                ld.in_name_main_body = True
-
-            # Functions
-            if (prev_line.is_func_def):
-                ld.in_func_body = True
-            elif (prev_line.in_func_body and (not any([ld.is_class_def, ld.is_func_def, ld.is_enum_def]))):
-                ld.in_func_body = True
-
-            # Enums
-            if (prev_line.is_enum_def):
-                ld.in_enum_body= True
-                contains_enum = True
-            elif (prev_line.in_enum_body and (not any([ld.is_class_def, ld.is_func_def, ld.is_enum_def]))):
-                ld.in_enum_body = True
 
-            # if current line defines anything
-            if (ld.is_define_line):
-                ld.in_func_body = False
-                ld.in_class_body = False
-                ld.in_enum_body = False
+    # State of the last kept line
+    is_first_line = True
+    prev_is_class_def = prev_in_class_body = prev_is_name_main_def = prev_in_name_main_body = prev_is_enum_def = prev_in_enum_body = False
+
+    for pyx_line in open_pyx:
+        # Strip away any content after a #, skip empty lines
+        if ("#" in pyx_line):
+            pyx_line = pyx_line.split("#")[0].rstrip()
+        pyx_line = pyx_line.strip("\n")
+        if (len(pyx_line) == 0):
+            continue
+        indentation = len(pyx_line) - len(pyx_line.lstrip(' '))
+        if (indentation > 0):
+            indentations[indentation] = None
+
+        is_import, is_class_def, is_func_def, is_enum_def, is_property = _classify(pyx_line=pyx_line)
+        is_define_line = is_import or is_class_def or is_func_def or is_property
+        in_class_body = in_name_main_body = in_enum_body = False
+        if (not is_first_line):
+            in_class_body = prev_is_class_def or (prev_in_class_body and not is_class_def)
+            in_name_main_body = prev_is_name_main_def or prev_in_name_main_body
+            if (prev_is_enum_def):
+                in_enum_body = True
+                contains_enum = True
+            else:
+                in_enum_body = prev_in_enum_body and not (is_class_def or is_func_def or is_enum_def)
+            if (is_define_line):
+                in_class_body = in_enum_body = False
 
-            # kep define lines an any lines that are in a class_body or enum_body
-            if (not any([ld.in_class_body, ld.in_enum_body, ld.is_define_line])):
+            # keep define lines and any lines that are in a class_body or enum_body
+            if (not (in_class_body or in_enum_body or is_define_line)):
                 continue
-        # if (any([ld.is_name_main_def, ld.in_name_main_body])):
-        #     ld.py_line = None
+        is_first_line = False
 
-        prev_line = ld
-        if (ld.py_line not in ['   ', None]):
-            py_lines.append(ld.py_line)
+        # Clean quotes off
+        is_name_main_def = '__name__=="__main__"' in pyx_line.replace("'", '"').replace(" ", "")
+        prev_is_class_def, prev_in_class_body, prev_is_enum_def, prev_in_enum_body = is_class_def, in_class_body, is_enum_def, in_enum_body
+        prev_is_name_main_def, prev_in_name_main_body = is_name_main_def, in_name_main_body
+        if (is_name_main_def or in_name_main_body):
+            continue
+
+        is_c_func_def = is_func_def and not _C_DEF_WORDS.isdisjoint(pyx_line.split(" "))
+        py_line, has_body = _translate_line(pyx_line=pyx_line, is_import=is_import, is_class_def=is_class_def, is_func_def=is_func_def,
+                                            is_c_func_def=is_c_func_def, is_enum_def=is_enum_def, in_enum_body=in_enum_body)
+        # Indentations must be multiples of the unit, so re-indenting in units keeps the original indentation
+        py_line = f"{indentation * ' '}{py_line}"
+        if (has_body):
+            bodies.append((len(py_lines), indentation))
+        if (has_body or py_line != '   '):
+            py_lines.append(py_line)
+
+    # Determine file indentation; test whether all are divisible by the space_for_one_tab
+    spaces_for_one_tab = min(indentations) if (len(indentations) > 0) else 4
+    for indent in indentations:
+        if (indent % spaces_for_one_tab != 0):
+            raise ValueError(f"Found invalid indentation: {indent} not divisible by {spaces_for_one_tab}")
 
-    # 6. Add additional imports
+    # Assembled in place so the pyi is never held in memory twice
+    for line_idx, indentation in bodies:
+        py_lines[line_idx] = f"{py_lines[line_idx]}\n{(indentation + spaces_for_one_tab) * ' '}..."
+    for line_idx in range(len(py_lines)):
+        py_lines[line_idx] = f"{py_lines[line_idx]}\n"
     if contains_enum:
-        py_lines.insert(0, "from enum import Enum\n")
-
-    # 6. return
-    return [f"{line}\n" for line in py_lines]
-    # with open(target_pyi_path, 'w') as pyi_out:
-    #     pyi_out.writelines([f"{line}\n" for line in py_lines])
-
-
-
+        py_lines.insert(0, "from enum import Enum\n\n")
+    return py_lines
 
 
 def get_line_indentation_spacecount(line: str) -> int:
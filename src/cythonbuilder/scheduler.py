@@ -0,0 +1,88 @@
+""" Plans which work unit (one pyx file or a bundle, see Builder.build) a worker builds next. The C compiler takes
+    most of a build, and a few large modules take most of that, so the longest units start first and the short ones
+    fill the gaps at the end. What a unit costs comes from its last build (duration, generated C size and peak memory
+    in the build manifest), or is estimated from its source size. Units only start while their expected memory fits
+    in what the machine has available, so a parallel build of large modules does not run into swap or the OOM killer.
+"""
+import os
+import statistics
+from dataclasses import dataclass
+
+from . import appsettings
+
+
+@dataclass
+class UnitCost:
+    duration: float                 # expected seconds
+    memory: int                     # expected peak memory in bytes
+    from_history: bool = False      # measured in an earlier build, not estimated
+
+
+def estimate_costs(units:[tuple], history:{tuple: dict}, source_sizes:{tuple: int}) -> {tuple: UnitCost}:
+    """ Expected cost of each unit. [history] holds the stats of the last build of a unit (see _build_target), if
+        any; [source_sizes] the bytes of its pyx files and the pxd/pxi files they depend on. Units without history are
+        estimated from the size of the C they will likely generate, at the seconds and bytes of memory per byte of C
+        of the units that have history, or the defaults in appsettings
+    """
+    measured = [h for h in history.values() if (h is not None and h.get('duration') and h.get('c_size'))]
+    seconds_per_c_byte = statistics.median(h['duration'] / h['c_size'] for h in measured) if (len(measured) > 0) else appsettings.scheduler_seconds_per_c_byte
+    peaks = [h['peak_memory'] for h in measured if (h.get('peak_memory'))]
+    default_memory = statistics.median(peaks) if (len(peaks) > 0) else appsettings.scheduler_default_memory
+
+    costs = {}
+    for unit in units:
+        stats = history.get(unit) or {}
+        if (stats.get('duration')):
+            costs[unit] = UnitCost(duration=stats['duration'], memory=stats.get('peak_memory') or default_memory, from_history=True)
+            continue
+        base_size, bytes_per_source_byte = appsettings.scheduler_c_size_estimate
+        c_size = stats.get('c_size') or (len(unit[0]) * base_size + source_sizes.get(unit, 0) * bytes_per_source_byte)
+        costs[unit] = UnitCost(duration=c_size * seconds_per_c_byte, memory=default_memory)
+    return costs
+
+
+def available_memory() -> int:
+    """ Bytes of memory that can be used without swapping: MemAvailable on Linux, the free pages elsewhere. None when
+        the platform does not tell
+    """
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if (line.startswith('MemAvailable:')):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def memory_budget(max_memory_mb:int=None) -> int:
+    """ Bytes the running units may use together: [max_memory_mb] ('max_memory_mb' in [tool.cythonbuilder]) or a share
+        of the available memory. None means no limit
+    """
+    if (max_memory_mb is not None):
+        return max_memory_mb * 1024 * 1024
+    available = available_memory()
+    return None if (available is None) else int(available * appsettings.scheduler_memory_share)
+
+
+def longest_first(units:[tuple], costs:{tuple: UnitCost}) -> [tuple]:
+    return sorted(units, key=lambda u: -costs[u].duration)
+
+
+def next_unit(pending:[tuple], costs:{tuple: UnitCost}, running:[tuple], budget:int=None) -> tuple:
+    """ The first of the [pending] units (longest first) whose expected memory fits in the [budget] next to the
+        [running] ones, None if none fits. With nothing running any unit fits, so one larger than the budget still
+        gets built, alone
+    """
+    if (len(pending) == 0):
+        return None
+    if (len(running) == 0 or budget is None):
+        return pending[0]
+    in_use = sum(costs[u].memory for u in running)
+    for unit in pending:
+        if (in_use + costs[unit].memory <= budget):
+            return unit
+    return None
@@ -0,0 +1,90 @@
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Phases in build order; used to sort the --timings table
+PHASES = ['discover', 'fingerprint', 'restore', 'translate', 'compile', 'link', 'clean', 'interface']
+
+
+@dataclass
+class Span:
+    """ One timed piece of work. Times are time.time() seconds so spans from worker processes line up """
+    name: str
+    phase: str
+    start: float
+    end: float
+    track: str = 'main'     # 'main' or 'worker <pid>'
+    file: str = None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class BuildTimer:
+    """ Collects the spans of a build from the main process and the workers """
+    spans: [Span] = field(default_factory=list)
+
+    @contextmanager
+    def span(self, name:str, phase:str, track:str='main', file:str=None):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.spans.append(Span(name=name, phase=phase, start=start, end=time.time(), track=track, file=file))
+
+    def add(self, spans:[Span]) -> None:
+        self.spans += spans
+
+    def phase_totals(self) -> {str: (float, float)}:
+        """ Per phase: (wall seconds from its first start to its last end, summed seconds over all tracks) """
+        totals = {}
+        for phase in sorted({s.phase for s in self.spans}, key=lambda p: PHASES.index(p) if (p in PHASES) else len(PHASES)):
+            spans = [s for s in self.spans if (s.phase == phase)]
+            totals[phase] = (max(s.end for s in spans) - min(s.start for s in spans), sum(s.duration for s in spans))
+        return totals
+
+    def file_totals(self) -> {str: {str: float}}:
+        """ Per file the seconds spent in every phase, slowest file first """
+        totals:{str: {str: float}} = {}
+        for s in self.spans:
+            if (s.file is None):
+                continue
+            phases = totals.setdefault(s.file, {})
+            phases[s.phase] = phases.get(s.phase, 0.0) + s.duration
+        return dict(sorted(totals.items(), key=lambda item: -sum(item[1].values())))
+
+    def utilization(self) -> float:
+        """ Busy time of the worker tracks divided by (number of workers x the time from the first to the last span on
+            them). 1.0 means no worker was ever idle; None without workers
+        """
+        worker_spans = [s for s in self.spans if (s.track != 'main')]
+        if (len(worker_spans) == 0):
+            return None
+        wall = max(s.end for s in worker_spans) - min(s.start for s in worker_spans)
+        tracks = {s.track for s in worker_spans}
+        return sum(s.duration for s in worker_spans) / (wall * len(tracks)) if (wall > 0) else 1.0
+
+    def chrome_trace(self) -> dict:
+        """ Trace Event Format (chrome://tracing, ui.perfetto.dev): one thread track per worker """
+        if (len(self.spans) == 0):
+            return {'traceEvents': []}
+        origin = min(s.start for s in self.spans)
+        tracks = ['main'] + sorted({s.track for s in self.spans if (s.track != 'main')}, key=lambda t: min(s.start for s in self.spans if (s.track == t)))
+        events = [{'ph': 'M', 'name': 'process_name', 'pid': 1, 'tid': 0, 'args': {'name': 'cybuilder build'}}]
+        for tid, track in enumerate(tracks):
+            events.append({'ph': 'M', 'name': 'thread_name', 'pid': 1, 'tid': tid, 'args': {'name': track}})
+            events.append({'ph': 'M', 'name': 'thread_sort_index', 'pid': 1, 'tid': tid, 'args': {'sort_index': tid}})
+        for s in sorted(self.spans, key=lambda s: s.start):
+            events.append({
+                'ph': 'X', 'name': s.name, 'cat': s.phase, 'pid': 1, 'tid': tracks.index(s.track),
+                'ts': round((s.start - origin) * 1e6), 'dur': round(s.duration * 1e6),
+                'args': {} if (s.file is None) else {'file': s.file},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, trace_path:str) -> None:
+        with open(trace_path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
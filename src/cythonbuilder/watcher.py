@@ -0,0 +1,157 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import time
+
+from .logs import logger
+
+# inotify(7) event masks
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_IGNORED = 0x00008000
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class PollingWatcher:
+    """ Detects changes by comparing the mtimes of the files returned by [list_files] every [interval] seconds """
+
+    def __init__(self, list_files, interval:float=0.5):
+        self.list_files = list_files
+        self.interval = interval
+        self.mtimes:{str: int} = self._snapshot()
+
+    def _snapshot(self) -> {str: int}:
+        mtimes = {}
+        for filepath in self.list_files():
+            try:
+                mtimes[filepath] = os.stat(filepath).st_mtime_ns
+            except OSError:
+                pass
+        return mtimes
+
+    def wait(self, timeout:float) -> set:
+        """ Blocks at most [timeout] seconds. Returns the paths that were created, changed or deleted """
+        time.sleep(min(timeout, self.interval))
+        mtimes = self._snapshot()
+        changed = {f for f, mtime in mtimes.items() if (self.mtimes.get(f) != mtime)}
+        changed |= set(self.mtimes).difference(mtimes)
+        self.mtimes = mtimes
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """ Linux inotify watches on every folder in [folders]. New subfolders are watched as they appear.
+        Only files ending with [extensions] are reported.
+    """
+
+    def __init__(self, folders:[str], extensions:tuple, exclude:[str]=None):
+        self.extensions = extensions
+        self.exclude = [] if (exclude is None) else exclude
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if (self.fd < 0):
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self.watches:{int: str} = {}
+        try:
+            for folder in folders:
+                self._add_watch(folder=folder)
+        except OSError:
+            self.close()
+            raise
+
+    def _is_excluded(self, folder:str) -> bool:
+        return any(fnmatch.fnmatch(os.path.basename(folder), pattern) for pattern in self.exclude)
+
+    def _add_watch(self, folder:str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), _WATCH_MASK)
+        if (wd < 0):
+            # ENOSPC means fs.inotify.max_user_watches is reached; the caller falls back to polling
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}: {os.strerror(ctypes.get_errno())}")
+        self.watches[wd] = folder
+
+    def _files_below(self, folder:str) -> set:
+        """ Files may be created in a new folder before its watch is in place """
+        found = set()
+        for root, folders, files in os.walk(folder):
+            folders[:] = [f for f in folders if (not self._is_excluded(folder=f))]
+            if (root != folder):
+                self._add_watch(folder=root)
+            found |= {os.path.join(root, f) for f in files if (f.endswith(self.extensions))}
+        return found
+
+    def wait(self, timeout:float) -> set:
+        """ Blocks at most [timeout] seconds. Returns the paths that were created, changed or deleted, or None when
+            the kernel queue overflowed and changes were lost
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if (len(readable) == 0):
+            return set()
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while (offset + _EVENT_HEADER.size <= len(data)):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size: offset + _EVENT_HEADER.size + name_len].rstrip(b'\0')
+            offset += _EVENT_HEADER.size + name_len
+            if (mask & _IN_Q_OVERFLOW):
+                return None
+            if (mask & _IN_IGNORED):
+                self.watches.pop(wd, None)
+                continue
+            folder = self.watches.get(wd)
+            if (folder is None or len(name) == 0):
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if (mask & _IN_ISDIR):
+                if (mask & (_IN_CREATE | _IN_MOVED_TO) and not self._is_excluded(folder=path)):
+                    self._add_watch(folder=path)
+                    changed |= self._files_below(folder=path)
+            elif (path.endswith(self.extensions)):
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def create_watcher(folders:[str], list_files, extensions:tuple, exclude:[str]=None, use_polling:bool=False, poll_interval:float=0.5):
+    """ inotify on Linux; polling elsewhere, when [use_polling] or when inotify is unavailable or out of watches """
+    if (not use_polling and sys.platform.startswith('linux')):
+        try:
+            return InotifyWatcher(folders=folders, extensions=extensions, exclude=exclude)
+        except (OSError, AttributeError) as e:
+            logger.info(msg=f"inotify unavailable ({e}); falling back to polling")
+    return PollingWatcher(list_files=list_files, interval=poll_interval)
+
+
+def wait_for_changes(watcher, debounce:float=0.3, timeout:float=1.0) -> set:
+    """ Waits for a first change, then keeps collecting until no change arrived for [debounce] seconds, so a burst of
+        saves results in one rebuild. Returns an empty set after [timeout] without changes, None if changes were lost
+    """
+    changed = watcher.wait(timeout=timeout)
+    if (changed is None or len(changed) == 0):
+        return changed
+    while (True):
+        more = watcher.wait(timeout=debounce)
+        if (more is None):
+            return None
+        if (len(more) == 0):
+            return changed
+        changed |= more
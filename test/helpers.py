@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+
+from src.cythonbuilder import cython_builder
+
+
+class ProjectTestCase(unittest.TestCase):
+    """ Gives every test an empty project folder, which is also the project of the cy_* functions """
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.project_dir = os.path.realpath(self.tmpdir.name)
+        self.previous_project_dir = cython_builder.project_dir
+        cython_builder.project_dir = self.project_dir
+
+    def tearDown(self) -> None:
+        cython_builder.project_dir = self.previous_project_dir
+        self.tmpdir.cleanup()
+
+    def write(self, relpath:str, content:str='') -> str:
+        """ Writes a file (and its folders) in the project. Returns its full path """
+        path = os.path.join(self.project_dir, *relpath.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous_mtime = os.stat(path).st_mtime_ns if (os.path.isfile(path)) else None
+        with open(path, 'w') as f:
+            f.write(content)
+        if (previous_mtime is not None):
+            # a rewrite within the resolution of the file system clock still gets a new mtime
+            os.utime(path, ns=(previous_mtime + 1_000_000_000, previous_mtime + 1_000_000_000))
+        return path
@@ -0,0 +1,137 @@
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+
+from src.cythonbuilder.artifact_cache import DirectoryStore, HttpStore, artifact_key, is_portable, open_artifact_store, publish_artifact, restore_artifact
+from src.cythonbuilder.build_manifest import artifact_path
+
+
+class _MemoryHandler(http.server.BaseHTTPRequestHandler):
+    """ Stand-in for a remote cache: keeps what is PUT in memory and serves it back """
+    stored = {}
+
+    def do_GET(self):
+        if (self.path not in self.stored):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.stored[self.path])))
+        self.end_headers()
+        self.wfile.write(self.stored[self.path])
+
+    def do_PUT(self):
+        self.stored[self.path] = self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _DisconnectingHandler(http.server.BaseHTTPRequestHandler):
+    """ A server that hangs up early: before answering, with a malformed status line or halfway through a body """
+
+    def do_GET(self):
+        if (self.path.endswith('/truncated')):
+            self.send_response(200)
+            self.send_header('Content-Length', '1000')
+            self.end_headers()
+            self.wfile.write(b'0123456789')
+        elif (self.path.endswith('/garbled')):
+            self.wfile.write(b'garbled\r\n\r\n')
+        self.close_connection = True
+
+    def do_PUT(self):
+        if (self.path.endswith('/garbled')):
+            self.wfile.write(b'garbled\r\n\r\n')
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestArtifactCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.project_dir = os.path.join(self.tmpdir.name, 'project')
+        os.makedirs(os.path.join(self.project_dir, 'pkg'))
+        self.pyx_path = os.path.join(self.project_dir, 'pkg', 'mod.pyx')
+        for path, content in [(os.path.join(self.project_dir, 'pkg', '__init__.py'), ""), (self.pyx_path, "x = 1\n")]:
+            with open(path, 'w') as f:
+                f.write(content)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def roundtrip(self, store) -> None:
+        """ Publishes a (fake) extension with its annotation, removes both and restores them from [store] """
+        key = artifact_key(fingerprints=[{'source_hash': 'abc', 'module_name': 'pkg.mod'}])
+        html_path = os.path.join(self.project_dir, 'pkg', 'mod.html')
+        for path in [artifact_path(pyx_fullpath=self.pyx_path), html_path]:
+            with open(path, 'w') as f:
+                f.write(f"content of {os.path.basename(path)}")
+        publish_artifact(store=store, key=key, target_files=[self.pyx_path], create_annotations=True)
+        os.remove(artifact_path(pyx_fullpath=self.pyx_path))
+        os.remove(html_path)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.assertFalse(restore_artifact(store=store, key=artifact_key(fingerprints=[{'source_hash': 'def'}]), target_files=[self.pyx_path], create_annotations=True, tmp_dir=tmp_dir))
+            self.assertTrue(restore_artifact(store=store, key=key, target_files=[self.pyx_path], create_annotations=True, tmp_dir=tmp_dir))
+        with open(artifact_path(pyx_fullpath=self.pyx_path)) as f:
+            self.assertEqual(f"content of {os.path.basename(artifact_path(pyx_fullpath=self.pyx_path))}", f.read())
+        self.assertTrue(os.path.isfile(html_path))
+
+    def test_directory_store(self):
+        store = open_artifact_store(location=os.path.join(self.tmpdir.name, 'store'))
+        self.assertIsInstance(store, DirectoryStore)
+        self.roundtrip(store=store)
+
+    def test_http_store(self):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _MemoryHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            store = open_artifact_store(location=f"http://127.0.0.1:{server.server_address[1]}/cache")
+            self.assertIsInstance(store, HttpStore)
+            self.roundtrip(store=store)
+        finally:
+            server.shutdown()
+            server.server_close()
+        # an unreachable server is a miss, not an error
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.assertFalse(store.fetch(key='abc', name='extension', dst_path=os.path.join(tmp_dir, 'extension')))
+
+    def test_http_store_disconnects(self):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _DisconnectingHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            store = HttpStore(url=f"http://127.0.0.1:{server.server_address[1]}/cache", timeout=5)
+            src_path = os.path.join(self.tmpdir.name, 'published.so')
+            with open(src_path, 'wb') as f:
+                f.write(b'extension')
+            # RemoteDisconnected, IncompleteRead and BadStatusLine are misses, not errors
+            for name in ['closed', 'truncated', 'garbled']:
+                self.assertFalse(store.fetch(key='abc', name=name, dst_path=os.path.join(self.tmpdir.name, name)))
+            for name in ['closed', 'garbled']:
+                store.publish(key='abc', name=name, src_path=src_path)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_key(self):
+        fingerprint = {'source_hash': 'abc', 'module_name': 'pkg.mod', 'include_dirs': ['/home/me/numpy/include'], 'profile': {'extra_compile_args': ['-O3']}}
+        self.assertEqual(artifact_key(fingerprints=[fingerprint]), artifact_key(fingerprints=[dict(fingerprint, include_dirs=['/opt/numpy/include'])]))
+        self.assertNotEqual(artifact_key(fingerprints=[fingerprint]), artifact_key(fingerprints=[dict(fingerprint, source_hash='def')]))
+        self.assertTrue(is_portable(fingerprint=fingerprint))
+        self.assertFalse(is_portable(fingerprint=dict(fingerprint, profile={'extra_compile_args': ['-O3', '-march=native']})))
+        self.assertIsNone(open_artifact_store(location='none'))
+        with self.assertRaises(ValueError):
+            open_artifact_store(location='s3://bucket/cache')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import types
+import unittest
+
+from src.cythonbuilder.benchmark import compare_to_baseline, discover_benchmarks, load_python_module, percentile, run_benchmarks, time_function
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_percentile(self):
+        self.assertEqual(3, percentile(values=[5, 1, 3], pct=50))
+        self.assertAlmostEqual(9.55, percentile(values=list(range(11)), pct=95.5))
+        self.assertEqual(2, percentile(values=[2], pct=95))
+
+    def test_time_function(self):
+        calls = []
+        timing = time_function(func=lambda mod: calls.append(mod.x), module=types.SimpleNamespace(x=1), warmup=2, repeats=3, min_time=0.001)
+        self.assertEqual(3, len(timing.times))
+        self.assertGreaterEqual(len(calls), 5 * timing.number)
+        self.assertTrue(timing.min <= timing.median <= timing.p95)
+
+    def test_discover_and_run(self):
+        with tempfile.TemporaryDirectory() as project_dir:
+            os.makedirs(os.path.join(project_dir, 'pkg'))
+            os.makedirs(os.path.join(project_dir, 'benchmarks'))
+            pyx_path = os.path.join(project_dir, 'pkg', 'mathx.pyx')
+            with open(pyx_path, 'w') as f:
+                f.write('def double(x):\n    return x * 2\n')
+            with open(os.path.join(project_dir, 'pkg', 'bench_mathx.py'), 'w') as f:
+                f.write('def bench_double(mod):\n    mod.double(4)\n\ndef helper(mod):\n    pass\n')
+            with open(os.path.join(project_dir, 'benchmarks', 'more.py'), 'w') as f:
+                f.write('def bench_broken(mod):\n    mod.triple(4)\n')
+
+            config = {'bench': {'files': {'pkg/math*.pyx': ['benchmarks/more.py']}}}
+            bench_files = discover_benchmarks(pyx_fullpath=pyx_path, project_dir=project_dir, config=config)
+            self.assertEqual(['bench_mathx.py', 'more.py'], [os.path.basename(p) for p in bench_files])
+            self.assertEqual(8, load_python_module(pyx_fullpath=pyx_path).double(4))
+
+            results = run_benchmarks(pyx_fullpath=pyx_path, bench_files=bench_files, project_dir=project_dir, warmup=0, repeats=2, min_time=0.001)
+
+        self.assertEqual(['bench_double', 'bench_broken'], [r.name for r in results])
+        double, broken = results
+        # never built: only the Python version runs
+        self.assertIsNone(double.compiled)
+        self.assertIn('compiled', double.errors)
+        self.assertEqual(2, len(double.python.times))
+        self.assertIn('AttributeError', broken.errors['python'])
+
+        double.compiled = double.python
+        compare_to_baseline(results=results, baseline={'benchmarks': [{'file': 'pkg/mathx.pyx', 'name': 'bench_double', 'compiled': {'number': 1, 'times': [double.compiled.median * 2]}}]})
+        self.assertAlmostEqual(2.0, double.baseline_speedup)
+        self.assertIsNone(broken.baseline)
@@ -0,0 +1,115 @@
+import os
+import unittest
+
+from src.cythonbuilder.build_manifest import ArtifactManifest, BuildManifest, InterfaceManifest, abi_tag, artifact_path, build_fingerprint, file_hash
+
+from .helpers import ProjectTestCase
+
+
+class TestBuildManifest(ProjectTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.manifest_path = os.path.join(self.project_dir, 'build_manifest.json')
+        self.pyx_path = self.write('mod.pyx', "cpdef int add(int a, int b):\n    return a + b\n")
+
+    def fingerprint(self) -> dict:
+        return build_fingerprint(pyx_fullpath=self.pyx_path, include_dirs=[], profile={'name': 'default'}, create_annotations=True)
+
+    def test_up_to_date_requires_artifact(self):
+        manifest = BuildManifest(manifest_path=self.manifest_path, project_dir=self.project_dir)
+        manifest.record(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint())
+        self.assertFalse(manifest.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint()))
+        open(artifact_path(pyx_fullpath=self.pyx_path), 'w').close()
+        self.assertTrue(manifest.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint()))
+
+    def test_install_dir(self):
+        install_dir = os.path.join(self.project_dir, 'instrumented')
+        os.makedirs(install_dir)
+        manifest = BuildManifest(manifest_path=self.manifest_path, project_dir=self.project_dir, install_dir=install_dir)
+        manifest.record(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint())
+        open(artifact_path(pyx_fullpath=self.pyx_path), 'w').close()
+        self.assertFalse(manifest.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint()))
+        self.assertEqual(install_dir, os.path.dirname(artifact_path(pyx_fullpath=self.pyx_path, install_dir=install_dir)))
+        open(artifact_path(pyx_fullpath=self.pyx_path, install_dir=install_dir), 'w').close()
+        self.assertTrue(manifest.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint()))
+
+    def test_abi_tag(self):
+        tag = abi_tag()
+        self.assertTrue(len(tag) > 0)
+        self.assertNotIn(os.sep, tag)
+        self.assertFalse(tag.startswith('.'))
+
+    def test_persists_and_detects_changes(self):
+        open(artifact_path(pyx_fullpath=self.pyx_path), 'w').close()
+        manifest = BuildManifest(manifest_path=self.manifest_path, project_dir=self.project_dir)
+        manifest.record(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint(), stats={'duration': 1.5, 'c_size': 300_000, 'peak_memory': None})
+        manifest.save()
+
+        reloaded = BuildManifest(manifest_path=self.manifest_path, project_dir=self.project_dir)
+        self.assertTrue(reloaded.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint()))
+        self.assertEqual('default', reloaded.profile_of(pyx_fullpath=self.pyx_path))
+        self.assertEqual(1.5, reloaded.stats_of(pyx_fullpath=self.pyx_path)['duration'])
+
+        # Source change
+        with open(self.pyx_path, 'a') as f:
+            f.write("# changed\n")
+        self.assertFalse(reloaded.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=self.fingerprint()))
+
+        # Setting change
+        with_args = build_fingerprint(pyx_fullpath=self.pyx_path, include_dirs=[], profile={'name': 'release'}, create_annotations=True)
+        self.assertNotEqual(self.fingerprint(), with_args)
+
+    def test_interface_manifest(self):
+        pyi_path = os.path.join(self.project_dir, 'mod.pyi')
+        with open(pyi_path, 'w') as f:
+            f.write("def add(a:int, b:int) -> int:\n    ...\n")
+
+        fingerprint = {'source_hash': file_hash(filepath=self.pyx_path), 'encoding': 'UTF-8'}
+        manifest = InterfaceManifest(manifest_path=self.manifest_path, project_dir=self.project_dir)
+        self.assertFalse(manifest.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=fingerprint))
+        manifest.record(pyx_fullpath=self.pyx_path, fingerprint=fingerprint, pyi_hash=file_hash(filepath=pyi_path))
+        manifest.save()
+
+        manifest = InterfaceManifest(manifest_path=self.manifest_path, project_dir=self.project_dir)
+        self.assertTrue(manifest.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=fingerprint))
+        self.assertFalse(manifest.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=dict(fingerprint, encoding='latin-1')))
+        # an edited pyi is generated again
+        with open(pyi_path, 'a') as f:
+            f.write("x: int\n")
+        self.assertFalse(manifest.is_up_to_date(pyx_fullpath=self.pyx_path, fingerprint=fingerprint))
+
+    def test_artifact_manifest(self):
+        manifest_path = os.path.join(self.project_dir, 'artifact_manifest.json')
+        other_pyx_path = os.path.join(self.project_dir, 'other.pyx')
+        bundle = os.path.join(self.project_dir, '__cybundle__.so')
+        for path in [other_pyx_path, bundle, 'mod.so', 'other.so', 'mod.c', 'mod.html']:
+            open(os.path.join(self.project_dir, path), 'w').close()
+
+        manifest = ArtifactManifest(manifest_path=manifest_path, project_dir=self.project_dir)
+        for pyx_path in [self.pyx_path, other_pyx_path]:
+            manifest.record(pyx_fullpath=pyx_path, kind='extension abi', path=f"{os.path.splitext(pyx_path)[0]}.so")
+            manifest.record(pyx_fullpath=pyx_path, kind='bundle abi', path=bundle)
+        manifest.record(pyx_fullpath=self.pyx_path, kind='c', path=os.path.join(self.project_dir, 'mod.c'))
+        manifest.record(pyx_fullpath=self.pyx_path, kind='html', path=os.path.join(self.project_dir, 'mod.html'))
+        manifest.save()
+
+        manifest = ArtifactManifest(manifest_path=manifest_path, project_dir=self.project_dir)
+        self.assertEqual([os.path.join(self.project_dir, 'mod.c')], manifest.remove(pyx_fullpath=self.pyx_path, kinds=['c']))
+        # a moved annotation replaces the old path, which is stale from then on
+        manifest.record(pyx_fullpath=self.pyx_path, kind='html', path=os.path.join(self.project_dir, 'ext', 'mod.html'))
+        self.assertEqual(['mod.html'], manifest.stale)
+        # the bundle is in use until no module links to it anymore
+        manifest.retire(pyx_fullpath=self.pyx_path, kinds=['bundle abi'])
+        self.assertEqual([os.path.join(self.project_dir, 'mod.html')], manifest.remove_stale())
+        self.assertTrue(os.path.isfile(bundle))
+
+        os.remove(other_pyx_path)
+        self.assertEqual([other_pyx_path], manifest.orphans())
+        self.assertEqual(sorted([os.path.join(self.project_dir, 'other.so'), bundle]), sorted(manifest.remove(pyx_fullpath=other_pyx_path)))
+        self.assertEqual([self.pyx_path], manifest.targets())
+        self.assertEqual(os.path.join(self.project_dir, 'ext', 'mod.html'), manifest.path_of(pyx_fullpath=self.pyx_path, kind='html'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import dataclasses
+import importlib.util
+import os
+import shutil
+import sys
+import unittest
+
+from concurrent.futures.process import BrokenProcessPool
+
+from src.cythonbuilder import appsettings
+from src.cythonbuilder.build_manifest import artifact_path
+from src.cythonbuilder.builder import Builder, BuildOptions
+
+from .helpers import ProjectTestCase
+
+
+@unittest.skipUnless(importlib.util.find_spec('Cython') is not None, "Cython is not installed")
+class TestBuilder(ProjectTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.write('broken.pyx', "cpdef int add(int a, int b):\n    return a +\n")
+        self.write('add.pyx', "cpdef int add(int a, int b):\n    return a + b\n")
+        self.write('sub.pyx', "cpdef int sub(int a, int b):\n    return a - b\n")
+
+    def test_failures_are_results(self):
+        argv = list(sys.argv)
+        with Builder(project_dir=self.project_dir, jobs=1) as builder:
+            for _ in range(2):
+                result = builder.build(targets=['broken.pyx', 'missing.pyx'], options=BuildOptions(create_annotations=False))
+                self.assertFalse(result.ok)
+                self.assertEqual(['failed', 'missing'], [t.status for t in result.targets])
+                broken = result.targets[0]
+                self.assertEqual(os.path.join(self.project_dir, 'broken.pyx'), broken.file)
+                self.assertIsNone(broken.artifact)
+                self.assertIn('CompileError', broken.error)
+                self.assertIn('broken.pyx:2', broken.diagnostics)
+                self.assertEqual([broken.file], list(result.failures))
+                self.assertEqual([], result.built_files)
+        self.assertEqual(argv, sys.argv)
+
+    def test_build(self):
+        targets = [os.path.join(self.project_dir, 'add.pyx'), os.path.join(self.project_dir, 'sub.pyx')]
+        options = BuildOptions(create_annotations=False, compiler_cache='none', artifact_cache='none')
+        with Builder(project_dir=self.project_dir, jobs=2) as builder:
+            self.assertEqual(sorted(targets + [os.path.join(self.project_dir, 'broken.pyx')]), builder.list_targets())
+
+            result = builder.build(targets=['add.pyx', 'sub.pyx'], options=options)
+            self.assertTrue(result.ok)
+            self.assertEqual(targets, result.built_files)
+            self.assertEqual({}, result.failures)
+            self.assertGreater(result.duration, 0)
+            for target, pyx_fullpath in zip(result.targets, targets):
+                self.assertEqual(pyx_fullpath, target.file)
+                self.assertEqual('built', target.status)
+                self.assertEqual(artifact_path(pyx_fullpath=pyx_fullpath), target.artifact)
+                self.assertTrue(os.path.isfile(target.artifact))
+                self.assertIsNone(target.error)
+                self.assertGreater(target.duration, 0)
+                self.assertGreater(target.c_size, 0)
+                self.assertEqual([], target.warnings)
+
+            result = builder.build(targets=['add.pyx', 'sub.pyx'], options=options)
+            self.assertTrue(result.ok)
+            self.assertEqual(['up to date', 'up to date'], [t.status for t in result.targets])
+            self.assertEqual([artifact_path(pyx_fullpath=n) for n in targets], [t.artifact for t in result.targets])
+            self.assertEqual([], result.built_files)
+
+            # a worker that died breaks the pool; the next build starts new workers
+            for process in list(builder._pool._processes.values()):
+                process.kill()
+            with self.assertRaises(BrokenProcessPool):
+                builder._pool.submit(os.getpid).result(timeout=60)
+            result = builder.build(targets=['add.pyx', 'sub.pyx'], options=dataclasses.replace(options, force=True))
+            self.assertEqual(['built', 'built'], [t.status for t in result.targets])
+
+
+    def test_build_folder_removed_between_builds(self):
+        # distutils would remember the folders of the first build as created
+        options = BuildOptions(create_annotations=False, compiler_cache='none', artifact_cache='none', force=True)
+        with Builder(project_dir=self.project_dir, jobs=1) as builder:
+            self.assertTrue(builder.build(targets=['add.pyx'], options=options).ok)
+            shutil.rmtree(os.path.join(self.project_dir, appsettings.cython_build_root))
+            result = builder.build(targets=['add.pyx'], options=options)
+            self.assertEqual(['built'], [t.status for t in result.targets], result.targets[0].error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from unittest import mock
+
+from typer.testing import CliRunner
+
+from src.cythonbuilder import cli, cython_builder
+
+from .helpers import ProjectTestCase
+
+
+class TestCli(ProjectTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.pyx = self.write('trained.pyx', "x = 1\n")
+        self.runner = CliRunner()
+
+    def test_pgo_rejects_options_it_cannot_honour(self):
+        with mock.patch.object(cython_builder, 'cy_pgo') as cy_pgo:
+            result = self.runner.invoke(cli.app, ['build', '--pgo', 'python train.py', '--instrument', '--artifact-cache', 'none', '-y'])
+        self.assertEqual(2, result.exit_code)
+        # typer may draw a box around the message
+        self.assertIn("cannot be combined with --instrument, --artifact-cache", " ".join(result.output.replace('│', ' ').split()))
+        cy_pgo.assert_not_called()
+
+    def test_pgo_passes_build_options(self):
+        with mock.patch.object(cython_builder, 'cy_pgo', return_value={'training': 1.0}) as cy_pgo:
+            result = self.runner.invoke(cli.app, ['build', '--pgo', 'python train.py', '--bundle', '--small', '--no-openmp', '--no-interface', '-y'])
+        self.assertEqual(0, result.exit_code, result.output)
+        kwargs = cy_pgo.call_args.kwargs
+        self.assertEqual(('python train.py', [self.pyx]), (kwargs['training_command'], kwargs['target_files']))
+        self.assertEqual((True, True, False), (kwargs['bundle'], kwargs['small'], kwargs['openmp']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+from dataclasses import astuple
+
+from src.cythonbuilder.compiler_cache import CacheStats, ObjectCache, install_compiler_cache, read_dependency_file, resolve_compiler_cache
+
+
+class TestCompilerCache(unittest.TestCase):
+
+    def test_resolve(self):
+        self.assertEqual('none', resolve_compiler_cache(name='none'))
+        self.assertIn(resolve_compiler_cache(), ('ccache', 'sccache', 'builtin'))
+        with self.assertRaises(ValueError):
+            resolve_compiler_cache(name='distcc')
+
+    def test_store_fetch_evict(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache = ObjectCache(cache_dir=os.path.join(folder, 'cache'), max_size=10)
+            obj_path = os.path.join(folder, 'a.o')
+            for i, key in enumerate(['aa11', 'bb22', 'cc33']):
+                with open(obj_path, 'wb') as f:
+                    f.write(bytes([i]) * 4)
+                cache.store(key=key, obj_path=obj_path)
+                os.utime(cache._path(key=key), ns=(i * 10**9, i * 10**9))
+            self.assertFalse(cache.fetch(key='dd44', obj_path=obj_path))
+            # a hit makes the oldest object the most recently used
+            self.assertTrue(cache.fetch(key='aa11', obj_path=obj_path))
+            with open(obj_path, 'rb') as f:
+                self.assertEqual(bytes([0]) * 4, f.read())
+
+            self.assertEqual(1, cache.evict())
+            self.assertFalse(os.path.isfile(cache._path(key='bb22')))
+            self.assertTrue(os.path.isfile(cache._path(key='aa11')))
+
+    def test_key_follows_source_and_flags(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache = ObjectCache(cache_dir=folder)
+            src = os.path.join(folder, 'a.c')
+            with open(src, 'w') as f:
+                f.write('#define N 1\nint f(void) { return N; }\n')
+            key = cache.key(compiler_cmd=['gcc'], src=src, compile_args=['-c', '-O2'])
+            self.assertEqual(key, cache.key(compiler_cmd=['gcc'], src=src, compile_args=['-c', '-O2']))
+            self.assertNotEqual(key, cache.key(compiler_cmd=['gcc'], src=src, compile_args=['-c', '-O3']))
+            with open(src, 'w') as f:
+                f.write('#define N 1\n\nint f(void) { return 2; }\n')
+            self.assertNotEqual(key, cache.key(compiler_cmd=['gcc'], src=src, compile_args=['-c', '-O2']))
+            self.assertIsNone(cache.key(compiler_cmd=['gcc'], src=os.path.join(folder, 'missing.c'), compile_args=[]))
+
+    def test_read_dependency_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            dependency_path = os.path.join(folder, 'a.o.d')
+            with open(dependency_path, 'w') as f:
+                f.write(f"{folder}/a.o: {folder}/a.c /usr/include/stdio.h \\\n {folder}/my\\ header.h\n")
+            self.assertEqual(sorted([os.path.join(folder, 'my header.h'), '/usr/include/stdio.h']),
+                             read_dependency_file(dependency_path=dependency_path, src=os.path.join(folder, 'a.c')))
+            self.assertFalse(os.path.exists(dependency_path))
+            self.assertIsNone(read_dependency_file(dependency_path=dependency_path, src=os.path.join(folder, 'a.c')))
+
+    @unittest.skipIf(shutil.which('gcc') is None, "needs gcc")
+    def test_builtin_cache_follows_headers(self):
+        from distutils.ccompiler import new_compiler
+        from distutils.sysconfig import customize_compiler
+
+        with tempfile.TemporaryDirectory() as folder:
+            src = os.path.join(folder, 'a.c')
+            header = os.path.join(folder, 'a.h')
+            with open(src, 'w') as f:
+                f.write('#include "a.h"\nint f(void) { return N; }\n')
+
+            def compile_with_header(value:int) -> CacheStats:
+                with open(header, 'w') as f:
+                    f.write(f"#define N {value}\n")
+                compiler = new_compiler()
+                customize_compiler(compiler)
+                stats = CacheStats(backend='builtin')
+                install_compiler_cache(compiler=compiler, backend='builtin', cache_dir=os.path.join(folder, 'cache'), stats=stats)
+                compiler.compile([src], output_dir=os.path.join(folder, 'build'))
+                return stats
+
+            self.assertEqual((0, 1), astuple(compile_with_header(value=1))[1:3])
+            self.assertEqual((1, 0), astuple(compile_with_header(value=1))[1:3])
+            # same source and flags, but a changed header
+            self.assertEqual((0, 1), astuple(compile_with_header(value=2))[1:3])
+            self.assertEqual((1, 0), astuple(compile_with_header(value=1))[1:3])
+            self.assertEqual([], [f for f in os.listdir(os.path.join(folder, 'build', folder.lstrip(os.sep))) if (f.endswith('.d'))])
+
+    def test_stats(self):
+        stats = CacheStats(backend='builtin')
+        stats.add(hits=3)
+        stats.add(misses=1)
+        self.assertEqual("compiler cache (builtin): 3 hits, 1 misses, 75% hit rate", str(stats))
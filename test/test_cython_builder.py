@@ -0,0 +1,222 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from src.cythonbuilder import builder, cython_builder
+from src.cythonbuilder import appsettings
+from src.cythonbuilder.build_manifest import ArtifactManifest, abi_tag, artifact_path
+from src.cythonbuilder.profiles import check_pgo_support
+
+from .helpers import ProjectTestCase
+
+
+class TestCyList(ProjectTestCase):
+
+    def test_list_leaves_the_project_alone(self):
+        pyx = self.write('pkg/mod.pyx', "x = 1\n")
+        self.assertEqual([pyx], cython_builder.cy_list())
+        self.assertEqual(['pkg'], os.listdir(self.project_dir))
+
+        # the discovery index is kept once a build created ext/
+        cython_builder.cy_init()
+        self.assertEqual([pyx], cython_builder.cy_list())
+        self.assertTrue(os.path.isfile(os.path.join(self.project_dir, appsettings.cython_discovery_index_path)))
+
+
+@unittest.skipUnless(importlib.util.find_spec('Cython') is not None, "Cython is not installed")
+class TestCyBuild(ProjectTestCase):
+
+    def test_parallel_build_collects_failures(self):
+        good = self.write('good.pyx', "cpdef int add(int a, int b):\n    return a + b\n")
+        broken = self.write('broken.pyx', "cpdef int add(int a, int b):\n    return a +\n")
+        with self.assertRaises(cython_builder.CythonBuildError) as context:
+            cython_builder.cy_build(target_files=[good, broken], create_annotations=False, jobs=2, compiler_cache='none', artifact_cache='none')
+        self.assertEqual([broken], list(context.exception.failures))
+        self.assertIn('CompileError', context.exception.failures[broken])
+        self.assertEqual([good], context.exception.built_files)
+        self.assertTrue(os.path.isfile(artifact_path(pyx_fullpath=good)))
+        self.assertFalse(os.path.isfile(artifact_path(pyx_fullpath=broken)))
+
+    def test_persistent_build_dir(self):
+        pyx = self.write('pkg/calc.pyx', "cpdef int add(int a, int b):\n    return a + b\n")
+        cython_builder.cy_build(create_annotations=False, jobs=1, profile='release', compiler_cache='none', artifact_cache='none')
+        build_dir = os.path.join(self.project_dir, appsettings.cython_build_root, abi_tag(), 'release')
+        object_files = [n for _, _, files in os.walk(os.path.join(build_dir, 'temp')) for n in files if (n.endswith('.o'))]
+        self.assertEqual(['calc.o'], object_files)
+
+        # the extension is installed next to the pyx file, and the build folder survives a clean
+        extension = artifact_path(pyx_fullpath=pyx)
+        self.assertEqual(os.path.dirname(pyx), os.path.dirname(extension))
+        self.assertTrue(os.path.isfile(extension))
+        cython_builder.cy_clean()
+        self.assertTrue(os.path.isdir(build_dir))
+        self.assertTrue(os.path.isfile(extension))
+
+        self.write('pyproject.toml', '[tool.cythonbuilder]\nbuild_dir = "out/objects"\n')
+        cython_builder.cy_build(create_annotations=False, jobs=1, force=True, compiler_cache='none', artifact_cache='none')
+        self.assertTrue(os.path.isdir(os.path.join(self.project_dir, 'out', 'objects', abi_tag(), 'default', 'temp')))
+        self.assertFalse(os.path.exists(os.path.join(self.project_dir, appsettings.cython_build_root, abi_tag(), 'default')))
+
+
+@unittest.skipUnless(importlib.util.find_spec('Cython') is not None and os.name != 'nt', "Cython is not installed; bundles need symlinks")
+class TestCyClean(ProjectTestCase):
+
+    def test_bundles_and_same_named_modules(self):
+        for relpath in ['pkg/__init__.py', 'pkg/util/__init__.py', 'other/__init__.py']:
+            self.write(relpath, "")
+        self.write('pkg/calc.pyx', "cpdef int add(int a, int b):\n    return a + b\n")
+        self.write('pkg/util/text.pyx', "cpdef str shout(str s):\n    return s.upper()\n")
+        self.write('other/calc.pyx', "def mul(a, b):\n    return a * b\n")
+        built_files = cython_builder.cy_build(bundle=True, compiler_cache='none', artifact_cache='none', jobs=1)
+        self.assertEqual(3, len(built_files))
+        cython_builder.cy_clean()
+
+        # the modules of a package share one library, and import from it
+        completed = subprocess.run([sys.executable, '-c', "import pkg.calc, pkg.util.text, other.calc; print(pkg.calc.add(1, 2), pkg.util.text.shout('a'), other.calc.mul(2, 3))"],
+                                   cwd=self.project_dir, capture_output=True, text=True)
+        self.assertEqual('', completed.stderr)
+        self.assertEqual("3 A 6", completed.stdout.strip())
+
+        # every module keeps its own annotation
+        annotations_dir = os.path.join(self.project_dir, appsettings.cython_anno_dirname)
+        self.assertEqual(['other.calc.html', 'pkg.calc.html', 'pkg.util.text.html'], sorted(os.listdir(annotations_dir)))
+        self.assertEqual({'other/calc.pyx', 'pkg/calc.pyx', 'pkg/util/text.pyx'}, {l.file for l in cython_builder.cy_hotspots().lines})
+
+
+class TestCyInterface(ProjectTestCase):
+
+    def test_unchanged_pyi_is_not_rewritten(self):
+        pyx = self.write('calc.pyx', "cpdef int add(int a, int b):\n    return a + b\n")
+        pyi = os.path.join(self.project_dir, 'calc.pyi')
+        self.assertEqual([pyi], cython_builder.cy_interface(target_files=[pyx], jobs=1))
+        self.assertIn('def add(', open(pyi).read())
+        os.utime(pyi, ns=(0, 1_000_000_000))
+
+        # skipped by the manifest, and with [force] generated but identical
+        self.assertEqual([], cython_builder.cy_interface(target_files=[pyx], jobs=1))
+        self.assertEqual([], cython_builder.cy_interface(target_files=[pyx], jobs=1, force=True))
+        self.assertEqual(1_000_000_000, os.stat(pyi).st_mtime_ns)
+
+        self.write('calc.pyx', "cpdef int add(int a, int b):\n    return a + b\n\ncpdef int sub(int a, int b):\n    return a - b\n")
+        self.assertEqual([pyi], cython_builder.cy_interface(target_files=[pyx], jobs=1))
+        self.assertIn('def sub(', open(pyi).read())
+        self.assertNotEqual(1_000_000_000, os.stat(pyi).st_mtime_ns)
+
+    def test_parallel(self):
+        pyx_files = [self.write(f"mod{i}.pyx", f"cpdef int f{i}(int a):\n    return a\n") for i in range(3)]
+        written = cython_builder.cy_interface(target_files=pyx_files, jobs=2)
+        self.assertEqual(sorted(f"{os.path.splitext(n)[0]}.pyi" for n in pyx_files), sorted(written))
+        self.assertEqual([], cython_builder.cy_interface(target_files=pyx_files, jobs=2))
+
+    def test_jobs(self):
+        pyx = self.write('calc.pyx', "x = 1\n")
+        with self.assertRaises(ValueError):
+            cython_builder.cy_interface(target_files=[pyx], jobs=0)
+
+
+class TestCyHotspots(ProjectTestCase):
+
+    def test_annotations_from_manifest(self):
+        # same module name in two packages; only the manifest tells which annotation belongs to which
+        pyx_a = self.write('pkg_a/mod.pyx', "x = 1\n")
+        pyx_b = self.write('pkg_b/mod.pyx', "x = 2\n")
+        self.write('pkg_c/mod.pyx', "x = 3\n")
+        manifest = ArtifactManifest(manifest_path=os.path.join(self.project_dir, appsettings.cython_artifact_manifest_path), project_dir=self.project_dir)
+        for pyx_fullpath, html_relpath, score in [(pyx_a, 'ext/annotations/a.html', 5), (pyx_b, 'pkg_b/mod.html', 7)]:
+            html_path = self.write(html_relpath, f'<pre class="cython line score-{score}">+<span class="">1</span>: x = 1</pre>')
+            manifest.record(pyx_fullpath=pyx_fullpath, kind='html', path=html_path)
+        manifest.save()
+
+        report = cython_builder.cy_hotspots()
+        self.assertEqual([('pkg_b/mod.pyx', 7), ('pkg_a/mod.pyx', 5)], [(l.file, l.score) for l in report.ranked(by='line')])
+
+
+def _has_gcc() -> bool:
+    try:
+        check_pgo_support()
+    except ValueError:
+        return False
+    return True
+
+
+@unittest.skipUnless(importlib.util.find_spec('Cython') is not None and _has_gcc(), "PGO builds need Cython and gcc")
+class TestCyPgo(ProjectTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.pyx = self.write('trained.pyx', "cpdef int add(int a, int b):\n    return a + b\n")
+
+    def extension_paths(self) -> [str]:
+        manifest = ArtifactManifest(manifest_path=os.path.join(self.project_dir, appsettings.cython_artifact_manifest_path), project_dir=self.project_dir)
+        return [manifest.path_of(pyx_fullpath=self.pyx, kind=f"extension {abi_tag()}")]
+
+    def test_pgo(self):
+        training_command = f'"{sys.executable}" -c "import trained; trained.add(1, 2)"'
+        timings = cython_builder.cy_pgo(training_command=training_command, create_annotations=False, jobs=1)
+        self.assertEqual(['instrumented build', 'training', 'optimized build'], list(timings))
+        self.assertTrue(os.path.isfile(artifact_path(pyx_fullpath=self.pyx)))
+        self.assertEqual([artifact_path(pyx_fullpath=self.pyx)], self.extension_paths())
+        self.assertFalse(os.path.exists(os.path.join(self.project_dir, appsettings.cython_pgo_dirname)))
+
+    def test_failed_training_removes_instrumented_extensions(self):
+        for training_command in ['exit 3', 'echo "imports nothing"']:
+            with self.assertRaises(ValueError):
+                cython_builder.cy_pgo(training_command=training_command, create_annotations=False, jobs=1)
+            self.assertFalse(os.path.exists(os.path.join(self.project_dir, appsettings.cython_pgo_dirname)))
+            self.assertFalse(os.path.exists(artifact_path(pyx_fullpath=self.pyx)))
+            self.assertFalse(os.path.exists(f"{os.path.splitext(self.pyx)[0]}.c"))
+            self.assertEqual([None], self.extension_paths())
+
+        # a regular build replaces them again
+        self.assertEqual([self.pyx], cython_builder.cy_build(target_files=[self.pyx], create_annotations=False, jobs=1, compiler_cache='none', artifact_cache='none'))
+
+
+@unittest.skipUnless(importlib.util.find_spec('Cython') is not None, "Cython is not installed")
+class TestCyWatch(ProjectTestCase):
+
+    def test_rebuilds_affected_files(self):
+        shared = self.write('shared.pxi', "cdef int OFFSET = 1\n")
+        uses_shared = self.write('uses_shared.pyx', 'include "shared.pxi"\n\ncpdef int shift(int a):\n    return a + OFFSET\n')
+        standalone = self.write('standalone.pyx', "cpdef int double(int a):\n    return 2 * a\n")
+
+        builders = []
+
+        class RecordedBuilder(builder.Builder):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                builders.append(self)
+
+        with mock.patch.object(builder, 'Builder', RecordedBuilder):
+            rebuilds = cython_builder.cy_watch(create_annotations=False, generate_pyi=False, jobs=2, compiler_cache='none', use_polling=True, poll_interval=0.05, debounce=0.1)
+            try:
+                first = next(rebuilds)
+                self.assertEqual([], first.changed_files)
+                self.assertEqual({uses_shared, standalone}, set(first.built_files))
+                pool = builders[0]._pool
+
+                # an include file rebuilds the pyx files that include it, and only those
+                self.write('shared.pxi', "cdef int OFFSET = 2\n")
+                rebuild = next(rebuilds)
+                self.assertEqual([shared], rebuild.changed_files)
+                self.assertEqual([uses_shared], rebuild.built_files)
+                self.assertEqual({}, rebuild.failures)
+
+                self.write('standalone.pyx', "cpdef int double(int a):\n    return a + a\n")
+                rebuild = next(rebuilds)
+                self.assertEqual([standalone], rebuild.changed_files)
+                self.assertEqual([standalone], rebuild.built_files)
+
+                # one builder, and so one set of worker processes, for the whole session
+                self.assertEqual(1, len(builders))
+                self.assertIsNotNone(pool)
+                self.assertIs(pool, builders[0]._pool)
+            finally:
+                rebuilds.close()
+        self.assertIsNone(builders[0]._pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import unittest
+
+from src.cythonbuilder.dependencies import DependencyGraph, dotted_module_name, parse_dependency_statements, top_package
+
+from .helpers import ProjectTestCase
+
+
+class TestDependencies(ProjectTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.files = {
+            'pkg/__init__.py': "",
+            'pkg/base.pxd': "cdef int base_value()\n",
+            'pkg/mid.pxd': "from pkg.base cimport base_value\n",
+            'pkg/mid.pyx': "cdef int mid_value():\n    return 1\n",
+            'pkg/top.pyx': "from pkg.mid cimport mid_value  # comment\nfrom libc.math cimport sqrt\ninclude 'consts.pxi'\n",
+            'pkg/consts.pxi': "DEF VALUE = 1\n",
+            'pkg/other.pyx': "cimport pkg.base as b\n",
+            'pkg/lonely.pyx': "import os\n",
+        }
+        for relpath, content in self.files.items():
+            self.write(relpath, content)
+        self.graph = DependencyGraph(project_dir=self.project_dir)
+        for relpath in self.files:
+            if (relpath.endswith('.pyx')):
+                self.graph.add_file(filepath=self.path(relpath))
+
+    def path(self, relpath:str) -> str:
+        return os.path.join(self.project_dir, *relpath.split('/'))
+
+    def test_parse_statements(self):
+        lines = ["cimport a.b as c, d", "from .x cimport (y, z)", "include \"f.pxi\"", "cdef extern from 'h.h':", "import os"]
+        expected = [('cimport', 'a.b'), ('cimport', 'd'), ('from', ('.', 'x', ['y', 'z'])), ('include', 'f.pxi'), ('extern', 'h.h')]
+        self.assertEqual(expected, parse_dependency_statements(lines=lines))
+
+    def test_transitive_dependencies(self):
+        expected = sorted([self.path('pkg/mid.pxd'), self.path('pkg/base.pxd'), self.path('pkg/consts.pxi')])
+        self.assertEqual(expected, self.graph.transitive_dependencies(filepath=self.path('pkg/top.pyx')))
+        self.assertEqual([], self.graph.transitive_dependencies(filepath=self.path('pkg/lonely.pyx')))
+
+    def test_rebuild_set(self):
+        all_but_lonely = sorted([self.path('pkg/mid.pyx'), self.path('pkg/top.pyx'), self.path('pkg/other.pyx')])
+        self.assertEqual(all_but_lonely, self.graph.rebuild_set(changed_files=[self.path('pkg/base.pxd')]))
+        self.assertEqual([self.path('pkg/top.pyx')], self.graph.rebuild_set(changed_files=[self.path('pkg/consts.pxi')]))
+        self.assertEqual([self.path('pkg/lonely.pyx')], self.graph.rebuild_set(changed_files=[self.path('pkg/lonely.pyx')]))
+
+    def test_module_names(self):
+        self.write('pkg/sub/__init__.py')
+        self.assertEqual('pkg.top', dotted_module_name(filepath=self.path('pkg/top.pyx')))
+        self.assertEqual('pkg.sub.deep', dotted_module_name(filepath=self.path('pkg/sub/deep.pyx')))
+        self.assertEqual('script', dotted_module_name(filepath=self.path('script.pyx')))
+        self.assertEqual(self.path('pkg'), top_package(folderpath=self.path('pkg/sub')))
+        self.assertIsNone(top_package(folderpath=self.project_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
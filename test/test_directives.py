@@ -0,0 +1,44 @@
+import os
+import unittest
+
+from src.cythonbuilder.directives import expand_directives, resolve_directives
+
+
+class TestDirectives(unittest.TestCase):
+
+    def test_expand(self):
+        self.assertEqual({}, expand_directives(value=None, source='test'))
+        fast = expand_directives(value='fast', source='test')
+        self.assertFalse(fast['boundscheck'])
+        self.assertTrue(fast['cdivision'])
+        mixed = expand_directives(value='fast,boundscheck=True,language_level=3', source='test')
+        self.assertTrue(mixed['boundscheck'])
+        self.assertFalse(mixed['wraparound'])
+        self.assertEqual('3', mixed['language_level'])
+
+        with self.assertRaises(ValueError):
+            expand_directives(value='turbo', source='test')
+        with self.assertRaises(ValueError):
+            expand_directives(value={'boundchek': False}, source='test')
+
+    def test_resolve_order(self):
+        project_dir = os.path.abspath('proj')
+        config = {
+            'directives': 'safe',
+            'file_directives': {'pkg/kernels/*.pyx': 'fast', 'pkg/kernels/checked.pyx': {'boundscheck': True}},
+        }
+        other = resolve_directives(pyx_fullpath=os.path.join(project_dir, 'pkg', 'other.pyx'), project_dir=project_dir, config=config)
+        self.assertTrue(other['boundscheck'])
+        self.assertFalse(other['cdivision'])
+
+        kernel = resolve_directives(pyx_fullpath=os.path.join(project_dir, 'pkg', 'kernels', 'dot.pyx'), project_dir=project_dir, config=config)
+        self.assertFalse(kernel['boundscheck'])
+        checked = resolve_directives(pyx_fullpath=os.path.join(project_dir, 'pkg', 'kernels', 'checked.pyx'), project_dir=project_dir, config=config)
+        self.assertTrue(checked['boundscheck'])
+        self.assertFalse(checked['wraparound'])
+
+        # the command line overrides project and profile, but not per-file settings
+        cli = resolve_directives(pyx_fullpath=os.path.join(project_dir, 'pkg', 'other.pyx'), project_dir=project_dir, config=config,
+                                 profile_directives={'cdivision': False}, cli_directives='fast')
+        self.assertFalse(cli['boundscheck'])
+        self.assertTrue(cli['cdivision'])
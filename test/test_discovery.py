@@ -0,0 +1,82 @@
+import os
+import unittest
+
+from src.cythonbuilder.discovery import DiscoveryIndex, GitIgnore, walk_project
+
+from .helpers import ProjectTestCase
+
+
+class TestDiscovery(ProjectTestCase):
+
+    def test_prunes_venvs_excludes_and_gitignore(self):
+        expected = [
+            self.write('a.pyx'),
+            self.write('pkg/b.pyx'),
+            self.write('pkg/generated/keep.pyx'),
+        ]
+        self.write('pkg/b.py')
+        self.write('myenv/pyvenv.cfg')
+        self.write('myenv/lib/site-packages/dep.pyx')
+        self.write('node_modules/x.pyx')
+        self.write('.git/y.pyx')
+        self.write('ignored_dir/z.pyx')
+        self.write('pkg/generated/skip.pyx')
+        self.write('.gitignore', 'ignored_dir/\n')
+        self.write('pkg/.gitignore', 'generated/*.pyx\n!generated/keep.pyx\n')
+        self.assertEqual(sorted(expected), walk_project(project_dir=self.project_dir))
+
+    def test_custom_exclude_replaces_defaults(self):
+        found = walk_project(project_dir=self.project_dir, exclude=['pkg*'])
+        self.assertEqual([], found)
+        expected = [self.write('node_modules/x.pyx')]
+        self.write('pkg_a/x.pyx')
+        self.assertEqual(expected, walk_project(project_dir=self.project_dir, exclude=['pkg*']))
+
+    def test_gitignore_patterns(self):
+        gitignore = GitIgnore(base_dir='/p', lines=['*.pyx', '!keep.pyx', '/top/', 'a/**/b', '# comment'])
+        self.assertTrue(gitignore.match(fullpath='/p/x/y.pyx', is_dir=False))
+        self.assertFalse(gitignore.match(fullpath='/p/x/keep.pyx', is_dir=False))
+        self.assertTrue(gitignore.match(fullpath='/p/top', is_dir=True))
+        self.assertIsNone(gitignore.match(fullpath='/p/x/top', is_dir=True))
+        self.assertTrue(gitignore.match(fullpath='/p/a/x/y/b', is_dir=True))
+        self.assertTrue(gitignore.match(fullpath='/p/a/b', is_dir=True))
+
+    def age_folders(self) -> None:
+        """ Folders modified in the last seconds are always rescanned; pretend everything is old """
+        for folder, _, _ in os.walk(self.project_dir):
+            os.utime(folder, ns=(10**18, 10**18))
+
+    def test_index_rescans_only_changed_folders(self):
+        index_path = os.path.join(self.project_dir, 'index.json')
+        expected = [self.write('pkg/a.pyx'), self.write('pkg/sub/b.pxd'), self.write('other/c.pyx')]
+        self.write('myenv/pyvenv.cfg')
+        self.age_folders()
+
+        index = DiscoveryIndex(index_path=index_path, project_dir=self.project_dir, extensions=('.pyx', '.pxd'))
+        self.assertEqual(sorted(expected), index.walk())
+        index.save()
+
+        # Unchanged tree: only stats
+        index = DiscoveryIndex(index_path=index_path, project_dir=self.project_dir, extensions=('.pyx', '.pxd'))
+        index.load()
+        self.age_folders()
+        self.assertEqual(sorted(expected), index.walk())
+        self.assertEqual(0, index.rescanned_count)
+
+        # A new file only rescans its folder
+        expected.append(self.write('pkg/sub/d.pyx'))
+        self.assertEqual(sorted(expected), index.walk())
+        self.assertEqual(1, index.rescanned_count)
+
+        # Forced rescan
+        self.assertEqual(sorted(expected), index.walk(rescan=True))
+        self.assertEqual(len(index.folders), index.rescanned_count)
+
+        # Settings changed: cached folders are not used
+        other = DiscoveryIndex(index_path=index_path, project_dir=self.project_dir, extensions=('.pyx',))
+        other.load()
+        self.assertEqual({}, other.folders)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+
+from src.cythonbuilder.footprint import measure_footprint
+
+
+class TestFootprint(unittest.TestCase):
+
+    def test_measure(self):
+        with tempfile.TemporaryDirectory() as project_dir:
+            os.makedirs(os.path.join(project_dir, 'pkg'))
+            open(os.path.join(project_dir, 'pkg', '__init__.py'), 'w').close()
+            pyx_path = os.path.join(project_dir, 'pkg', 'mod.pyx')
+            # a plain Python module stands in for the extension; it is imported the same way
+            module_path = os.path.join(project_dir, 'pkg', 'mod_copy.py')
+            for path in [pyx_path, module_path]:
+                with open(path, 'w') as f:
+                    f.write("import sys\nassert __name__ == 'pkg.mod'\nVALUE = 1\n")
+
+            footprint = measure_footprint(pyx_fullpath=pyx_path, extension_path=module_path, repeats=2)
+            self.assertEqual(os.path.getsize(module_path), footprint.size)
+            self.assertGreater(footprint.import_time, 0)
+
+            with open(module_path, 'a') as f:
+                f.write("raise ImportError('broken')\n")
+            self.assertIsNone(measure_footprint(pyx_fullpath=pyx_path, extension_path=module_path, repeats=1).import_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
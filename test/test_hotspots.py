@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from src.cythonbuilder.hotspots import hotspot_report
+
+_ONCLICK = "(function(f,s,c){c=f.nodeValue=='+';s.display=c?'block':'none';f.nodeValue=c?'−':'+'})(this.firstChild,this.nextElementSibling.style)"
+_SOURCE = [
+    (8, 'cdef class Acc:'),
+    (0, '    cdef double total'),
+    (0, ''),
+    (38, '    def add(self, values):'),
+    (48, '        for v in values:'),
+    (0, '    # comment'),
+    (22, '        return self.total'),
+    (0, ''),
+    (0, 'cdef inline double sq(double x) nogil:'),
+    (0, '    return x * x &lt; 3'),
+    (5, 'x = 1'),
+]
+
+
+def _annotation_html() -> str:
+    lines = []
+    for lineno, (score, code) in enumerate(_SOURCE, start=1):
+        lines.append(f'<pre class="cython line score-{score}" onclick="{_ONCLICK}">+<span class="">{lineno:02}</span>: <span class="n">{code}</span></pre>')
+        lines.append(f"<pre class='cython code score-{score} '>__pyx_t_1 = PyNumber_Add(...);</pre>")
+    return '<body class="cython"><div class="cython">' + "\n".join(lines) + '</div></body>'
+
+
+class TestHotspots(unittest.TestCase):
+
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as folder:
+            html_path = os.path.join(folder, 'hot.html')
+            with open(html_path, 'w', encoding='UTF-8') as f:
+                f.write(_annotation_html())
+            report = hotspot_report(annotations={html_path: 'pkg/hot.pyx'})
+
+        self.assertEqual(len(_SOURCE), len(report.lines))
+        self.assertEqual(121, report.to_dict()['total_score'])
+        worst = report.ranked(by='line', top=2)
+        self.assertEqual([('pkg/hot.pyx', 5, 'Acc.add', 'for v in values:'), ('pkg/hot.pyx', 4, 'Acc.add', 'def add(self, values):')],
+                         [(l.file, l.line, l.function, l.code) for l in worst])
+        self.assertEqual('return x * x < 3', report.lines[9].code)
+        self.assertEqual('sq', report.lines[9].function)
+        self.assertIsNone(report.lines[10].function)
+
+        functions = report.ranked(by='function')
+        self.assertEqual(['Acc.add', 'Acc'], [f.function for f in functions])
+        self.assertEqual((108, 3, 5), (functions[0].score, functions[0].lines, functions[0].worst_line))
+        with self.assertRaises(ValueError):
+            report.ranked(by='file')
@@ -0,0 +1,39 @@
+import unittest
+
+from src.cythonbuilder.openmp import cimports_openmp, nogil_prange_lines, uses_openmp
+
+from .helpers import ProjectTestCase
+
+
+class TestOpenMP(ProjectTestCase):
+
+    def test_uses_openmp(self):
+        self.assertTrue(uses_openmp(filepaths=[self.write('a.pyx', "from cython.parallel cimport prange\n")]))
+        self.assertTrue(uses_openmp(filepaths=[self.write('b.pyx', "cimport cython\ncdef f():\n    for i in cython.parallel.prange(3, nogil=True):\n        pass\n")]))
+        self.assertTrue(uses_openmp(filepaths=[self.write('c.pyx', "include 'd.pxi'\n"), self.write('d.pxi', "cimport openmp\n")]))
+        self.assertTrue(uses_openmp(filepaths=[self.write('h.pyx', "from openmp cimport omp_get_thread_num\n")]))
+        self.assertTrue(uses_openmp(filepaths=[self.write('i.pyx', "from cython cimport parallel\n")]))
+        self.assertFalse(uses_openmp(filepaths=[self.write('e.pyx', "# from cython.parallel cimport prange\nx = 'parallel'\n")]))
+        # a name that merely contains the word is not OpenMP
+        self.assertFalse(uses_openmp(filepaths=[self.write('j.pyx', "openmp = False\ndef configure(self, openmp=True):\n    self.openmp = openmp\n")]))
+
+    def test_nogil_prange_lines(self):
+        path = self.write('f.pyx', "\n".join([
+            "from cython.parallel cimport prange",
+            "cimport openmp",
+            "def f(double[:] xs):",
+            "    with nogil:",
+            "        for i in prange(3):",
+            "            pass",
+            "    for i in prange(3):",
+            "        pass",
+            "    for i in prange(3, nogil=True):",
+            "        pass",
+        ]))
+        self.assertEqual([5, 9], nogil_prange_lines(filepath=path))
+        self.assertTrue(cimports_openmp(filepath=path))
+        self.assertFalse(cimports_openmp(filepath=self.write('g.pyx', "from cython.parallel cimport prange\n")))
+
+
+if __name__ == '__main__':
+    unittest.main()
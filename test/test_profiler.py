@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+
+from src.cythonbuilder.build_manifest import extension_suffix
+from src.cythonbuilder.profiler import FunctionProfile, InstrumentedFinder, LineProfile, ProfileReport
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_ranked(self):
+        report = ProfileReport(mode='function', functions=[
+            FunctionProfile(file='pkg/a.pyx', line=1, function='fast', calls=10, own_time=0.1, total_time=0.2),
+            FunctionProfile(file='pkg/a.pyx', line=5, function='slow', calls=10, own_time=0.5, total_time=0.5),
+        ])
+        self.assertEqual(['slow', 'fast'], [f.function for f in report.ranked()])
+        self.assertEqual(['slow'], [f['function'] for f in report.to_dict(top=1)['profile']])
+
+        content = {'mode': 'line', 'wall_time': 1.0, 'exit_code': 0, 'lines': [{'file': 'pkg/a.pyx', 'line': 2, 'hits': 3, 'time': 0.5}]}
+        report = ProfileReport.from_dict(content=content)
+        self.assertEqual([LineProfile(file='pkg/a.pyx', line=2, hits=3, time=0.5)], report.ranked())
+
+    def test_finder(self):
+        with tempfile.TemporaryDirectory() as install_dir:
+            so_path = os.path.join(install_dir, f"pkg.fast{extension_suffix()}")
+            open(so_path, 'w').close()
+            finder = InstrumentedFinder(install_dir=install_dir, extension_suffix=extension_suffix())
+            self.assertEqual(so_path, finder.find_spec(fullname='pkg.fast').origin)
+            self.assertIsNone(finder.find_spec(fullname='pkg.slow'))
+            self.assertIsNone(finder.find_spec(fullname='fast'))
+
+
+if __name__ == '__main__':
+    unittest.main()
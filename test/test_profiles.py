@@ -0,0 +1,74 @@
+import unittest
+
+from src.cythonbuilder.config import load_config
+from src.cythonbuilder.directives import resolve_directives
+from src.cythonbuilder.profiles import pgo_profiles, resolve_profile, small_variant
+
+from .helpers import ProjectTestCase
+
+
+class TestProfiles(ProjectTestCase):
+
+    def test_builtin_profiles(self):
+        self.assertEqual([], resolve_profile().extra_compile_args)
+        self.assertEqual('default', resolve_profile().name)
+        lto = resolve_profile(name='lto')
+        self.assertIn('-flto', lto.extra_compile_args)
+        self.assertIn('-flto', lto.extra_link_args)
+        with self.assertRaises(ValueError):
+            resolve_profile(name='does-not-exist')
+
+    def test_builtin_profile_directives(self):
+        pyx_fullpath = self.write('a.pyx')
+        for name in ['release', 'native', 'lto']:
+            directives = resolve_directives(pyx_fullpath=pyx_fullpath, project_dir=self.project_dir, profile_directives=resolve_profile(name=name).directives)
+            self.assertFalse(directives['boundscheck'], name)
+            self.assertFalse(directives['wraparound'], name)
+        # the default and debug builds keep Cython's checks
+        for name in ['default', 'debug']:
+            self.assertEqual({}, resolve_directives(pyx_fullpath=pyx_fullpath, project_dir=self.project_dir, profile_directives=resolve_profile(name=name).directives))
+
+    def test_small_variant(self):
+        release = resolve_profile(name='release')
+        small = small_variant(profile=release)
+        self.assertEqual('release-small', small.name)
+        self.assertEqual(release.extra_compile_args, small.extra_compile_args[:len(release.extra_compile_args)])
+        self.assertGreater(len(small.extra_link_args), len(release.extra_link_args))
+        self.assertNotEqual(release.fingerprint(), small.fingerprint())
+        # the profile itself is left alone
+        self.assertEqual(['-O3'], release.extra_compile_args)
+
+    def test_pgo_profiles(self):
+        release = resolve_profile(name='release')
+        generate, use = pgo_profiles(profile=release, profile_data_dir='/tmp/profile-data')
+        self.assertEqual('release+pgo-generate', generate.name)
+        self.assertEqual(['-O3', '-fprofile-generate=/tmp/profile-data'], generate.extra_compile_args)
+        self.assertEqual(['-fprofile-generate=/tmp/profile-data'], generate.extra_link_args[len(release.extra_link_args):])
+        self.assertEqual('release+pgo', use.name)
+        self.assertEqual(['-O3', '-fprofile-use=/tmp/profile-data', '-fprofile-correction', '-Wno-missing-profile'], use.extra_compile_args)
+        self.assertEqual(['-fprofile-use=/tmp/profile-data'], use.extra_link_args[len(release.extra_link_args):])
+        # an extension built with either variant is out of date for the others
+        self.assertNotEqual(release.fingerprint(), generate.fingerprint())
+        self.assertNotEqual(generate.fingerprint(), use.fingerprint())
+        self.assertEqual(['-O3'], release.extra_compile_args)
+
+    def test_profiles_from_pyproject(self):
+        self.write('pyproject.toml', '[tool.cythonbuilder]\nprofile = "fastmath"\n\n'
+                                     '[tool.cythonbuilder.profiles.fastmath]\nextra_compile_args = ["-O3", "-ffast-math"]\ndefine_macros = [["FAST", "1"]]\n')
+        config = load_config(project_dir=self.project_dir)
+
+        profile = resolve_profile(config=config)
+        self.assertEqual('fastmath', profile.name)
+        self.assertEqual(['-O3', '-ffast-math'], profile.extra_compile_args)
+        self.assertEqual([('FAST', '1')], profile.define_macros)
+        self.assertEqual('release', resolve_profile(name='release', config=config).name)
+
+        with self.assertRaises(ValueError):
+            resolve_profile(config={'profiles': {'bad': {'cflags': []}}})
+
+    def test_no_pyproject(self):
+        self.assertEqual({}, load_config(project_dir=self.project_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
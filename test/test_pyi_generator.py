@@ -169,6 +169,22 @@ if __name__ == "__main__":
         self.assertTrue("main" not in "".join(res))
         self.assertTrue("name" not in "".join(res))
 
+    def test_streams_lines(self):
+        pyd_class_regular = """
+cdef class MyClass(object):
+    test:str  # comment
+    cpdef test_cdef(self, long num) -> float:
+        return num * num
+"""
+        res_from_file = pyigenerator.pyx_to_pyi(open_pyx=load_io_text(lines=pyd_class_regular))
+        res_from_generator = pyigenerator.pyx_to_pyi(open_pyx=(line for line in pyd_class_regular.splitlines(keepends=True)))
+        self.assertEqual(['class MyClass(object):\n', '    test:str\n', '    def test_def(self, num:int) -> float:\n        ...\n'], res_from_file)
+        self.assertEqual(res_from_file, res_from_generator)
+
+    def test_no_indentation(self):
+        res = pyigenerator.pyx_to_pyi(open_pyx=load_io_text(lines="cimport numpy\ncdef int LIMIT = 10\n"))
+        self.assertEqual(['import numpy\n'], res)
+
 #         # 2. Converts regular function py-type arg types and return type
 #         pyd_function_no_arg_type = """
 # cpdef enum PluginType:
@@ -0,0 +1,53 @@
+import unittest
+
+from src.cythonbuilder import appsettings
+from src.cythonbuilder.scheduler import available_memory, estimate_costs, longest_first, memory_budget, next_unit
+
+MB = 1024 * 1024
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.small, self.large, self.new = ((('small.pyx',), None), (('large.pyx',), None), (('new.pyx',), None))
+        self.history = {
+            self.small: {'duration': 1.0, 'c_size': 300_000, 'peak_memory': 70 * MB},
+            self.large: {'duration': 9.0, 'c_size': 1_100_000, 'peak_memory': 200 * MB},
+            self.new: None,
+        }
+
+    def test_estimate(self):
+        costs = estimate_costs(units=[self.small, self.large, self.new], history=self.history, source_sizes={self.new: 10_000})
+        self.assertTrue(costs[self.large].from_history)
+        self.assertEqual(9.0, costs[self.large].duration)
+        self.assertEqual(200 * MB, costs[self.large].memory)
+        # a module never built before is estimated from the C it will generate, at the speed of the ones that were
+        self.assertFalse(costs[self.new].from_history)
+        self.assertGreater(costs[self.new].duration, costs[self.small].duration)
+        self.assertEqual(135 * MB, costs[self.new].memory)
+        self.assertEqual([self.large, self.new, self.small], longest_first(units=[self.small, self.large, self.new], costs=costs))
+
+        # without any history the defaults apply
+        costs = estimate_costs(units=[self.new], history={}, source_sizes={})
+        self.assertEqual(appsettings.scheduler_default_memory, costs[self.new].memory)
+        self.assertGreater(costs[self.new].duration, 0)
+
+    def test_memory_budget(self):
+        costs = estimate_costs(units=[self.small, self.large], history=self.history, source_sizes={})
+        pending = longest_first(units=[self.small, self.large], costs=costs)
+        # alone, a unit always starts, even when it is larger than the budget
+        self.assertEqual(self.large, next_unit(pending=pending, costs=costs, running=[], budget=100 * MB))
+        # the large one does not fit next to a running one, the small one does
+        self.assertEqual(self.small, next_unit(pending=pending, costs=costs, running=[self.small], budget=250 * MB))
+        self.assertIsNone(next_unit(pending=pending, costs=costs, running=[self.large], budget=250 * MB))
+        self.assertEqual(self.large, next_unit(pending=pending, costs=costs, running=[self.large], budget=None))
+        self.assertIsNone(next_unit(pending=[], costs=costs, running=[]))
+
+        self.assertEqual(512 * MB, memory_budget(max_memory_mb=512))
+        available = available_memory()
+        if (available is not None):
+            self.assertGreater(available, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
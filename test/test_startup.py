@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src.cythonbuilder.helpers import package_is_installed
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_list_does_not_import_build_modules(self):
+        code = "\n".join([
+            "import sys",
+            "from src.cythonbuilder import cli, cython_builder",
+            "cython_builder.cy_list()",
+            "heavy = ['setuptools', 'Cython', 'numpy', 'concurrent.futures', 'src.cythonbuilder.builder', 'src.cythonbuilder.watcher', 'src.cythonbuilder.benchmark']",
+            "print(','.join(m for m in heavy if (m in sys.modules)))",
+        ])
+        with tempfile.TemporaryDirectory() as project_dir:
+            completed = subprocess.run([sys.executable, '-c', code], cwd=project_dir, env=dict(os.environ, PYTHONPATH=REPO_DIR),
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(0, completed.returncode, completed.stderr)
+        self.assertEqual('', completed.stdout.strip())
+
+    def test_lazy_attributes(self):
+        import src.cythonbuilder as package
+        from src.cythonbuilder import cython_builder
+        for name in [n for n in dir(cython_builder) if (n.startswith('cy_'))] + ['CythonBuildError', 'Builder', 'BuildOptions']:
+            self.assertIsNotNone(getattr(package, name))
+        self.assertIs(cython_builder.cy_profile, package.cy_profile)
+        with self.assertRaises(AttributeError):
+            getattr(package, 'cy_does_not_exist')
+
+    def test_package_is_installed_does_not_import(self):
+        with tempfile.TemporaryDirectory() as folder:
+            os.mkdir(os.path.join(folder, 'explodes_on_import'))
+            with open(os.path.join(folder, 'explodes_on_import', '__init__.py'), 'w') as f:
+                f.write("raise RuntimeError('imported')\n")
+            sys.path.insert(0, folder)
+            try:
+                self.assertTrue(package_is_installed(package_import_name='explodes_on_import'))
+                self.assertNotIn('explodes_on_import', sys.modules)
+            finally:
+                sys.path.remove(folder)
+        self.assertFalse(package_is_installed(package_import_name='no_such_package_xyz'))
+        self.assertFalse(package_is_installed(package_import_name='no_such_package_xyz.sub'))
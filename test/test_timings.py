@@ -0,0 +1,39 @@
+import unittest
+
+from src.cythonbuilder.timings import BuildTimer, Span
+
+
+class TestTimings(unittest.TestCase):
+
+    def _timer(self) -> BuildTimer:
+        timer = BuildTimer()
+        timer.add(spans=[
+            Span(name='discover', phase='discover', start=100.0, end=100.5),
+            Span(name='compile b', phase='compile', start=101.0, end=104.0, track='worker 2', file='b.pyx'),
+            Span(name='translate a', phase='translate', start=100.5, end=101.0, track='worker 1', file='a.pyx'),
+            Span(name='compile a', phase='compile', start=101.0, end=102.0, track='worker 1', file='a.pyx'),
+        ])
+        return timer
+
+    def test_totals(self):
+        timer = self._timer()
+        self.assertEqual(['discover', 'translate', 'compile'], list(timer.phase_totals()))
+        self.assertEqual((3.0, 4.0), timer.phase_totals()['compile'])
+        self.assertEqual(['b.pyx', 'a.pyx'], list(timer.file_totals()))
+        self.assertEqual({'translate': 0.5, 'compile': 1.0}, timer.file_totals()['a.pyx'])
+        # 4.5s busy over 2 workers x 3.5s
+        self.assertAlmostEqual(4.5 / 7.0, timer.utilization())
+        self.assertIsNone(BuildTimer().utilization())
+
+        with timer.span(name='clean', phase='clean'):
+            pass
+        self.assertEqual('clean', list(timer.phase_totals())[-1])
+
+    def test_chrome_trace(self):
+        events = self._timer().chrome_trace()['traceEvents']
+        thread_names = {e['tid']: e['args']['name'] for e in events if (e['name'] == 'thread_name')}
+        self.assertEqual({0: 'main', 1: 'worker 1', 2: 'worker 2'}, thread_names)
+        complete = [e for e in events if (e['ph'] == 'X')]
+        self.assertEqual(['discover', 'translate a', 'compile b', 'compile a'], [e['name'] for e in complete])
+        self.assertEqual((500000, 500000, 1), (complete[1]['ts'], complete[1]['dur'], complete[1]['tid']))
+        self.assertEqual({'file': 'b.pyx'}, complete[2]['args'])
@@ -0,0 +1,89 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from src.cythonbuilder.watcher import InotifyWatcher, PollingWatcher, create_watcher, wait_for_changes
+
+
+class _ScriptedWatcher:
+    """ Returns the change sets it was given, one per wait, then nothing """
+
+    def __init__(self, batches:[set]):
+        self.batches = list(batches)
+        self.timeouts = []
+
+    def wait(self, timeout:float) -> set:
+        self.timeouts.append(timeout)
+        return self.batches.pop(0) if (len(self.batches) > 0) else set()
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.folder = self.tmpdir.name
+        self.pyx = os.path.join(self.folder, 'a.pyx')
+        with open(self.pyx, 'w') as f:
+            f.write("x = 1\n")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def list_files(self) -> [str]:
+        return sorted(os.path.join(self.folder, f) for f in os.listdir(self.folder) if (f.endswith('.pyx')))
+
+    def test_polling(self):
+        watcher = PollingWatcher(list_files=self.list_files, interval=0.01)
+        self.assertEqual(set(), watcher.wait(timeout=0.01))
+
+        os.utime(self.pyx, ns=(0, os.stat(self.pyx).st_mtime_ns + 1_000_000))
+        new_pyx = os.path.join(self.folder, 'b.pyx')
+        with open(new_pyx, 'w') as f:
+            f.write("y = 2\n")
+        self.assertEqual({self.pyx, new_pyx}, watcher.wait(timeout=0.01))
+        self.assertEqual(set(), watcher.wait(timeout=0.01))
+
+        os.remove(new_pyx)
+        self.assertEqual({new_pyx}, watcher.wait(timeout=0.01))
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), "inotify is Linux only")
+    def test_inotify(self):
+        watcher = InotifyWatcher(folders=[self.folder], extensions=('.pyx', '.pxd'), exclude=['build'])
+        try:
+            self.assertEqual(set(), watcher.wait(timeout=0.01))
+            with open(self.pyx, 'a') as f:
+                f.write("z = 3\n")
+            with open(os.path.join(self.folder, 'notes.txt'), 'w') as f:
+                f.write("not watched")
+            self.assertEqual({self.pyx}, wait_for_changes(watcher=watcher, debounce=0.05, timeout=1.0))
+
+            # files in a new folder are reported, the ones in an excluded folder are not
+            for folder in ['pkg', 'build']:
+                os.mkdir(os.path.join(self.folder, folder))
+                with open(os.path.join(self.folder, folder, 'c.pxd'), 'w') as f:
+                    f.write("cdef int c\n")
+            self.assertEqual({os.path.join(self.folder, 'pkg', 'c.pxd')}, wait_for_changes(watcher=watcher, debounce=0.05, timeout=1.0))
+        finally:
+            watcher.close()
+
+    def test_create_watcher(self):
+        watcher = create_watcher(folders=[self.folder], list_files=self.list_files, extensions=('.pyx',), use_polling=True, poll_interval=0.01)
+        self.assertIsInstance(watcher, PollingWatcher)
+        watcher.close()
+
+    def test_debounce(self):
+        # a burst of changes is collected until a wait brings nothing new
+        watcher = _ScriptedWatcher(batches=[{'a.pyx'}, {'b.pxd'}, {'a.pyx', 'c.pxi'}, set(), {'d.pyx'}])
+        self.assertEqual({'a.pyx', 'b.pxd', 'c.pxi'}, wait_for_changes(watcher=watcher, debounce=0.2, timeout=1.0))
+        self.assertEqual([1.0, 0.2, 0.2, 0.2], watcher.timeouts)
+        self.assertEqual({'d.pyx'}, wait_for_changes(watcher=watcher, debounce=0.2, timeout=1.0))
+
+        # nothing within the timeout, and lost events
+        self.assertEqual(set(), wait_for_changes(watcher=_ScriptedWatcher(batches=[]), debounce=0.2, timeout=1.0))
+        self.assertIsNone(wait_for_changes(watcher=_ScriptedWatcher(batches=[None]), debounce=0.2, timeout=1.0))
+        self.assertIsNone(wait_for_changes(watcher=_ScriptedWatcher(batches=[{'a.pyx'}, None]), debounce=0.2, timeout=1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()